@@ -0,0 +1,12 @@
+-- Clé d'idempotence des sauvegardes de recettes : une même génération (ou une
+-- même clé Idempotency-Key fournie par le client) ne crée qu'une seule recette.
+-- UNIQUE laisse passer plusieurs NULL : les recettes existantes ne sont pas touchées.
+ALTER TABLE recipes ADD COLUMN IF NOT EXISTS request_id text;
+
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'recipes_request_id_key') THEN
+    ALTER TABLE recipes ADD CONSTRAINT recipes_request_id_key UNIQUE (request_id);
+  END IF;
+END;
+$$;
@@ -0,0 +1,11 @@
+-- Quantités canoniques des ingrédients, calculées à l'écriture par
+-- scripts/ingredient_units.py : valeur en grammes, millilitres ou pièces,
+-- unité canonique et clé de regroupement du nom. Les listes de courses
+-- (scripts/shopping_list.py) les additionnent sans réanalyser le texte libre ;
+-- les lignes existantes, restées à NULL, sont converties à la lecture.
+ALTER TABLE ingredients ADD COLUMN IF NOT EXISTS quantity_value numeric;
+ALTER TABLE ingredients ADD COLUMN IF NOT EXISTS canonical_unit text;
+ALTER TABLE ingredients ADD COLUMN IF NOT EXISTS name_key text;
+
+-- Les listes de courses lisent les ingrédients par recette
+CREATE INDEX IF NOT EXISTS ingredients_recipe_id_idx ON ingredients (recipe_id);
@@ -0,0 +1,4 @@
+-- Pagination par curseur du catalogue (scripts/recipe_catalog.py) :
+-- ORDER BY created_at DESC, id DESC avec la clé de la page précédente.
+-- Le même index sert aux rafraîchissements incrémentaux par created_at.
+CREATE INDEX IF NOT EXISTS recipes_created_at_id_idx ON recipes (created_at DESC, id DESC);
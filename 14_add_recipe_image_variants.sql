@@ -0,0 +1,9 @@
+-- Images des recettes rangées par contenu (scripts/image_pipeline.py) :
+-- image_hash est l'empreinte SHA-256 de l'original, image_variants les URL
+-- des tailles précalculées, par variante et par format :
+--   {"card": {"webp": "...", "jpeg": "...", "width": 800, "height": 600}, ...}
+-- image_url pointe vers la variante "card" en JPEG, lisible par tous les clients.
+ALTER TABLE recipes ADD COLUMN IF NOT EXISTS image_hash text;
+ALTER TABLE recipes ADD COLUMN IF NOT EXISTS image_variants jsonb;
+
+COMMENT ON COLUMN recipes.image_data IS 'Obsolète : les images sont stockées hors de la base, voir image_hash et image_variants';
@@ -0,0 +1,22 @@
+-- Date de dernière modification des recettes, tenue par trigger : les index en
+-- mémoire des serveurs (scripts/recipe_feed.py) se rafraîchissent sur
+-- (updated_at, id) et voient ainsi les lignes modifiées après leur création,
+-- comme les coordonnées écrites par `gazetteer.py --backfill`.
+ALTER TABLE recipes ADD COLUMN IF NOT EXISTS updated_at timestamptz;
+UPDATE recipes SET updated_at = created_at WHERE updated_at IS NULL;
+ALTER TABLE recipes ALTER COLUMN updated_at SET DEFAULT now();
+ALTER TABLE recipes ALTER COLUMN updated_at SET NOT NULL;
+
+CREATE OR REPLACE FUNCTION recipes_touch_updated_at() RETURNS trigger AS $$
+BEGIN
+  NEW.updated_at := now();
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS recipes_touch_updated_at ON recipes;
+CREATE TRIGGER recipes_touch_updated_at
+  BEFORE UPDATE ON recipes
+  FOR EACH ROW EXECUTE FUNCTION recipes_touch_updated_at();
+
+CREATE INDEX IF NOT EXISTS recipes_updated_at_id_idx ON recipes (updated_at, id);
@@ -0,0 +1,28 @@
+-- Version du catalogue pour les ETag de /recipes (scripts/recipe_catalog.py) :
+-- un compteur incrémenté par trigger à chaque écriture sur recipes, y compris
+-- les modifications (géocodage, images) et les suppressions, quel que soit le
+-- processus qui écrit. Trigger par instruction : un lot save_recipe_graphs ou
+-- un UPDATE de masse ne met à jour la ligne qu'une fois par instruction.
+CREATE TABLE IF NOT EXISTS catalog_version (
+  id smallint PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+  version bigint NOT NULL DEFAULT 0,
+  updated_at timestamptz NOT NULL DEFAULT now()
+);
+INSERT INTO catalog_version (id) VALUES (1) ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_catalog_version() RETURNS trigger AS $$
+BEGIN
+  UPDATE catalog_version SET version = version + 1, updated_at = now() WHERE id = 1;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS recipes_bump_catalog_version ON recipes;
+CREATE TRIGGER recipes_bump_catalog_version
+  AFTER INSERT OR UPDATE OR DELETE ON recipes
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
+
+DROP TRIGGER IF EXISTS recipes_truncate_catalog_version ON recipes;
+CREATE TRIGGER recipes_truncate_catalog_version
+  AFTER TRUNCATE ON recipes
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
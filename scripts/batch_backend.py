@@ -0,0 +1,256 @@
+"""
+Génération via l'API Batch d'OpenAI : moins chère et soumise à des quotas
+séparés, mais asynchrone (jusqu'à 24 h). Réservée aux chargements en masse.
+
+Le graphe de prompts de generate_recipe est découpé en vagues ; chaque vague
+regroupe les prompts de toutes les recettes dans un seul fichier de requêtes.
+Les réponses sont ensuite reconstituées en recipe_data par les mêmes fonctions
+de parsing et de validation que la génération en temps réel.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Dict, List
+
+from clients import get_openai_client
+from generate_recipe import (
+    AICompletion, MAX_TOKENS, RECIPE_STAGES, SYSTEM_PROMPT, TEMPERATURE,
+    assemble_recipe_data, cached_completion, store_completion, validate_recipe_data
+)
+from llm_backends import OPENAI_MODEL
+from prompt_cache import prompt_cache_key
+from prompt_scheduler import PromptTask, dag_waves
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = '/v1/chat/completions'
+BATCH_COMPLETION_WINDOW = '24h'
+BATCH_POLL_INTERVAL = float(os.getenv('OPENAI_BATCH_POLL_INTERVAL', 30))
+# Limite de l'API : 50 000 requêtes par fichier
+BATCH_MAX_REQUESTS = int(os.getenv('OPENAI_BATCH_MAX_REQUESTS', 50000))
+
+BATCH_FINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+
+class BatchRequestError(Exception):
+    """Une requête du lot n'a pas produit de réponse exploitable."""
+
+
+def stage_waves() -> List[List[str]]:
+    tasks = {name: PromptTask(name, inputs, builder) for name, (inputs, builder) in RECIPE_STAGES.items()}
+    return dag_waves(tasks)
+
+
+def recipe_key(recipe_name: str) -> str:
+    """Identifiant stable d'une recette dans les custom_id (limités en longueur)."""
+    return hashlib.sha1(recipe_name.encode('utf-8')).hexdigest()[:16]
+
+
+def batch_custom_id(recipe_name: str, stage: str, prompt: str) -> str:
+    """
+    custom_id d'un prompt : l'empreinte du prompt en fait partie, pour qu'une
+    réponse conservée dans work_dir ne serve jamais à un prompt modifié depuis.
+    """
+    digest = prompt_cache_key(OPENAI_MODEL, SYSTEM_PROMPT, prompt, TEMPERATURE)[:16]
+    return f"{recipe_key(recipe_name)}:{stage}:{digest}"
+
+
+def batch_request(custom_id: str, prompt: str) -> dict:
+    """Une ligne du fichier JSONL, avec les mêmes paramètres que l'appel temps réel."""
+    return {
+        'custom_id': custom_id,
+        'method': 'POST',
+        'url': BATCH_ENDPOINT,
+        'body': {
+            'model': OPENAI_MODEL,
+            'messages': [
+                {'role': 'system', 'content': SYSTEM_PROMPT},
+                {'role': 'user', 'content': prompt}
+            ],
+            'temperature': TEMPERATURE,
+            'max_tokens': MAX_TOKENS
+        }
+    }
+
+
+def parse_batch_output(text: str) -> Dict[str, object]:
+    """Retourne, par custom_id, le texte de la réponse ou l'erreur associée."""
+    results = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        response = record.get('response') or {}
+        if record.get('error') or response.get('status_code') != 200:
+            error = record.get('error') or response.get('body', {}).get('error')
+            results[record['custom_id']] = BatchRequestError(str(error))
+            continue
+        content = response['body']['choices'][0]['message']['content']
+        results[record['custom_id']] = content.strip()
+    return results
+
+
+class BatchRunner:
+    """
+    Soumet un fichier de requêtes et attend son traitement. L'identifiant du lot
+    et ses résultats sont enregistrés dans `work_dir` : relancer après une
+    interruption reprend le suivi du lot déjà soumis au lieu d'en payer un nouveau.
+    """
+
+    def __init__(self, client=None, work_dir: str = 'batch_work', poll_interval: float = BATCH_POLL_INTERVAL):
+        self.client = client
+        self.work_dir = work_dir
+        self.poll_interval = poll_interval
+        os.makedirs(work_dir, exist_ok=True)
+
+    def _client(self):
+        return self.client or get_openai_client()
+
+    def _state_path(self, name: str) -> str:
+        return os.path.join(self.work_dir, f"{name}.json")
+
+    def _load_states(self, name: str) -> List[dict]:
+        states = []
+        for filename in sorted(os.listdir(self.work_dir)):
+            if filename.startswith(f"{name}-") and filename.endswith('.json'):
+                with open(os.path.join(self.work_dir, filename), encoding='utf-8') as f:
+                    states.append(json.load(f))
+        return states
+
+    def _save_state(self, state: dict) -> None:
+        path = self._state_path(state['name'])
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+
+    def submit(self, requests: List[dict]) -> str:
+        client = self._client()
+        content = '\n'.join(json.dumps(request, ensure_ascii=False) for request in requests) + '\n'
+        input_file = client.files.create(file=('requests.jsonl', content.encode('utf-8')), purpose='batch')
+        batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=BATCH_COMPLETION_WINDOW
+        )
+        return batch.id
+
+    def wait(self, batch_id: str):
+        client = self._client()
+        while True:
+            batch = client.batches.retrieve(batch_id)
+            if batch.status in BATCH_FINAL_STATUSES:
+                return batch
+            logger.info(f"⏳ Lot {batch_id}: {batch.status}")
+            time.sleep(self.poll_interval)
+
+    def collect(self, batch) -> Dict[str, object]:
+        client = self._client()
+        results = {}
+        # Un lot expiré garde les réponses déjà produites
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                results.update(parse_batch_output(client.files.content(file_id).text))
+        return results
+
+    def _finish(self, state: dict) -> None:
+        batch = self.wait(state['batch_id'])
+        if batch.status != 'completed':
+            logger.warning(f"⚠️ Lot {batch.id} terminé avec le statut {batch.status}")
+        collected = self.collect(batch)
+        state['outputs'] = {
+            custom_id: collected[custom_id]
+            for custom_id in state['custom_ids'] if isinstance(collected.get(custom_id), str)
+        }
+        self._save_state(state)
+
+    def run(self, name: str, requests: List[dict]) -> Dict[str, object]:
+        """
+        Exécute les requêtes (par fichiers de BATCH_MAX_REQUESTS) et retourne les
+        résultats par custom_id. Les réponses déjà obtenues lors d'une exécution
+        précédente sont réutilisées ; seules les requêtes manquantes sont soumises.
+        """
+        states = self._load_states(name)
+        for state in states:
+            if 'outputs' not in state:
+                self._finish(state)
+        known = {}
+        for state in states:
+            known.update(state['outputs'])
+
+        missing = [request for request in requests if request['custom_id'] not in known]
+        for start in range(0, len(missing), BATCH_MAX_REQUESTS):
+            chunk = missing[start:start + BATCH_MAX_REQUESTS]
+            state = {
+                'name': f"{name}-{len(states):04d}",
+                'custom_ids': [request['custom_id'] for request in chunk],
+                'batch_id': self.submit(chunk)
+            }
+            # Enregistré avant l'attente : une interruption ne fera pas soumettre le lot deux fois
+            self._save_state(state)
+            states.append(state)
+            logger.info(f"📤 Lot {state['batch_id']} soumis ({len(chunk)} requêtes)")
+            self._finish(state)
+            known.update(state['outputs'])
+
+        return {
+            request['custom_id']: known.get(request['custom_id']) or BatchRequestError(
+                f"Pas de réponse pour {request['custom_id']}"
+            )
+            for request in requests
+        }
+
+
+def generate_recipes_batch(recipe_names: List[str], client=None, work_dir: str = 'batch_work',
+                           poll_interval: float = BATCH_POLL_INTERVAL) -> Dict[str, object]:
+    """
+    Génère les recettes par l'API Batch, une vague du graphe de prompts à la fois.
+    Retourne, par nom, le recipe_data validé ou l'exception qui a fait échouer la recette.
+    """
+    runner = BatchRunner(client=client, work_dir=work_dir, poll_interval=poll_interval)
+    outputs: Dict[str, Dict[str, str]] = {name: {} for name in recipe_names}
+    failures: Dict[str, Exception] = {}
+
+    for wave_index, wave in enumerate(stage_waves()):
+        requests, pending = [], {}
+        for name in recipe_names:
+            if name in failures:
+                continue
+            for stage in wave:
+                inputs, builder = RECIPE_STAGES[stage]
+                prompt = builder(name, {dep: outputs[name][dep] for dep in inputs})
+                key, hit = cached_completion(prompt, stage)
+                if hit:
+                    outputs[name][stage] = hit.text
+                    continue
+                custom_id = batch_custom_id(name, stage, prompt)
+                requests.append(batch_request(custom_id, prompt))
+                pending[custom_id] = (name, stage, key)
+
+        logger.info(f"🌊 Vague {wave_index + 1} ({', '.join(wave)}): {len(requests)} requêtes")
+        if not requests:
+            continue
+
+        for custom_id, result in runner.run(f"wave-{wave_index}", requests).items():
+            name, stage, key = pending[custom_id]
+            if isinstance(result, Exception):
+                failures.setdefault(name, result)
+                continue
+            outputs[name][stage] = result
+            store_completion(key, stage, AICompletion(text=result))
+
+    results: Dict[str, object] = {}
+    for name in recipe_names:
+        if name in failures:
+            results[name] = failures[name]
+            continue
+        try:
+            recipe_data = assemble_recipe_data(name, outputs[name])
+            if not validate_recipe_data(recipe_data):
+                raise ValueError("Les données générées sont invalides")
+            results[name] = recipe_data
+        except Exception as e:
+            results[name] = e
+    return results
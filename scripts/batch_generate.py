@@ -0,0 +1,192 @@
+"""
+Génération de recettes en masse, avec reprise sur incident.
+
+    python batch_generate.py recettes.csv --concurrency 4 --batch-size 50
+
+Chaque recette générée est ajoutée au journal JSONL avant d'être chargée dans
+Supabase ; relancer la même commande reprend là où le traitement s'est arrêté.
+
+Avec --backend batch, les prompts passent par l'API Batch d'OpenAI (moins chère,
+résultats sous 24 h) ; --fake-llm remplace OpenAI par un faux serveur local.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, List
+
+from batch_backend import generate_recipes_batch
+from clients import get_supabase_client
+from generate_recipe import generate_recipe
+from recipe_index import RecipeTitleIndex
+from recipe_names import normalize_recipe_name
+from recipe_persistence import save_recipe_graphs
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+STATUS_GENERATED = 'generated'
+STATUS_LOADED = 'loaded'
+STATUS_FAILED = 'failed'
+
+
+def read_recipe_names(path: str) -> List[str]:
+    """Lit les noms depuis un CSV (colonne name/recipeName ou première colonne) ou un JSONL."""
+    names = []
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                line = line.strip()
+                if line:
+                    record = json.loads(line)
+                    names.append(record['recipeName'] if 'recipeName' in record else record['name'])
+        else:
+            rows = list(csv.reader(f))
+            header = [column.strip() for column in rows[0]] if rows else []
+            if 'name' in header or 'recipeName' in header:
+                column = header.index('recipeName' if 'recipeName' in header else 'name')
+                rows = rows[1:]
+            else:
+                column = 0
+            names = [row[column] for row in rows if row and row[column].strip()]
+
+    # Dédoublonnage sur le nom normalisé, en gardant l'ordre du fichier
+    unique: Dict[str, str] = {}
+    for name in names:
+        unique.setdefault(normalize_recipe_name(name), name.strip())
+    return list(unique.values())
+
+
+class Journal:
+    """Journal JSONL en ajout seul ; le dernier enregistrement d'une recette fait foi."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Dernière ligne tronquée par un arrêt brutal
+                        continue
+                    self.records[normalize_recipe_name(record['name'])] = record
+
+    def status(self, name: str) -> str:
+        return self.records.get(normalize_recipe_name(name), {}).get('status')
+
+    def append(self, record: dict) -> None:
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self.records[normalize_recipe_name(record['name'])] = record
+
+    def pending_loads(self) -> List[dict]:
+        return [record for record in self.records.values() if record['status'] == STATUS_GENERATED]
+
+
+def generate_all(names: Iterable[str], journal: Journal, concurrency: int, mode: str) -> None:
+    def run(name):
+        recipe_data = generate_recipe(name, mode=mode)
+        journal.append({'name': name, 'status': STATUS_GENERATED, 'recipe_data': recipe_data})
+
+    names = list(names)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(run, name): name for name in names}
+        for done, future in enumerate(as_completed(futures), start=1):
+            name = futures[future]
+            try:
+                future.result()
+                logger.info(f"✅ [{done}/{len(names)}] {name}")
+            except Exception as e:
+                logger.error(f"❌ [{done}/{len(names)}] {name}: {str(e)}")
+                journal.append({'name': name, 'status': STATUS_FAILED, 'error': str(e)})
+
+
+def generate_all_batch(names: List[str], journal: Journal, work_dir: str, client=None) -> None:
+    results = generate_recipes_batch(names, client=client, work_dir=work_dir)
+    for done, name in enumerate(names, start=1):
+        result = results[name]
+        if isinstance(result, Exception):
+            logger.error(f"❌ [{done}/{len(names)}] {name}: {str(result)}")
+            journal.append({'name': name, 'status': STATUS_FAILED, 'error': str(result)})
+        else:
+            logger.info(f"✅ [{done}/{len(names)}] {name}")
+            journal.append({'name': name, 'status': STATUS_GENERATED, 'recipe_data': result})
+
+
+def load_all(journal: Journal, batch_size: int) -> None:
+    pending = journal.pending_loads()
+    client = get_supabase_client()
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        recipe_ids = save_recipe_graphs(client, [record['recipe_data'] for record in batch])
+        for record, recipe_id in zip(batch, recipe_ids):
+            journal.append({'name': record['name'], 'status': STATUS_LOADED, 'recipe_id': recipe_id})
+        logger.info(f"💾 {start + len(batch)}/{len(pending)} recettes chargées dans Supabase")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Génère et charge des recettes en masse")
+    parser.add_argument('input', help="Fichier CSV ou JSONL des noms de recettes")
+    parser.add_argument('--journal', default='batch_journal.jsonl', help="Journal de reprise (JSONL)")
+    parser.add_argument('--concurrency', type=int, default=4, help="Recettes générées en parallèle")
+    parser.add_argument('--batch-size', type=int, default=50, help="Recettes par chargement Supabase")
+    parser.add_argument('--mode', choices=['prompts', 'structured'], default=None, help="Mode de génération")
+    parser.add_argument('--backend', choices=['realtime', 'batch'], default='realtime',
+                        help="API temps réel ou API Batch d'OpenAI")
+    parser.add_argument('--batch-work-dir', default='batch_work', help="État des lots soumis (--backend batch)")
+    parser.add_argument('--fake-llm', action='store_true', help="Faux serveur Batch local, sans appel à OpenAI")
+    parser.add_argument('--retry-failed', action='store_true', help="Relance aussi les recettes en échec")
+    parser.add_argument('--force', action='store_true', help="Génère même les recettes déjà en base")
+    parser.add_argument('--no-load', action='store_true', help="Génère sans charger dans Supabase")
+    args = parser.parse_args(argv)
+    if args.backend == 'batch' and args.mode == 'structured':
+        parser.error("--backend batch ne prend en charge que le mode prompts")
+    if args.fake_llm and args.backend != 'batch':
+        parser.error("--fake-llm nécessite --backend batch")
+
+    journal = Journal(args.journal)
+    names = read_recipe_names(args.input)
+
+    skip = {STATUS_GENERATED, STATUS_LOADED}
+    if not args.retry_failed:
+        skip.add(STATUS_FAILED)
+    todo = [name for name in names if journal.status(name) not in skip]
+
+    if not args.force and todo:
+        index = RecipeTitleIndex()
+        index.warm(get_supabase_client())
+        existing = [name for name in todo if index.lookup(name) is not None]
+        if existing:
+            logger.info(f"⏭️ {len(existing)} recettes déjà en base ignorées")
+        todo = [name for name in todo if index.lookup(name) is None]
+
+    logger.info(f"📋 {len(names)} recettes, {len(names) - len(todo)} déjà traitées, {len(todo)} à générer")
+    if args.backend == 'batch':
+        client = None
+        if args.fake_llm:
+            from fake_llm import FakeBatchClient
+            client = FakeBatchClient()
+        generate_all_batch(todo, journal, args.batch_work_dir, client)
+    else:
+        generate_all(todo, journal, args.concurrency, args.mode)
+
+    if not args.no_load:
+        load_all(journal, args.batch_size)
+
+    failed = sum(1 for record in journal.records.values() if record['status'] == STATUS_FAILED)
+    logger.info(f"🏁 Terminé : {failed} échecs")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
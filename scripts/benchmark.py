@@ -0,0 +1,388 @@
+"""
+Benchmarks de bout en bout du pipeline de génération et de sauvegarde.
+
+    python benchmark.py --requests 40 --concurrency 8
+    python benchmark.py --save-baseline benchmark_baseline.json
+    python benchmark.py --compare benchmark_baseline.json
+
+Par défaut, le modèle est remplacé par le backend factice (LLM_BACKEND=fake,
+latence simulée) et Supabase par le stand-in en mémoire (SUPABASE_BACKEND=memory).
+Avec --real-supabase, les écritures partent vers SUPABASE_URL, par exemple un
+Postgres/PostgREST local.
+
+Chaque scénario détaille aussi, par prompt, les tokens envoyés et reçus et la
+latence moyenne (`prompts`). Pour mesurer la compaction des prompts :
+
+    python benchmark.py --scenario generate --llm-prompt-token-latency 0.0005 --no-compaction
+    python benchmark.py --scenario generate --llm-prompt-token-latency 0.0005
+
+Scénarios :
+  generate       generate_recipe seul
+  persist        execute_sql (sauvegarde du graphe de la recette)
+  endpoint-json  POST /generate-recipe avec Accept: application/json
+  endpoint-sse   POST /generate-recipe en Server-Sent Events
+  shopping-list  liste de courses d'une semaine (SHOPPING_LIST_RECIPES recettes)
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+SCENARIOS = ('generate', 'persist', 'endpoint-json', 'endpoint-sse', 'shopping-list')
+API_KEY = 'benchmark'
+SHOPPING_LIST_RECIPES = 20
+
+# Ingrédients tirés au hasard pour les recettes de la liste de courses
+BENCH_INGREDIENTS = [
+    ('500', 'g', 'farine'), ('4', '', 'œufs'), ('20', 'cl', 'lait'), ('1', 'kg', 'poulet'),
+    ('2', 'gousses', "d'ail"), ('1', 'cuillère à soupe', "huile d'olive"), ('3', '', 'tomates'),
+    ('1/2', '', 'citron'), ('250', 'g', 'riz'), ('1', 'pincée', 'sel'), ('2', 'unité', 'oignons'),
+    ('100', 'g', 'beurre'), ('1,5', 'l', 'bouillon de poulet'), ('', 'au goût', 'poivre'),
+    ('200', 'g', 'crème fraîche'), ('1', 'cuillère à café', 'cumin'), ('2-3', '', 'carottes'),
+    ('300', 'g', 'pâtes'), ('1', 'branche', 'romarin'), ('50', 'g', 'parmesan'),
+]
+
+# Sens de variation défavorable de chaque métrique, pour la comparaison aux baselines
+HIGHER_IS_WORSE = ('p50_ms', 'p95_ms', 'p99_ms', 'ttfe_p50_ms', 'ttfe_p95_ms', 'ttfe_p99_ms',
+                   'llm_calls_per_request', 'db_round_trips_per_request', 'memory_per_request_kib', 'error_rate')
+HIGHER_IS_BETTER = ('throughput_rps',)
+
+
+def configure_environment(args) -> None:
+    """À appeler avant d'importer les modules du serveur, qui lisent leur configuration à l'import."""
+    os.environ['LLM_BACKEND'] = 'fake'
+    os.environ['FAKE_LLM_LATENCY'] = str(args.llm_latency)
+    os.environ['FAKE_LLM_LATENCY_SIGMA'] = str(args.llm_latency_sigma)
+    os.environ['FAKE_LLM_FAILURE_RATE'] = str(args.llm_failure_rate)
+    os.environ['FAKE_LLM_SEED'] = str(args.seed)
+    os.environ['FAKE_LLM_PROMPT_TOKEN_LATENCY'] = str(args.llm_prompt_token_latency)
+    os.environ['PROMPT_COMPACTION'] = '0' if args.no_compaction else '1'
+    if not args.real_supabase:
+        os.environ['SUPABASE_BACKEND'] = 'memory'
+        os.environ['SUPABASE_FAKE_LATENCY'] = str(args.db_latency)
+    os.environ['API_KEY'] = API_KEY
+    os.environ['JOB_QUEUE_BACKEND'] = 'memory'
+    os.environ['JOB_MAX_PENDING'] = str(max(args.requests, 100))
+    if args.workers:
+        os.environ['JOB_WORKERS'] = str(args.workers)
+    # Noms de recettes tous différents : le cache disque ne servirait qu'à ralentir
+    os.environ['PROMPT_CACHE_PATH'] = ''
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def latency_summary(prefix: str, seconds: List[float]) -> dict:
+    return {
+        f"{prefix}p50_ms": round(percentile(seconds, 0.50) * 1000, 1) if seconds else None,
+        f"{prefix}p95_ms": round(percentile(seconds, 0.95) * 1000, 1) if seconds else None,
+        f"{prefix}p99_ms": round(percentile(seconds, 0.99) * 1000, 1) if seconds else None,
+    }
+
+
+class Counters:
+    """Appels au modèle et allers-retours base de données, lus avant et après un scénario."""
+
+    def __init__(self):
+        from clients import get_supabase_client
+        from llm_backends import get_llm_backend
+        self.llm = get_llm_backend()
+        self.db = get_supabase_client()
+
+    def snapshot(self) -> Dict[str, Optional[int]]:
+        return {
+            'llm_calls': getattr(self.llm, 'calls', None),
+            'db_round_trips': getattr(self.db, 'round_trips', None)
+        }
+
+
+def prompt_snapshot() -> dict:
+    import metrics
+    return {'tokens': metrics.LLM_TOKENS.snapshot(), 'durations': metrics.LLM_DURATION.snapshot()}
+
+
+def prompt_summary(before: dict, after: dict) -> Dict[str, dict]:
+    """Par prompt : appels, tokens moyens envoyés et reçus, latence moyenne sur l'intervalle."""
+    calls: Dict[str, List[float]] = {}
+    for (stage, model), (count, total) in after['durations'].items():
+        old_count, old_total = before['durations'].get((stage, model), (0, 0.0))
+        entry = calls.setdefault(stage, [0, 0.0])
+        entry[0] += count - old_count
+        entry[1] += total - old_total
+    summary = {}
+    for stage, (count, total) in sorted(calls.items()):
+        if not count:
+            continue
+        tokens = {
+            kind: after['tokens'].get((stage, kind), 0) - before['tokens'].get((stage, kind), 0)
+            for kind in ('prompt', 'completion')
+        }
+        summary[stage] = {
+            'calls': count,
+            'prompt_tokens': round(tokens['prompt'] / count, 1),
+            'completion_tokens': round(tokens['completion'] / count, 1),
+            'mean_ms': round(total / count * 1000, 1)
+        }
+    return summary
+
+
+def run_scenario(name: str, requests: int, concurrency: int,
+                 one_request: Callable[[int], Optional[float]]) -> dict:
+    """
+    Lance `requests` appels à `one_request(i)` sur `concurrency` threads.
+    `one_request` peut retourner un temps jusqu'au premier événement (SSE).
+    """
+    counters = Counters()
+    before = counters.snapshot()
+    prompts_before = prompt_snapshot()
+    latencies, first_events, errors = [], [], []
+    lock = threading.Lock()
+
+    def timed(i):
+        started = time.perf_counter()
+        try:
+            first_event = one_request(i)
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+            return
+        with lock:
+            latencies.append(time.perf_counter() - started)
+            if first_event is not None:
+                first_events.append(first_event)
+
+    tracemalloc.start()
+    baseline_memory, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed, range(requests)))
+    wall = time.perf_counter() - started
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    after = counters.snapshot()
+
+    result = {
+        'requests': requests,
+        'concurrency': concurrency,
+        'error_rate': round(len(errors) / requests, 4),
+        'throughput_rps': round(len(latencies) / wall, 2),
+        **latency_summary('', latencies),
+    }
+    if first_events:
+        result.update(latency_summary('ttfe_', first_events))
+    for counter in ('llm_calls', 'db_round_trips'):
+        if after[counter] is not None:
+            result[f"{counter}_per_request"] = round((after[counter] - before[counter]) / requests, 2)
+    # Pic d'allocations Python pendant le scénario, rapporté aux requêtes simultanées
+    result['memory_per_request_kib'] = round((peak_memory - baseline_memory) / 1024 / min(concurrency, requests), 1)
+    if errors:
+        result['first_error'] = errors[0]
+    result['prompts'] = prompt_summary(prompts_before, prompt_snapshot())
+    logging.getLogger(__name__).warning(f"📊 {name}: {json.dumps(result, ensure_ascii=False)}")
+    return result
+
+
+def bench_generate(args) -> dict:
+    from generate_recipe import generate_recipe
+    run_id = uuid.uuid4().hex[:8]
+    return run_scenario('generate', args.requests, args.concurrency,
+                        lambda i: generate_recipe(f"Bench {run_id} generate {i}", mode=args.mode) and None)
+
+
+def bench_persist(args) -> dict:
+    from generate_recipe import generate_recipe
+    from recipe_server import execute_sql
+    # Une recette générée une fois, sauvegardée N fois sous des clés d'idempotence distinctes :
+    # seul le coût d'écriture est mesuré
+    recipe_data = generate_recipe(f"Bench {uuid.uuid4().hex[:8]} persist", mode=args.mode)
+    return run_scenario('persist', args.requests, args.concurrency,
+                        lambda i: execute_sql(recipe_data, request_id=uuid.uuid4().hex) and None)
+
+
+def bench_shopping_list(args) -> dict:
+    from clients import get_supabase_client
+    from generate_recipe import generate_recipe
+    from recipe_server import execute_sql
+    from shopping_list import shopping_list_for_recipes
+    recipe_data = generate_recipe(f"Bench {uuid.uuid4().hex[:8]} shopping", mode=args.mode)
+    rng = random.Random(args.seed)
+    recipe_ids = []
+    for _ in range(SHOPPING_LIST_RECIPES):
+        ingredients = [{'quantity': q, 'unit': u, 'name': n} for q, u, n in rng.sample(BENCH_INGREDIENTS, 12)]
+        recipe = {**recipe_data['recipe'], 'servings': rng.choice([2, 4, 6])}
+        recipe_ids.append(execute_sql({**recipe_data, 'recipe': recipe, 'ingredients': ingredients},
+                                      request_id=uuid.uuid4().hex))
+    client = get_supabase_client()
+    return run_scenario('shopping-list', args.requests, args.concurrency,
+                        lambda i: shopping_list_for_recipes(client, recipe_ids, 4) and None)
+
+
+def start_server():
+    from werkzeug.serving import make_server
+    from recipe_server import app
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def bench_endpoint(args, sse: bool) -> dict:
+    import httpx
+    server, base_url = start_server()
+    run_id = uuid.uuid4().hex[:8]
+    client = httpx.Client(
+        base_url=base_url,
+        timeout=httpx.Timeout(300),
+        limits=httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    )
+    headers = {'X-API-Key': API_KEY, 'Content-Type': 'application/json'}
+
+    def json_request(i):
+        response = client.post('/generate-recipe', headers={**headers, 'Accept': 'application/json'},
+                               json={'recipeName': f"Bench {run_id} json {i}"})
+        if response.status_code != 200 or not response.json().get('success'):
+            raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+        return None
+
+    def sse_request(i):
+        started = time.perf_counter()
+        first_event = None
+        last_event = None
+        with client.stream('POST', '/generate-recipe', headers={**headers, 'Accept': 'text/event-stream'},
+                           json={'recipeName': f"Bench {run_id} sse {i}"}) as response:
+            if response.status_code != 200:
+                raise RuntimeError(f"HTTP {response.status_code}")
+            for line in response.iter_lines():
+                if line.startswith('data:'):
+                    if first_event is None:
+                        first_event = time.perf_counter() - started
+                    last_event = json.loads(line[5:])
+        if not last_event or last_event.get('error'):
+            raise RuntimeError(f"Flux SSE en erreur: {last_event}")
+        return first_event
+
+    try:
+        name = 'endpoint-sse' if sse else 'endpoint-json'
+        return run_scenario(name, args.requests, args.concurrency, sse_request if sse else json_request)
+    finally:
+        client.close()
+        server.shutdown()
+
+
+def compare(results: dict, baseline: dict, threshold: float, min_delta_ms: float) -> List[str]:
+    """
+    Retourne les métriques qui se dégradent de plus de `threshold` (en relatif) par
+    rapport à la baseline ; les latences doivent en plus bouger de `min_delta_ms`.
+    """
+    regressions = []
+    for scenario, metrics in results['scenarios'].items():
+        reference = baseline.get('scenarios', {}).get(scenario)
+        if not reference:
+            continue
+        for metric, value in metrics.items():
+            old = reference.get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)):
+                continue
+            if metric in HIGHER_IS_WORSE:
+                worse = value > old * (1 + threshold) and value - old > 1e-9
+                if metric.endswith('_ms'):
+                    worse = worse and value - old > min_delta_ms
+            elif metric in HIGHER_IS_BETTER:
+                worse = value < old * (1 - threshold)
+            else:
+                continue
+            change = f"{(value - old) / old:+.0%}" if old else ("=" if value == old else "n/a")
+            print(f"{'❌' if worse else '  '} {scenario:14} {metric:28} {old:>10} -> {value:<10} {change}")
+            if worse:
+                regressions.append(f"{scenario}.{metric}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks du pipeline de génération de recettes")
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                        help="Scénario à lancer (répétable, tous par défaut)")
+    parser.add_argument('--requests', type=int, default=40, help="Requêtes par scénario")
+    parser.add_argument('--concurrency', type=int, default=8, help="Clients simultanés")
+    parser.add_argument('--workers', type=int, default=None, help="JOB_WORKERS du serveur")
+    parser.add_argument('--mode', choices=['prompts', 'structured'], default='prompts', help="Mode de génération")
+    parser.add_argument('--llm-latency', type=float, default=0.05, help="Latence médiane simulée d'un appel au modèle (s)")
+    parser.add_argument('--llm-latency-sigma', type=float, default=0.3, help="Dispersion log-normale de la latence")
+    parser.add_argument('--llm-prompt-token-latency', type=float, default=0.0,
+                        help="Délai simulé par token du prompt (s), pour mesurer l'effet de sa longueur")
+    parser.add_argument('--no-compaction', action='store_true', help="Prompts sans brief (PROMPT_COMPACTION=0)")
+    parser.add_argument('--llm-failure-rate', type=float, default=0.0, help="Proportion d'appels en échec")
+    parser.add_argument('--db-latency', type=float, default=0.002, help="Latence simulée d'un aller-retour Supabase (s)")
+    parser.add_argument('--real-supabase', action='store_true', help="Utilise SUPABASE_URL au lieu du stand-in")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="Fichier JSON des résultats")
+    parser.add_argument('--save-baseline', help="Enregistre les résultats comme baseline")
+    parser.add_argument('--compare', help="Baseline à comparer ; code de sortie 1 en cas de régression")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Dégradation relative tolérée")
+    parser.add_argument('--min-delta-ms', type=float, default=5.0, help="Écart de latence ignoré sous ce seuil (ms)")
+    args = parser.parse_args(argv)
+
+    configure_environment(args)
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+    import recipe_server  # noqa: F401  (configure les logs du serveur)
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    runners = {
+        'generate': bench_generate,
+        'persist': bench_persist,
+        'endpoint-json': lambda a: bench_endpoint(a, sse=False),
+        'endpoint-sse': lambda a: bench_endpoint(a, sse=True),
+        'shopping-list': bench_shopping_list,
+    }
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'mode': args.mode,
+            'llm_latency': args.llm_latency,
+            'llm_prompt_token_latency': args.llm_prompt_token_latency,
+            'prompt_compaction': not args.no_compaction,
+            'db_latency': None if args.real_supabase else args.db_latency,
+            'workers': int(os.getenv('JOB_WORKERS', 4)),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+        },
+        'scenarios': {name: runners[name](args) for name in (args.scenario or SCENARIOS)}
+    }
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2, ensure_ascii=False)
+                f.write('\n')
+    if not args.output and not args.save_baseline:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} régression(s): {', '.join(regressions)}")
+            return 1
+        print("\nAucune régression")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import os
+import threading
+
+import httpx
+import openai
+from dotenv import load_dotenv
+from postgrest import AsyncPostgrestClient
+from supabase import create_client
+from supabase.lib.client_options import ClientOptions
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Chargement des variables d'environnement
+load_dotenv()
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+def _http2_enabled() -> bool:
+    # HTTP/2 nécessite le paquet h2 (pip install httpx[http2])
+    if os.getenv('HTTP2_ENABLED', '0') != '1':
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("HTTP2_ENABLED=1 mais le paquet h2 est absent, repli sur HTTP/1.1")
+        return False
+
+
+# Timeouts par appel : connexion courte, lecture longue pour les complétions
+OPENAI_TIMEOUT = httpx.Timeout(
+    connect=_env_float('OPENAI_CONNECT_TIMEOUT', 5),
+    read=_env_float('OPENAI_READ_TIMEOUT', 90),
+    write=10,
+    pool=_env_float('HTTP_POOL_TIMEOUT', 10)
+)
+SUPABASE_TIMEOUT = httpx.Timeout(
+    connect=_env_float('SUPABASE_CONNECT_TIMEOUT', 5),
+    read=_env_float('SUPABASE_READ_TIMEOUT', 30),
+    write=10,
+    pool=_env_float('HTTP_POOL_TIMEOUT', 10)
+)
+# Taille des pools : au moins autant de connexions que de prompts en parallèle par worker
+HTTP_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv('HTTP_MAX_CONNECTIONS', 50)),
+    max_keepalive_connections=int(os.getenv('HTTP_MAX_KEEPALIVE', 20)),
+    keepalive_expiry=_env_float('HTTP_KEEPALIVE_EXPIRY', 60)
+)
+
+_lock = threading.Lock()
+_clients = {}
+_pid = os.getpid()
+
+
+def _reset_after_fork() -> None:
+    # Les sockets héritées du processus parent ne doivent pas être partagées
+    global _lock, _pid
+    _lock = threading.Lock()
+    _clients.clear()
+    _pid = os.getpid()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _get_or_create(name, factory):
+    if _pid != os.getpid():
+        _reset_after_fork()
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = factory()
+                _clients[name] = client
+    return client
+
+
+def _create_openai_client() -> openai.OpenAI:
+    http_client = httpx.Client(limits=HTTP_LIMITS, timeout=OPENAI_TIMEOUT, http2=_http2_enabled())
+    return openai.OpenAI(
+        api_key=os.getenv('OPENAI_API_KEY'),
+        http_client=http_client,
+        timeout=OPENAI_TIMEOUT,
+        # Les relances sont gérées par rate_limiter.RateGovernor
+        max_retries=0
+    )
+
+
+def _create_supabase_client():
+    client = create_client(
+        os.getenv('SUPABASE_URL'),
+        os.getenv('SUPABASE_SERVICE_KEY'),
+        options=ClientOptions(postgrest_client_timeout=SUPABASE_TIMEOUT)
+    )
+    # La session PostgREST par défaut n'a ni pool dimensionné ni HTTP/2 : on la remplace
+    default_session = client.postgrest.session
+    client.postgrest.session = httpx.Client(
+        base_url=default_session.base_url,
+        headers=default_session.headers,
+        timeout=SUPABASE_TIMEOUT,
+        limits=HTTP_LIMITS,
+        http2=_http2_enabled()
+    )
+    default_session.close()
+    return client
+
+
+def get_openai_client() -> openai.OpenAI:
+    """Client OpenAI partagé par le processus, avec pool de connexions keep-alive."""
+    return _get_or_create('openai', _create_openai_client)
+
+
+def get_supabase_client():
+    """
+    Client Supabase partagé par le processus, avec pool de connexions keep-alive.
+    SUPABASE_BACKEND=memory le remplace par un stand-in en mémoire (benchmarks).
+    """
+    if os.getenv('SUPABASE_BACKEND', 'supabase') == 'memory':
+        from fake_supabase import create_in_memory_client
+        return _get_or_create('supabase-memory', create_in_memory_client)
+    return _get_or_create('supabase', _create_supabase_client)
+
+
+def get_http_client() -> httpx.Client:
+    """Client HTTP générique partagé (téléchargements, appels REST directs)."""
+    return _get_or_create('http', lambda: httpx.Client(
+        limits=HTTP_LIMITS, timeout=SUPABASE_TIMEOUT, http2=_http2_enabled(), follow_redirects=True
+    ))
+
+
+# Clients asynchrones (mode ASGI) : un pool httpx.AsyncClient est lié à sa boucle
+# d'événements, d'où un client par boucle.
+def _loop_key(name: str) -> str:
+    return f"{name}@{id(asyncio.get_running_loop())}"
+
+
+def _create_async_openai_client() -> openai.AsyncOpenAI:
+    http_client = httpx.AsyncClient(limits=HTTP_LIMITS, timeout=OPENAI_TIMEOUT, http2=_http2_enabled())
+    return openai.AsyncOpenAI(
+        api_key=os.getenv('OPENAI_API_KEY'),
+        http_client=http_client,
+        timeout=OPENAI_TIMEOUT,
+        max_retries=0
+    )
+
+
+def _create_async_supabase_client() -> AsyncPostgrestClient:
+    # supabase-py 2.3 n'a pas de client asynchrone : on parle directement à PostgREST
+    key = os.getenv('SUPABASE_SERVICE_KEY')
+    client = AsyncPostgrestClient(
+        f"{os.getenv('SUPABASE_URL')}/rest/v1",
+        headers={'apikey': key, 'Authorization': f"Bearer {key}"},
+        timeout=SUPABASE_TIMEOUT
+    )
+    default_session = client.session
+    client.session = httpx.AsyncClient(
+        base_url=default_session.base_url,
+        headers=default_session.headers,
+        timeout=SUPABASE_TIMEOUT,
+        limits=HTTP_LIMITS,
+        http2=_http2_enabled()
+    )
+    return client
+
+
+def get_async_openai_client() -> openai.AsyncOpenAI:
+    """Client OpenAI asynchrone partagé par la boucle d'événements courante."""
+    return _get_or_create(_loop_key('openai-async'), _create_async_openai_client)
+
+
+def get_async_supabase_client():
+    """
+    Client PostgREST asynchrone partagé par la boucle d'événements courante
+    (mêmes méthodes table/rpc que le client Supabase, avec `await ....execute()`).
+    """
+    if os.getenv('SUPABASE_BACKEND', 'supabase') == 'memory':
+        from fake_supabase import create_async_in_memory_client
+        # Même stockage que get_supabase_client(), créé hors du verrou de _get_or_create
+        store = get_supabase_client()
+        return _get_or_create('supabase-memory-async', lambda: create_async_in_memory_client(store))
+    return _get_or_create(_loop_key('supabase-async'), _create_async_supabase_client)
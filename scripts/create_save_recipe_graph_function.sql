@@ -0,0 +1,78 @@
+-- Fonction pour sauvegarder une recette complète en un seul appel RPC.
+-- Le corps d'une fonction s'exécute dans une seule transaction : soit tout
+-- le graphe (recette, ingrédients, étapes, playlist, vin) est écrit, soit rien.
+-- Avec un request_id déjà connu (migration 11_add_recipe_request_id.sql), rien
+-- n'est écrit et l'ID de la recette existante est retourné : les relances sont sans effet.
+-- Les quantités canoniques des ingrédients demandent la migration 12_add_ingredient_canonical_quantities.sql,
+-- les variantes d'images la migration 14_add_recipe_image_variants.sql.
+-- Ordre de déploiement : appliquer les migrations 11, 12 et 14 avant de créer
+-- cette fonction, qui référence leurs colonnes. En attendant, le repli par
+-- insertions de scripts/recipe_persistence.py se passe des colonnes absentes.
+CREATE OR REPLACE FUNCTION public.save_recipe_graph(payload jsonb)
+RETURNS bigint
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  new_recipe_id bigint;
+BEGIN
+  -- Une sauvegarde concurrente de même request_id attend la fin de la première
+  INSERT INTO recipes (
+    title, country, region, description, preparation_time, cooking_time,
+    difficulty, servings, is_premium, image_url, latitude, longitude,
+    story_intro, story_intro_audio_url, request_id, image_hash, image_variants
+  )
+  SELECT
+    r.title, r.country, r.region, r.description, r.preparation_time, r.cooking_time,
+    r.difficulty, r.servings, r.is_premium, r.image_url, r.latitude, r.longitude,
+    r.story_intro, r.story_intro_audio_url, r.request_id, r.image_hash, r.image_variants
+  FROM jsonb_populate_record(NULL::recipes, payload->'recipe') r
+  ON CONFLICT (request_id) DO NOTHING
+  RETURNING id INTO new_recipe_id;
+
+  IF new_recipe_id IS NULL THEN
+    SELECT id INTO new_recipe_id FROM recipes WHERE request_id = payload->'recipe'->>'request_id';
+    RETURN new_recipe_id;
+  END IF;
+
+  INSERT INTO ingredients (recipe_id, name, quantity, unit, quantity_value, canonical_unit, name_key)
+  SELECT new_recipe_id, i.name, i.quantity, i.unit, i.quantity_value, i.canonical_unit, i.name_key
+  FROM jsonb_populate_recordset(NULL::ingredients, payload->'ingredients') i;
+
+  INSERT INTO steps (
+    recipe_id, order_number, title, description, story_content,
+    story_audio_url, story_background_image_url
+  )
+  SELECT
+    new_recipe_id, s.order_number, s.title, s.description, s.story_content,
+    s.story_audio_url, s.story_background_image_url
+  FROM jsonb_populate_recordset(NULL::steps, payload->'steps') s;
+
+  INSERT INTO playlists (recipe_id, title, description, spotify_link, image_url)
+  SELECT new_recipe_id, p.title, p.description, p.spotify_link, p.image_url
+  FROM jsonb_populate_record(NULL::playlists, payload->'playlist') p;
+
+  INSERT INTO wine_pairings (recipe_id, name, description, region, image_url)
+  SELECT new_recipe_id, w.name, w.description, w.region, w.image_url
+  FROM jsonb_populate_record(NULL::wine_pairings, payload->'wine_pairing') w;
+
+  RETURN new_recipe_id;
+END;
+$$;
+
+-- Variante pour le chargement en masse : un tableau de recettes, une seule transaction
+CREATE OR REPLACE FUNCTION public.save_recipe_graphs(payloads jsonb)
+RETURNS bigint[]
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  payload jsonb;
+  recipe_ids bigint[] := '{}';
+BEGIN
+  FOR payload IN SELECT * FROM jsonb_array_elements(payloads) LOOP
+    recipe_ids := array_append(recipe_ids, public.save_recipe_graph(payload));
+  END LOOP;
+  RETURN recipe_ids;
+END;
+$$;
@@ -0,0 +1,306 @@
+"""
+Stand-ins locaux pour les appels au modèle : réponses figées mais correctement
+formatées, pour tester et mesurer le pipeline sans réseau ni coût.
+
+    LLM_BACKEND=fake FAKE_LLM_LATENCY=0.8 FAKE_LLM_FAILURE_RATE=0.02 python recipe_server.py
+"""
+import asyncio
+import io
+import json
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+from llm_backends import AICompletion, estimate_tokens
+
+# Réponses factices, au format attendu par les parseurs de generate_recipe
+CANNED_ANSWERS = {
+    'origin': "Pays: Italie",
+    'character': """Nom: Giulia Rossi
+Âge: 52
+Ville: Trévise
+Restaurant: Trattoria da Giulia, une petite salle aux poutres apparentes près du marché
+Histoire personnelle: Élevée par sa grand-mère dans les collines de Vénétie, elle a repris la trattoria familiale
+Caractère: Exigeante, chaleureuse et rieuse
+Philosophie culinaire: Peu d'ingrédients, mais les meilleurs
+Routine quotidienne: Marché à l'aube, service du midi, pâtisserie l'après-midi""",
+    'story': """Le soleil se lève sur Trévise et la trattoria sent déjà le café fraîchement moulu. Giulia noue son tablier en souriant, pendant que la radio murmure une vieille chanson vénitienne. Sur le marbre du plan de travail, les œufs du marché attendent à côté du mascarpone encore frais.
+
+« Ma grand-mère disait que ce plat réveille les cœurs », murmure-t-elle en sortant les ingrédients du garde-manger. Elle se souvient de la cuisine de la ferme, des mains farineuses de Nonna Lucia et des dimanches où toute la famille se serrait autour de la grande table. C'est dans cette cuisine qu'elle a goûté sa première cuillère de crème, volée derrière le dos des adultes.
+
+Le plat est né dans les arrière-salles des osterie de Vénétie, où l'on servait aux voyageurs un dessert qui redonnait des forces. Giulia raconte volontiers cette histoire aux clients curieux, en insistant sur le café serré que l'on buvait au comptoir. Pour elle, chaque région d'Italie a sa façon de le préparer, mais celle de Trévise reste la seule vraie.
+
+Les biscuits craquent sous ses doigts, le café chaud libère une odeur profonde et légèrement amère. Elle fouette les jaunes jusqu'à ce qu'ils blanchissent, en écoutant le bruit régulier du fouet contre le cul-de-poule. Le cacao tombe en pluie fine, comme la neige sur les collines en hiver.
+
+Quand le plat repose enfin au frais, Giulia s'assoit un instant sur le tabouret de la cuisine. Elle pense à sa grand-mère et à tous ceux qui ont appris cette recette à ses côtés. Chaque geste rappelle une fête de famille, chaque parfum un dimanche d'enfance.""",
+    'general': """Pays: Italie
+Region: Vénétie
+Description: Un classique de la cuisine familiale, transmis de génération en génération et servi les jours de fête.
+Temps de préparation: 30 min
+Temps de cuisson: 15 min
+Difficulté: moyen
+Portions: 6""",
+    'ingredients': """500 g mascarpone
+4 unité oeufs
+100 g sucre
+300 g biscuits
+30 cl café""",
+    'steps': """Étape 1: Giulia sépare les blancs des jaunes d'un geste sûr, comme sa grand-mère le lui a appris.
+Étape 2: Elle fouette les jaunes avec le sucre jusqu'à ce que le mélange blanchisse et sente la vanille.
+Étape 3: Le mascarpone est incorporé lentement, la crème devient soyeuse sous la spatule.
+Étape 4: Les biscuits trempés dans le café sont disposés en couches, puis recouverts de crème.""",
+    'playlist': """Titre: Dimanche à Trévise
+Description: Mandolines, chansons populaires et airs d'opéra pour cuisiner sans se presser
+Lien: spotify:playlist:37i9dQZF1DX0x36cwEyOTG""",
+    'wine': """Nom: Moscato d'Asti
+Description: Ses bulles légères et ses notes de pêche allègent la crème et prolongent le café""",
+}
+
+
+CANNED_STRUCTURED = {
+    'country': "Italie",
+    'region': "Vénétie",
+    'description': "Un classique de la cuisine familiale, transmis de génération en génération et servi les jours de fête.",
+    'preparation_time': 30,
+    'cooking_time': 15,
+    'difficulty': "moyen",
+    'servings': 6,
+    'ingredients': [
+        {'name': "mascarpone", 'quantity': "500", 'unit': "g"},
+        {'name': "oeufs", 'quantity': "4", 'unit': "unité"},
+        {'name': "sucre", 'quantity': "100", 'unit': "g"},
+        {'name': "biscuits", 'quantity': "300", 'unit': "g"},
+        {'name': "café", 'quantity': "30", 'unit': "cl"}
+    ],
+    'steps': [
+        {'title': "Les œufs", 'description': "Giulia sépare les blancs des jaunes d'un geste sûr, comme sa grand-mère le lui a appris."},
+        {'title': "La crème", 'description': "Elle fouette les jaunes avec le sucre puis incorpore lentement le mascarpone."},
+        {'title': "Le montage", 'description': "Les biscuits trempés dans le café sont disposés en couches, puis recouverts de crème."}
+    ],
+    'playlist': {
+        'title': "Dimanche à Trévise",
+        'description': "Mandolines, chansons populaires et airs d'opéra pour cuisiner sans se presser",
+        'spotify_link': "spotify:playlist:37i9dQZF1DX0x36cwEyOTG"
+    },
+    'wine_pairing': {
+        'name': "Moscato d'Asti",
+        'description': "Ses bulles légères et ses notes de pêche allègent la crème et prolongent le café"
+    }
+}
+
+# Repères pour reconnaître un prompt quand l'appelant ne précise pas l'étape
+STAGE_MARKERS = (
+    ('origin', "pays d'origine"),
+    ('character', "personnage de chef"),
+    ('story', "histoire immersive"),
+    ('steps', "étapes détaillées"),
+    ('general', "Temps de préparation"),
+    ('ingredients', "ingrédients dans ce format"),
+    ('playlist', "playlist"),
+    ('wine', "accord de vin"),
+)
+
+
+def canned_answer(stage: str) -> str:
+    return CANNED_ANSWERS.get(stage, "Réponse factice")
+
+
+def guess_stage(prompt: str) -> Optional[str]:
+    for stage, marker in STAGE_MARKERS:
+        if marker in prompt:
+            return stage
+    return None
+
+
+class FakeLLMError(Exception):
+    """Échec simulé d'un appel au modèle."""
+
+
+class FakeLLMBackend:
+    """
+    Backend LLM local (voir llm_backends.LLMBackend). La latence de chaque appel
+    suit une loi log-normale de médiane `latency` secondes et de dispersion
+    `latency_sigma` ; un appel échoue avec la probabilité `failure_rate`.
+    `prompt_token_latency` ajoute un délai par token du prompt, comme le temps de
+    lecture du prompt par un vrai modèle.
+    En streaming, `latency` est le délai avant le premier fragment, puis un
+    fragment de `chunk_chars` caractères part toutes les `chunk_delay` secondes.
+    """
+    model = 'fake-llm'
+
+    def __init__(self, latency: float = 0.5, latency_sigma: float = 0.4, failure_rate: float = 0.0,
+                 chunk_chars: int = 16, chunk_delay: float = 0.01, prompt_token_latency: float = 0.0,
+                 seed: Optional[int] = None):
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.prompt_token_latency = prompt_token_latency
+        self.failure_rate = failure_rate
+        self.chunk_chars = chunk_chars
+        self.chunk_delay = chunk_delay
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'FakeLLMBackend':
+        seed = os.getenv('FAKE_LLM_SEED')
+        return cls(
+            latency=float(os.getenv('FAKE_LLM_LATENCY', 0.5)),
+            latency_sigma=float(os.getenv('FAKE_LLM_LATENCY_SIGMA', 0.4)),
+            failure_rate=float(os.getenv('FAKE_LLM_FAILURE_RATE', 0)),
+            chunk_chars=int(os.getenv('FAKE_LLM_CHUNK_CHARS', 16)),
+            chunk_delay=float(os.getenv('FAKE_LLM_CHUNK_DELAY', 0.01)),
+            prompt_token_latency=float(os.getenv('FAKE_LLM_PROMPT_TOKEN_LATENCY', 0)),
+            seed=int(seed) if seed else None
+        )
+
+    def _draw(self, prompt: str) -> Tuple[float, bool]:
+        """Tire la latence et l'issue d'un appel."""
+        with self._lock:
+            self.calls += 1
+            delay = estimate_tokens('', prompt, 0) * self.prompt_token_latency
+            if self.latency > 0:
+                delay += self._random.lognormvariate(math.log(self.latency), self.latency_sigma)
+            return delay, self._random.random() < self.failure_rate
+
+    def _wait(self, prompt: str) -> None:
+        delay, failed = self._draw(prompt)
+        time.sleep(delay)
+        if failed:
+            raise FakeLLMError("Échec simulé du backend LLM")
+
+    async def _wait_async(self, prompt: str) -> None:
+        delay, failed = self._draw(prompt)
+        await asyncio.sleep(delay)
+        if failed:
+            raise FakeLLMError("Échec simulé du backend LLM")
+
+    def _answer(self, prompt: str, stage: Optional[str]) -> str:
+        return canned_answer(stage or guess_stage(prompt))
+
+    def _completion(self, system, prompt, text) -> AICompletion:
+        return AICompletion(
+            text=text,
+            prompt_tokens=estimate_tokens(system, prompt, 0),
+            completion_tokens=len(text) // 4
+        )
+
+    def _chunks(self, text: str) -> List[str]:
+        return [text[start:start + self.chunk_chars] for start in range(0, len(text), self.chunk_chars)]
+
+    def complete(self, system, prompt, temperature, max_tokens, stage=None):
+        self._wait(prompt)
+        return self._completion(system, prompt, self._answer(prompt, stage))
+
+    def stream(self, system, prompt, temperature, max_tokens, stage=None) -> Iterator[str]:
+        self._wait(prompt)
+        for i, chunk in enumerate(self._chunks(self._answer(prompt, stage))):
+            if i:
+                time.sleep(self.chunk_delay)
+            yield chunk
+
+    def complete_structured(self, system, prompt, schema, name, temperature, max_tokens):
+        self._wait(prompt)
+        arguments = json.dumps(CANNED_STRUCTURED, ensure_ascii=False)
+        return arguments, self._completion(system, prompt, arguments)
+
+    async def complete_async(self, system, prompt, temperature, max_tokens, stage=None):
+        await self._wait_async(prompt)
+        return self._completion(system, prompt, self._answer(prompt, stage))
+
+    async def stream_async(self, system, prompt, temperature, max_tokens, stage=None) -> AsyncIterator[str]:
+        await self._wait_async(prompt)
+        for i, chunk in enumerate(self._chunks(self._answer(prompt, stage))):
+            if i:
+                await asyncio.sleep(self.chunk_delay)
+            yield chunk
+
+    async def complete_structured_async(self, system, prompt, schema, name, temperature, max_tokens):
+        await self._wait_async(prompt)
+        arguments = json.dumps(CANNED_STRUCTURED, ensure_ascii=False)
+        return arguments, self._completion(system, prompt, arguments)
+
+
+def stage_from_custom_id(custom_id: str) -> str:
+    """Les custom_id du backend batch sont de la forme `<recette>:<étape>:<empreinte du prompt>`."""
+    return custom_id.split(':')[1]
+
+
+class FakeBatchClient:
+    """
+    Imitation locale de l'API Batch d'OpenAI (files + batches) pour tester
+    le backend batch sans réseau. Un lot est traité `processing_time` secondes
+    après sa création ; `responder(custom_id, body)` fournit chaque réponse.
+    """
+
+    def __init__(self, responder: Callable[[str, dict], str] = None, processing_time: float = 0.0):
+        self.responder = responder or (lambda custom_id, body: canned_answer(stage_from_custom_id(custom_id)))
+        self.processing_time = processing_time
+        self._files: Dict[str, bytes] = {}
+        self._batches: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self.files = SimpleNamespace(create=self._create_file, content=self._file_content)
+        self.batches = SimpleNamespace(create=self._create_batch, retrieve=self._retrieve_batch)
+
+    def _create_file(self, file, purpose):
+        data = file.read() if hasattr(file, 'read') else file[1]
+        file_id = f"file-{uuid.uuid4().hex}"
+        with self._lock:
+            self._files[file_id] = data
+        return SimpleNamespace(id=file_id, purpose=purpose)
+
+    def _file_content(self, file_id):
+        data = self._files[file_id]
+        return SimpleNamespace(text=data.decode('utf-8'), content=data, read=lambda: data)
+
+    def _create_batch(self, input_file_id, endpoint, completion_window, metadata=None):
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        with self._lock:
+            self._batches[batch_id] = {
+                'input_file_id': input_file_id,
+                'ready_at': time.time() + self.processing_time,
+                'output_file_id': None
+            }
+        return self._retrieve_batch(batch_id)
+
+    def _run(self, batch: dict) -> str:
+        lines = []
+        for line in io.StringIO(self._files[batch['input_file_id']].decode('utf-8')):
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            content = self.responder(request['custom_id'], request['body'])
+            lines.append(json.dumps({
+                'id': f"batch_req_{uuid.uuid4().hex}",
+                'custom_id': request['custom_id'],
+                'response': {
+                    'status_code': 200,
+                    'body': {
+                        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}}],
+                        'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+                    }
+                },
+                'error': None
+            }, ensure_ascii=False))
+        output_file_id = f"file-{uuid.uuid4().hex}"
+        self._files[output_file_id] = ('\n'.join(lines) + '\n').encode('utf-8')
+        return output_file_id
+
+    def _retrieve_batch(self, batch_id):
+        with self._lock:
+            batch = self._batches[batch_id]
+            if batch['output_file_id'] is None and time.time() >= batch['ready_at']:
+                batch['output_file_id'] = self._run(batch)
+            done = batch['output_file_id'] is not None
+            return SimpleNamespace(
+                id=batch_id,
+                status='completed' if done else 'in_progress',
+                output_file_id=batch['output_file_id'],
+                error_file_id=None,
+                errors=None
+            )
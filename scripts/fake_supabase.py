@@ -0,0 +1,313 @@
+"""
+Stand-in en mémoire du client Supabase, pour les benchmarks et les essais hors
+ligne (SUPABASE_BACKEND=memory). Seul le sous-ensemble de PostgREST utilisé par
+les scripts est couvert ; chaque execute() compte pour un aller-retour réseau
+et peut être ralenti de SUPABASE_FAKE_LATENCY secondes.
+"""
+import asyncio
+import copy
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+from postgrest.exceptions import APIError
+
+CHILD_TABLES = ('ingredients', 'steps', 'playlists', 'wine_pairings')
+# Colonne simple ou ressource embarquée : recipes(servings, title)
+SELECT_COLUMN_RE = re.compile(r"\s*(\w+)\s*(?:\(([^)]*)\))?\s*(?:,|$)")
+# Condition d'un filtre or=(...) : colonne.opérateur.valeur, valeur éventuellement entre guillemets
+CONDITION_RE = re.compile(r'^(\w+)\.(eq|neq|lt|lte|gt|gte)\.(?:"(.*)"|(.*))$')
+COMPARISONS = {
+    'eq': lambda a, b: a == b, 'neq': lambda a, b: a != b,
+    'lt': lambda a, b: a < b, 'lte': lambda a, b: a <= b,
+    'gt': lambda a, b: a > b, 'gte': lambda a, b: a >= b,
+}
+
+
+def _split_conditions(text: str) -> List[str]:
+    """Sépare les conditions de premier niveau d'un filtre logique PostgREST."""
+    parts, depth, start, quoted = [], 0, 0, False
+    for i, char in enumerate(text):
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        elif not quoted and char == ',' and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+
+def logic_filter(text: str) -> Callable[[dict], bool]:
+    """Prédicat d'un filtre or=(...) : a.lt.1,and(a.eq.1,b.lt.2)."""
+    predicates = []
+    for part in _split_conditions(text):
+        if part.startswith(('and(', 'or(')) and part.endswith(')'):
+            operator, _, inner = part[:-1].partition('(')
+            nested = [logic_filter(condition) for condition in _split_conditions(inner)]
+            predicates.append((lambda fs: lambda row: all(f(row) for f in fs))(nested) if operator == 'and'
+                              else (lambda fs: lambda row: any(f(row) for f in fs))(nested))
+            continue
+        match = CONDITION_RE.match(part)
+        if not match:
+            raise ValueError(f"Condition non gérée par le client en mémoire: {part}")
+        column, operator, quoted, raw = match.groups()
+        predicates.append(_condition(column, COMPARISONS[operator], raw if quoted is None else quoted))
+    return lambda row: any(predicate(row) for predicate in predicates)
+
+
+def _condition(column: str, compare, value: str) -> Callable[[dict], bool]:
+    def predicate(row: dict) -> bool:
+        current = row.get(column)
+        if current is None:
+            return False
+        # Les valeurs arrivent en texte, comme dans l'URL PostgREST
+        return compare(current, type(current)(value) if not isinstance(current, str) else value)
+    return predicate
+
+
+class InMemoryQuery:
+    def __init__(self, client: 'InMemorySupabaseClient', table: str, asynchronous: bool = False):
+        self.client = client
+        self.table = table
+        self.asynchronous = asynchronous
+        self.operation = 'select'
+        self.columns: Optional[List[str]] = None
+        self.rows: List[dict] = []
+        self.values: dict = {}
+        self.filters = []
+        self.orders = []
+        self.bounds = None
+
+    def select(self, columns: str = '*'):
+        self.operation = 'select'
+        self.columns = None if columns == '*' else [
+            (name, [c.strip() for c in embedded.split(',')] if embedded else None)
+            for name, embedded in SELECT_COLUMN_RE.findall(columns) if name
+        ]
+        return self
+
+    def insert(self, rows):
+        self.operation = 'insert'
+        self.rows = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def update(self, values: dict):
+        self.operation = 'update'
+        self.values = values
+        return self
+
+    def delete(self):
+        self.operation = 'delete'
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] > value)
+        return self
+
+    def or_(self, filters: str):
+        self.filters.append(logic_filter(filters))
+        return self
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end)
+        return self
+
+    def execute(self):
+        if self.asynchronous:
+            return self._execute_async()
+        return self.client._execute(self)
+
+    async def _execute_async(self):
+        if self.client.latency:
+            await asyncio.sleep(self.client.latency)
+        return self.client._execute(self, sleep=False)
+
+
+class InMemorySupabaseClient:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        # Compteur tenu par le trigger recipes_bump_catalog_version (migration 16)
+        self.tables: Dict[str, List[dict]] = {'catalog_version': [{'id': 1, 'version': 0}]}
+        self.round_trips = 0
+        self._next_id = 1
+        # Index de la contrainte unique recipes.request_id
+        self._request_ids: Dict[str, dict] = {}
+        # now() de PostgreSQL est figé pour la transaction d'un appel RPC
+        self._transaction_time: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def table(self, name: str) -> InMemoryQuery:
+        return InMemoryQuery(self, name)
+
+    def rpc(self, name: str, params: dict):
+        return SimpleNamespace(execute=lambda: self._rpc(name, params))
+
+    def _round_trip(self, sleep: bool = True) -> None:
+        with self._lock:
+            self.round_trips += 1
+        if self.latency and sleep:
+            time.sleep(self.latency)
+
+    def _bump_catalog_version(self, table: str) -> None:
+        if table == 'recipes' and self.tables.get('catalog_version'):
+            self.tables['catalog_version'][0]['version'] += 1
+
+    def _find_request(self, request_id) -> Optional[dict]:
+        return self._request_ids.get(request_id) if request_id is not None else None
+
+    def _insert(self, table: str, rows: List[dict]) -> List[dict]:
+        inserted = []
+        for row in rows:
+            # Contrainte recipes_request_id_key
+            if table == 'recipes' and self._find_request(row.get('request_id')):
+                raise APIError({'code': '23505', 'message': 'duplicate key value violates unique constraint "recipes_request_id_key"'})
+            now = self._transaction_time or datetime.now(timezone.utc).isoformat()
+            row = {**copy.deepcopy(row), 'id': self._next_id, 'created_at': now, 'updated_at': now}
+            self._next_id += 1
+            self.tables.setdefault(table, []).append(row)
+            if table == 'recipes' and row.get('request_id') is not None:
+                self._request_ids[row['request_id']] = row
+            inserted.append(row)
+        if inserted:
+            self._bump_catalog_version(table)
+        return inserted
+
+    def _save_graph(self, payload: dict) -> int:
+        existing = self._find_request(payload['recipe'].get('request_id'))
+        if existing:
+            return existing['id']
+        recipe_id = self._insert('recipes', [payload['recipe']])[0]['id']
+        with_recipe = lambda row: {**row, 'recipe_id': recipe_id}
+        self._insert('ingredients', [with_recipe(i) for i in payload['ingredients']])
+        self._insert('steps', [with_recipe(s) for s in payload['steps']])
+        self._insert('playlists', [with_recipe(payload['playlist'])])
+        self._insert('wine_pairings', [with_recipe(payload['wine_pairing'])])
+        return recipe_id
+
+    def _rpc(self, name: str, params: dict, sleep: bool = True):
+        self._round_trip(sleep)
+        with self._lock:
+            self._transaction_time = datetime.now(timezone.utc).isoformat()
+            try:
+                if name == 'save_recipe_graph':
+                    return SimpleNamespace(data=self._save_graph(params['payload']))
+                if name == 'save_recipe_graphs':
+                    return SimpleNamespace(data=[self._save_graph(payload) for payload in params['payloads']])
+            finally:
+                self._transaction_time = None
+        raise ValueError(f"Fonction RPC inconnue: {name}")
+
+    def _project(self, table: str, rows: List[dict], columns) -> List[dict]:
+        # Ressources embarquées, par clé étrangère : recipes -> recipe_id (parent)
+        # ou, depuis recipes, la liste des lignes filles (ingredients(name))
+        parents, children = {}, {}
+        for name, embedded in columns:
+            if not embedded:
+                continue
+            if table == 'recipes' and name in CHILD_TABLES:
+                children[name] = {}
+                for child in self.tables.get(name, []):
+                    children[name].setdefault(child['recipe_id'], []).append(child)
+            else:
+                parents[name] = {r['id']: r for r in self.tables.get(name, [])}
+        projected = []
+        for row in rows:
+            out = {}
+            for name, embedded in columns:
+                if embedded is None:
+                    out[name] = row.get(name)
+                elif name in children:
+                    out[name] = [{column: child.get(column) for column in embedded}
+                                 for child in children[name].get(row.get('id'), [])]
+                else:
+                    parent = parents[name].get(row.get(f"{name[:-1]}_id"))
+                    out[name] = {column: parent.get(column) for column in embedded} if parent else None
+            projected.append(out)
+        return projected
+
+    def _execute(self, query: InMemoryQuery, sleep: bool = True):
+        self._round_trip(sleep)
+        with self._lock:
+            if query.operation == 'insert':
+                return SimpleNamespace(data=self._insert(query.table, query.rows))
+
+            rows = [row for row in self.tables.get(query.table, []) if all(f(row) for f in query.filters)]
+            if query.operation == 'update':
+                # Équivalent du trigger recipes_touch_updated_at (migration 15)
+                now = datetime.now(timezone.utc).isoformat()
+                for row in rows:
+                    row.update(copy.deepcopy(query.values), updated_at=now)
+                if rows:
+                    self._bump_catalog_version(query.table)
+                return SimpleNamespace(data=copy.deepcopy(rows))
+            if query.operation == 'delete':
+                deleted = {id(row) for row in rows}
+                self.tables[query.table] = [row for row in self.tables.get(query.table, []) if id(row) not in deleted]
+                if rows:
+                    self._bump_catalog_version(query.table)
+                # Équivalent du ON DELETE CASCADE
+                if query.table == 'recipes':
+                    for row in rows:
+                        self._request_ids.pop(row.get('request_id'), None)
+                    recipe_ids = {row['id'] for row in rows}
+                    for child in CHILD_TABLES:
+                        self.tables[child] = [r for r in self.tables.get(child, []) if r['recipe_id'] not in recipe_ids]
+                return SimpleNamespace(data=rows)
+
+            for column, desc in reversed(query.orders):
+                rows.sort(key=lambda row: row.get(column), reverse=desc)
+            if query.bounds:
+                rows = rows[query.bounds[0]:query.bounds[1] + 1]
+            if query.columns:
+                rows = self._project(query.table, rows, query.columns)
+            return SimpleNamespace(data=copy.deepcopy(rows))
+
+
+class AsyncInMemorySupabaseClient:
+    """Même stockage que le client synchrone, avec des execute() à attendre."""
+
+    def __init__(self, store: InMemorySupabaseClient):
+        self.store = store
+
+    @property
+    def round_trips(self) -> int:
+        return self.store.round_trips
+
+    def table(self, name: str) -> InMemoryQuery:
+        return InMemoryQuery(self.store, name, asynchronous=True)
+
+    def rpc(self, name: str, params: dict):
+        async def execute():
+            if self.store.latency:
+                await asyncio.sleep(self.store.latency)
+            return self.store._rpc(name, params, sleep=False)
+        return SimpleNamespace(execute=execute)
+
+
+def create_in_memory_client() -> InMemorySupabaseClient:
+    return InMemorySupabaseClient(latency=float(os.getenv('SUPABASE_FAKE_LATENCY', 0)))
+
+
+def create_async_in_memory_client(store: InMemorySupabaseClient) -> AsyncInMemorySupabaseClient:
+    return AsyncInMemorySupabaseClient(store)
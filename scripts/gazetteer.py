@@ -0,0 +1,158 @@
+"""
+Géocodage hors ligne du pays et de la région d'une recette, à partir du
+gazetier gazetteer.json (centres approximatifs des pays, régions et villes
+culinaires, noms français et variantes courantes).
+
+    python gazetteer.py --backfill   # recalcule les coordonnées des recettes existantes
+"""
+import functools
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from recipe_names import normalize_recipe_name
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gazetteer.json')
+
+# Longueur maximale (en mots) d'un nom de lieu cherché dans un texte libre
+MAX_PLACE_WORDS = 4
+PLACE_SEPARATORS_RE = re.compile(r"[,;/()]|\s+(?:et|ou)\s+")
+
+PRECISION_REGION = 'region'
+PRECISION_COUNTRY = 'country'
+
+
+@dataclass(frozen=True)
+class Place:
+    name: str
+    country: str
+    latitude: float
+    longitude: float
+    precision: str
+
+
+def place_key(name: str) -> str:
+    return normalize_recipe_name(name.replace('œ', 'oe'))
+
+
+def _word_windows(text: str) -> Iterator[str]:
+    """Morceaux du texte, du plus long au plus court (« Sud de la Toscane » -> ..., « toscane »)."""
+    for part in PLACE_SEPARATORS_RE.split(text):
+        words = place_key(part).split()
+        for size in range(min(len(words), MAX_PLACE_WORDS), 0, -1):
+            for start in range(len(words) - size + 1):
+                yield ' '.join(words[start:start + size])
+
+
+class Gazetteer:
+    def __init__(self, data: dict):
+        self.countries: Dict[str, Place] = {}
+        self.regions: Dict[Tuple[str, str], Place] = {}
+        # Régions sans pays connu : le premier pays déclaré l'emporte en cas d'homonymie
+        self.regions_anywhere: Dict[str, Place] = {}
+        for name, latitude, longitude, *aliases in data['countries']:
+            place = Place(name, name, latitude, longitude, PRECISION_COUNTRY)
+            for alias in [name, *(aliases[0] if aliases else [])]:
+                self.countries.setdefault(place_key(alias), place)
+        for country, regions in data['regions'].items():
+            country_key = place_key(country)
+            for name, latitude, longitude, *aliases in regions:
+                place = Place(name, country, latitude, longitude, PRECISION_REGION)
+                for alias in [name, *(aliases[0] if aliases else [])]:
+                    self.regions.setdefault((country_key, place_key(alias)), place)
+                    self.regions_anywhere.setdefault(place_key(alias), place)
+
+    @classmethod
+    def load(cls, path: str = GAZETTEER_PATH) -> 'Gazetteer':
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def country(self, name: Optional[str]) -> Optional[Place]:
+        if not name:
+            return None
+        for window in _word_windows(name):
+            if window in self.countries:
+                return self.countries[window]
+        return None
+
+    def locate(self, country: Optional[str], region: Optional[str] = None) -> Optional[Place]:
+        """
+        Lieu le plus précis trouvé : une région du pays, sinon une région
+        homonyme ailleurs (pays inconnu du gazetier), sinon le pays lui-même.
+        """
+        country_place = self.country(country)
+        country_key = place_key(country_place.name) if country_place else None
+        windows = list(_word_windows(region)) if region else []
+        if country_key:
+            for window in windows:
+                place = self.regions.get((country_key, window))
+                if place:
+                    return place
+        else:
+            # Le pays peut être une région (Martinique) ou une ville (Hong Kong)
+            for window in [*_word_windows(country or ''), *windows]:
+                place = self.regions_anywhere.get(window)
+                if place:
+                    return place
+        # « Sud de l'Italie » ou un pays cité dans la région
+        for window in windows:
+            if window in self.countries and (not country_place or self.countries[window] == country_place):
+                return self.countries[window]
+        return country_place
+
+
+@functools.lru_cache(maxsize=1)
+def get_gazetteer() -> Gazetteer:
+    return Gazetteer.load()
+
+
+def recipe_coordinates(country: Optional[str], region: Optional[str]) -> Tuple[Optional[float], Optional[float]]:
+    """Latitude et longitude d'une recette ; (None, None) si le lieu est inconnu."""
+    place = get_gazetteer().locate(country, region)
+    if place is None:
+        logger.warning(f"⚠️ Lieu introuvable dans le gazetier: {country} / {region}")
+        return None, None
+    return place.latitude, place.longitude
+
+
+def backfill_coordinates(client) -> int:
+    """Recalcule latitude et longitude des recettes existantes ; retourne le nombre de mises à jour."""
+    rows: List[dict] = []
+    page_size = 1000
+    while True:
+        page = (client.table('recipes').select('id,country,region,latitude,longitude')
+                .order('id').range(len(rows), len(rows) + page_size - 1).execute().data or [])
+        rows.extend(page)
+        if len(page) < page_size:
+            break
+    updated = 0
+    for row in rows:
+        latitude, longitude = recipe_coordinates(row['country'], row.get('region'))
+        if latitude is None or (row.get('latitude'), row.get('longitude')) == (latitude, longitude):
+            continue
+        client.table('recipes').update({'latitude': latitude, 'longitude': longitude}).eq('id', row['id']).execute()
+        updated += 1
+    logger.info(f"📍 {updated} recettes géolocalisées sur {len(rows)}")
+    return updated
+
+
+if __name__ == '__main__':
+    import argparse
+    from clients import get_supabase_client
+
+    parser = argparse.ArgumentParser(description="Géocodage hors ligne des recettes")
+    parser.add_argument('--backfill', action='store_true', help="Met à jour les coordonnées des recettes existantes")
+    parser.add_argument('country', nargs='?', help="Pays à localiser")
+    parser.add_argument('region', nargs='?', help="Région à localiser")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    if args.backfill:
+        backfill_coordinates(get_supabase_client())
+    else:
+        print(get_gazetteer().locate(args.country, args.region))
@@ -0,0 +1,163 @@
+"""
+Journal des générations en cours, persisté dans SQLite.
+
+Chaque prompt terminé y est enregistré avec l'empreinte de son prompt ; une fois
+la recette assemblée, ses données y sont gardées jusqu'à la sauvegarde dans
+Supabase. Une nouvelle tentative après un échec (prompt tardif, insertion)
+reprend à la première étape incomplète au lieu de tout régénérer.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from recipe_names import normalize_recipe_name
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+JOURNAL_GENERATING = 'generating'
+JOURNAL_GENERATED = 'generated'
+JOURNAL_SAVED = 'saved'
+JOURNAL_FAILED = 'failed'
+
+DAY = 24 * 3600
+
+
+class GenerationJournal:
+    """
+    Sorties des prompts et données assemblées, par recette (nom normalisé).
+    Les entrées des recettes sauvegardées sont effacées ; celles des échecs
+    sont gardées `retention` secondes pour une reprise.
+    """
+
+    def __init__(self, path: str, retention: float = 7 * DAY):
+        self.path = path
+        self.retention = retention
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS journal_recipes (
+                    recipe_key TEXT PRIMARY KEY,
+                    recipe_name TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    recipe_data TEXT,
+                    recipe_id INTEGER,
+                    error TEXT,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS journal_stages (
+                    recipe_key TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    prompt_hash TEXT NOT NULL,
+                    output TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (recipe_key, stage)
+                );
+            """)
+            expired = time.time() - retention
+            conn.execute('DELETE FROM journal_stages WHERE updated_at < ?', (expired,))
+            conn.execute('DELETE FROM journal_recipes WHERE updated_at < ?', (expired,))
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _set_recipe(self, conn, recipe_name: str, status: str, **fields) -> None:
+        row = {'recipe_data': None, 'recipe_id': None, 'error': None, **fields}
+        conn.execute(
+            'INSERT INTO journal_recipes (recipe_key, recipe_name, status, recipe_data, recipe_id, error, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (recipe_key) DO UPDATE SET recipe_name = excluded.recipe_name, status = excluded.status, '
+            'recipe_data = COALESCE(excluded.recipe_data, journal_recipes.recipe_data), '
+            'recipe_id = excluded.recipe_id, error = excluded.error, updated_at = excluded.updated_at',
+            (normalize_recipe_name(recipe_name), recipe_name, status, row['recipe_data'], row['recipe_id'],
+             row['error'], time.time())
+        )
+
+    def stage_output(self, recipe_name: str, stage: str, prompt_hash: str) -> Optional[str]:
+        """Sortie journalisée de l'étape, si elle a été produite par le même prompt."""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT output FROM journal_stages WHERE recipe_key = ? AND stage = ? AND prompt_hash = ?',
+                (normalize_recipe_name(recipe_name), stage, prompt_hash)
+            ).fetchone()
+        return row[0] if row else None
+
+    def record_stage(self, recipe_name: str, stage: str, prompt_hash: str, output: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO journal_stages (recipe_key, stage, prompt_hash, output, updated_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (normalize_recipe_name(recipe_name), stage, prompt_hash, output, time.time())
+            )
+            self._set_recipe(conn, recipe_name, JOURNAL_GENERATING)
+
+    def completed_stages(self, recipe_name: str) -> Dict[str, str]:
+        """Étapes déjà produites pour la recette : étape -> sortie."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT stage, output FROM journal_stages WHERE recipe_key = ?', (normalize_recipe_name(recipe_name),)
+            ).fetchall()
+        return dict(rows)
+
+    def record_recipe_data(self, recipe_name: str, recipe_data: dict) -> None:
+        with self._connect() as conn:
+            self._set_recipe(conn, recipe_name, JOURNAL_GENERATED, recipe_data=json.dumps(recipe_data, ensure_ascii=False))
+
+    def recipe_data(self, recipe_name: str) -> Optional[dict]:
+        """Données d'une recette générée mais pas encore sauvegardée."""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT recipe_data FROM journal_recipes WHERE recipe_key = ? AND status IN (?, ?)',
+                (normalize_recipe_name(recipe_name), JOURNAL_GENERATED, JOURNAL_FAILED)
+            ).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def record_failure(self, recipe_name: str, error: str) -> None:
+        with self._connect() as conn:
+            self._set_recipe(conn, recipe_name, JOURNAL_FAILED, error=error)
+
+    def record_saved(self, recipe_name: str, recipe_id: int) -> None:
+        """La recette est en base : ses sorties intermédiaires ne servent plus."""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM journal_stages WHERE recipe_key = ?', (normalize_recipe_name(recipe_name),))
+            self._set_recipe(conn, recipe_name, JOURNAL_SAVED, recipe_id=recipe_id)
+            conn.execute('UPDATE journal_recipes SET recipe_data = NULL WHERE recipe_key = ?',
+                         (normalize_recipe_name(recipe_name),))
+
+    def status(self, recipe_name: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT recipe_name, status, recipe_id, error, updated_at FROM journal_recipes WHERE recipe_key = ?',
+                (normalize_recipe_name(recipe_name),)
+            ).fetchone()
+        if not row:
+            return None
+        return dict(zip(('recipe_name', 'status', 'recipe_id', 'error', 'updated_at'), row))
+
+
+_journal: Optional[GenerationJournal] = None
+_lock = threading.Lock()
+
+
+def get_generation_journal() -> Optional[GenerationJournal]:
+    """Journal partagé par le processus ; GENERATION_JOURNAL_PATH vide le désactive."""
+    global _journal
+    path = os.getenv('GENERATION_JOURNAL_PATH', 'generation_journal.sqlite3')
+    if not path:
+        return None
+    if _journal is None:
+        with _lock:
+            if _journal is None:
+                _journal = GenerationJournal(path, retention=float(os.getenv('GENERATION_JOURNAL_RETENTION', 7 * DAY)))
+    return _journal
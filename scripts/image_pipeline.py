@@ -0,0 +1,342 @@
+"""
+Images des recettes, traitées une fois après la génération.
+
+Chaque image (photo de la recette, fonds des étapes, playlist, vin) est
+téléchargée une seule fois, rangée sous l'empreinte SHA-256 de son contenu
+puis déclinée en variantes redimensionnées WebP et JPEG. Les lignes de la
+recette pointent ensuite vers ces fichiers immuables au lieu des URL de
+recherche source.unsplash.com, qui changent d'image à chaque chargement.
+
+    IMAGE_PIPELINE=1           active l'étape dans generate_recipe
+    IMAGE_SOURCE_DIR=...       images locales à la place du réseau (essais, hors ligne)
+    IMAGE_STORE_DIR=...        répertoire des fichiers, servis sous /images/
+    IMAGE_PUBLIC_URL=...       URL publique de ce répertoire
+    IMAGE_STORE=supabase       stockage dans le bucket IMAGE_BUCKET de Supabase Storage
+
+Les variantes demandent Pillow (requirements.txt) : sans lui, IMAGE_PIPELINE=1
+fait échouer la génération plutôt que de servir des originaux non redimensionnés.
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+from recipe_names import normalize_recipe_name
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Nom -> largeur maximale, sans agrandissement de l'original
+VARIANTS = (('thumb', 320), ('card', 800), ('full', 1600))
+FORMATS = (('webp', 'webp', 'image/webp'), ('jpeg', 'jpg', 'image/jpeg'))
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+MAX_IMAGE_BYTES = 15 * 1024 * 1024
+FETCH_CONCURRENCY = int(os.getenv('IMAGE_FETCH_CONCURRENCY', 4))
+
+# Signature des formats acceptés : (octets de tête, extension, type MIME)
+SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png', 'image/png'),
+    (b'GIF8', 'gif', 'image/gif'),
+)
+
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'images')
+IMAGE_STORE_DIR = os.getenv('IMAGE_STORE_DIR', DEFAULT_STORE_DIR)
+IMAGE_PUBLIC_URL = os.getenv('IMAGE_PUBLIC_URL', 'http://localhost:5000/images').rstrip('/')
+# Cache HTTP des fichiers servis : leur chemin change avec leur contenu
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Champ d'image de chaque ligne et variante qui y est référencée
+IMAGE_FIELDS = (
+    ('recipe', 'image_url', 'card'),
+    ('steps', 'story_background_image_url', 'full'),
+    ('playlist', 'image_url', 'thumb'),
+    ('wine_pairing', 'image_url', 'thumb'),
+)
+
+
+def images_enabled() -> bool:
+    return os.getenv('IMAGE_PIPELINE', '0') == '1'
+
+
+def sniff_image(data: bytes) -> Tuple[str, str]:
+    """(extension, type MIME) d'après les premiers octets ; ValueError si ce n'est pas une image."""
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp', 'image/webp'
+    for signature, extension, content_type in SIGNATURES:
+        if data.startswith(signature):
+            return extension, content_type
+    raise ValueError("Format d'image non reconnu")
+
+
+@dataclass(frozen=True)
+class ImageAsset:
+    digest: str
+    width: Optional[int]
+    height: Optional[int]
+    # Variante -> {'webp': url, 'jpeg': url, 'width': ..., 'height': ...}
+    variants: Dict[str, dict]
+
+    def url(self, variant: str = 'card', image_format: str = 'jpeg') -> str:
+        return self.variants[variant][image_format]
+
+    def manifest(self) -> dict:
+        return {'digest': self.digest, 'width': self.width, 'height': self.height, 'variants': self.variants}
+
+
+class LocalImageStore:
+    """Fichiers sur disque, publiés sous `public_url` (route /images des serveurs ou CDN)."""
+
+    def __init__(self, root: str = IMAGE_STORE_DIR, public_url: str = IMAGE_PUBLIC_URL):
+        self.root = root
+        self.public_url = public_url.rstrip('/')
+
+    def _path(self, path: str) -> str:
+        return os.path.join(self.root, *path.split('/'))
+
+    def get(self, path: str) -> Optional[bytes]:
+        try:
+            with open(self._path(path), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, path: str, data: bytes, content_type: str) -> None:
+        target = self._path(path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Écriture atomique : un lecteur ne voit jamais de fichier tronqué
+        temporary = f'{target}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, target)
+
+    def url(self, path: str) -> str:
+        return f'{self.public_url}/{path}'
+
+    def owns(self, url: str) -> bool:
+        return url.startswith(f'{self.public_url}/')
+
+
+class SupabaseImageStore:
+    """Bucket public de Supabase Storage."""
+
+    def __init__(self, client, bucket: str):
+        self.bucket_name = bucket
+        self.bucket = client.storage.from_(bucket)
+
+    def get(self, path: str) -> Optional[bytes]:
+        try:
+            return self.bucket.download(path)
+        except Exception:
+            return None
+
+    def put(self, path: str, data: bytes, content_type: str) -> None:
+        self.bucket.upload(path, data, {'content-type': content_type, 'cache-control': '31536000', 'upsert': 'true'})
+
+    def url(self, path: str) -> str:
+        return self.bucket.get_public_url(path)
+
+    def owns(self, url: str) -> bool:
+        return f'/storage/v1/object/public/{self.bucket_name}/' in url
+
+
+class HttpImageSource:
+    def fetch(self, url: str) -> bytes:
+        from clients import get_http_client
+        chunks, size = [], 0
+        # Lecture en flux : le téléchargement s'arrête dès que la limite est dépassée
+        with get_http_client().stream('GET', url) as response:
+            response.raise_for_status()
+            for chunk in response.iter_bytes():
+                size += len(chunk)
+                if size > MAX_IMAGE_BYTES:
+                    raise ValueError(f"Image trop lourde (plus de {MAX_IMAGE_BYTES} octets)")
+                chunks.append(chunk)
+        return b''.join(chunks)
+
+
+class LocalImageSource:
+    """
+    Répertoire d'images qui remplace le réseau : le fichier dont le nom
+    correspond à un mot-clé de l'URL (…/?wine -> wine.jpg), sinon un fichier
+    choisi de façon stable d'après l'URL.
+    """
+
+    def __init__(self, root: str):
+        self.files = sorted(
+            os.path.join(root, name) for name in os.listdir(root)
+            if os.path.isfile(os.path.join(root, name)) and not name.startswith('.')
+        )
+        if not self.files:
+            raise ValueError(f"Aucune image dans {root}")
+        self.by_keyword = {normalize_recipe_name(os.path.splitext(os.path.basename(path))[0]): path
+                           for path in self.files}
+
+    def fetch(self, url: str) -> bytes:
+        keywords = [normalize_recipe_name(keyword) for keyword in unquote(urlsplit(url).query).split(',')]
+        path = next((self.by_keyword[keyword] for keyword in keywords if keyword in self.by_keyword), None)
+        if path is None:
+            path = self.files[int(hashlib.sha1(url.encode('utf-8')).hexdigest(), 16) % len(self.files)]
+        with open(path, 'rb') as f:
+            return f.read()
+
+
+def _encode(image, image_format: str) -> bytes:
+    buffer = io.BytesIO()
+    if image_format == 'webp':
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+    else:
+        if image.mode != 'RGB':
+            # Le JPEG n'a pas de transparence : fond blanc
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+            image = background
+        image.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+class ImagePipeline:
+    """
+    Ingestion des images : une URL déjà vue n'est plus téléchargée (alias
+    urls/<sha1 de l'URL>.json) et un contenu déjà connu n'est plus retraité
+    (manifeste <empreinte>/manifest.json).
+    """
+
+    def __init__(self, source, store):
+        self.source = source
+        self.store = store
+        self._by_url: Dict[str, ImageAsset] = {}
+        self._lock = threading.Lock()
+
+    def _asset(self, manifest: bytes) -> ImageAsset:
+        data = json.loads(manifest)
+        return ImageAsset(data['digest'], data['width'], data['height'], data['variants'])
+
+    def ingest(self, data: bytes) -> ImageAsset:
+        """Range une image sous son empreinte et calcule ses variantes (une seule fois par contenu)."""
+        digest = hashlib.sha256(data).hexdigest()
+        prefix = f'{digest[:2]}/{digest}'
+        manifest = self.store.get(f'{prefix}/manifest.json')
+        if manifest:
+            return self._asset(manifest)
+        extension, content_type = sniff_image(data)
+        self.store.put(f'{prefix}/original.{extension}', data, content_type)
+        with Image.open(io.BytesIO(data)) as opened:
+            image = ImageOps.exif_transpose(opened)
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        variants = {}
+        for name, max_width in VARIANTS:
+            width = min(max_width, image.width)
+            height = max(1, round(image.height * width / image.width))
+            # Une variante de même taille que la précédente réutilise ses fichiers
+            previous = next((v for v in variants.values() if v['width'] == width), None)
+            if previous:
+                variants[name] = previous
+                continue
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            variant = {'width': width, 'height': height}
+            for image_format, extension, content_type in FORMATS:
+                path = f'{prefix}/{name}.{extension}'
+                self.store.put(path, _encode(resized, image_format), content_type)
+                variant[image_format] = self.store.url(path)
+            variants[name] = variant
+        asset = ImageAsset(digest, image.width, image.height, variants)
+        self.store.put(f'{prefix}/manifest.json', json.dumps(asset.manifest()).encode('utf-8'), 'application/json')
+        return asset
+
+    def ingest_url(self, url: str) -> ImageAsset:
+        with self._lock:
+            asset = self._by_url.get(url)
+        if asset:
+            return asset
+        alias = f"urls/{hashlib.sha1(url.encode('utf-8')).hexdigest()}.json"
+        digest = self.store.get(alias)
+        manifest = self.store.get(f'{digest[:2].decode()}/{digest.decode()}/manifest.json') if digest else None
+        if manifest:
+            asset = self._asset(manifest)
+        else:
+            asset = self.ingest(self.source.fetch(url))
+            self.store.put(alias, asset.digest.encode('ascii'), 'text/plain')
+        with self._lock:
+            self._by_url[url] = asset
+        return asset
+
+    def _safe_ingest(self, url: str) -> Optional[ImageAsset]:
+        try:
+            return self.ingest_url(url)
+        except Exception as e:
+            logger.warning(f"⚠️ Image non traitée, URL d'origine conservée ({url}): {str(e)}")
+            return None
+
+    def process_recipe(self, recipe_data: dict) -> dict:
+        """
+        Copie de la recette dont les champs d'image pointent vers les variantes ;
+        la recette reçoit aussi image_hash et image_variants. Une image en échec
+        garde son URL d'origine, sans faire échouer la génération.
+        """
+        rows: Dict[str, List[dict]] = {
+            section: [dict(row) for row in recipe_data[section]] if isinstance(recipe_data[section], list)
+            else [dict(recipe_data[section])]
+            for section, _, _ in IMAGE_FIELDS
+        }
+        urls = list(dict.fromkeys(
+            row[field] for section, field, _ in IMAGE_FIELDS for row in rows[section]
+            # Recette reprise après une tentative précédente : ses images sont déjà traitées
+            if row.get(field) and not self.store.owns(row[field])
+        ))
+        with ThreadPoolExecutor(max_workers=max(1, min(FETCH_CONCURRENCY, len(urls) or 1))) as executor:
+            assets = dict(zip(urls, executor.map(self._safe_ingest, urls)))
+        for section, field, variant in IMAGE_FIELDS:
+            for row in rows[section]:
+                asset = assets.get(row.get(field))
+                if asset:
+                    if section == 'recipe':
+                        row['image_hash'] = asset.digest
+                        row['image_variants'] = asset.variants
+                    row[field] = asset.url(variant)
+        logger.info(f"🖼️ {sum(1 for asset in assets.values() if asset)}/{len(urls)} images traitées")
+        return {
+            **recipe_data,
+            **{section: rows[section] if isinstance(recipe_data[section], list) else rows[section][0]
+               for section in rows}
+        }
+
+
+def create_image_store():
+    if os.getenv('IMAGE_STORE', 'local') == 'supabase':
+        from clients import get_supabase_client
+        return SupabaseImageStore(get_supabase_client(), os.getenv('IMAGE_BUCKET', 'recipe-images'))
+    return LocalImageStore()
+
+
+_pipeline: Optional[ImagePipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_image_pipeline() -> ImagePipeline:
+    """Pipeline partagé du processus, selon IMAGE_SOURCE_DIR et IMAGE_STORE."""
+    global _pipeline
+    if Image is None:
+        raise RuntimeError("IMAGE_PIPELINE=1 demande Pillow pour les variantes (pip install -r requirements.txt)")
+    with _pipeline_lock:
+        if _pipeline is None:
+            source_dir = os.getenv('IMAGE_SOURCE_DIR')
+            source = LocalImageSource(source_dir) if source_dir else HttpImageSource()
+            _pipeline = ImagePipeline(source, create_image_store())
+        return _pipeline
+
+
+def process_recipe_images(recipe_data: dict) -> dict:
+    return get_image_pipeline().process_recipe(recipe_data)
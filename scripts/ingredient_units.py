@@ -0,0 +1,172 @@
+"""
+Conversion des quantités d'ingrédients, saisies en texte libre par le modèle
+("1/2", "1,5", "30 cl", "2 cuillères à soupe"), vers une valeur numérique dans
+une unité canonique : grammes, millilitres ou pièces. Appelé une fois à
+l'écriture de la recette (colonnes quantity_value, canonical_unit et name_key
+de la table ingredients).
+"""
+import math
+import re
+from typing import Optional, Tuple
+
+from recipe_names import normalize_recipe_name
+
+# Unités canoniques
+GRAM = 'g'
+MILLILITER = 'ml'
+PIECE = ''
+
+# Forme normalisée de l'unité -> (unité canonique, facteur)
+UNIT_CONVERSIONS = {
+    'g': (GRAM, 1), 'gr': (GRAM, 1), 'gramme': (GRAM, 1),
+    'kg': (GRAM, 1000), 'kilo': (GRAM, 1000), 'kilogramme': (GRAM, 1000),
+    'mg': (GRAM, 0.001),
+    'ml': (MILLILITER, 1), 'millilitre': (MILLILITER, 1),
+    'cl': (MILLILITER, 10), 'centilitre': (MILLILITER, 10),
+    'dl': (MILLILITER, 100), 'decilitre': (MILLILITER, 100),
+    'l': (MILLILITER, 1000), 'litre': (MILLILITER, 1000),
+    'cuillere a soupe': (MILLILITER, 15), 'c a soupe': (MILLILITER, 15), 'c a s': (MILLILITER, 15),
+    'cas': (MILLILITER, 15), 'cs': (MILLILITER, 15), 'tbsp': (MILLILITER, 15),
+    'cuillere a cafe': (MILLILITER, 5), 'c a cafe': (MILLILITER, 5), 'c a c': (MILLILITER, 5),
+    'cac': (MILLILITER, 5), 'cc': (MILLILITER, 5), 'tsp': (MILLILITER, 5),
+    'tasse': (MILLILITER, 240), 'cup': (MILLILITER, 240), 'verre': (MILLILITER, 200),
+    'unite': (PIECE, 1), 'piece': (PIECE, 1), 'pc': (PIECE, 1), 'pcs': (PIECE, 1),
+}
+
+# Unités de comptage gardées telles quelles (3 gousses d'ail, 1 pincée de safran) : forme normalisée -> affichage
+COUNT_UNITS = {
+    'gousse': 'gousse', 'pincee': 'pincée', 'branche': 'branche', 'brin': 'brin', 'tranche': 'tranche',
+    'feuille': 'feuille', 'boite': 'boîte', 'sachet': 'sachet', 'botte': 'botte', 'poignee': 'poignée',
+    'morceau': 'morceau', 'filet': 'filet', 'zeste': 'zeste', 'baton': 'bâton', 'etoile': 'étoile',
+    'tige': 'tige', 'pot': 'pot', 'paquet': 'paquet', 'bouquet': 'bouquet', 'noix': 'noix',
+    'noisette': 'noisette', 'cube': 'cube', 'carre': 'carré', 'rouleau': 'rouleau',
+    'barquette': 'barquette', 'tablette': 'tablette',
+}
+
+# Mots sans quantité chiffrable (au goût, selon la saison...)
+UNQUANTIFIED_UNITS = {'au gout', 'selon le gout', 'a volonte', 'quelques', 'un peu'}
+
+FRACTIONS = {'½': '1/2', '¼': '1/4', '¾': '3/4', '⅓': '1/3', '⅔': '2/3', '⅛': '1/8'}
+NUMBER_WORDS = {
+    'un': 1, 'une': 1, 'deux': 2, 'trois': 3, 'quatre': 4, 'cinq': 5, 'six': 6,
+    'sept': 7, 'huit': 8, 'neuf': 9, 'dix': 10, 'douze': 12, 'demi': 0.5, 'demie': 0.5,
+}
+NAME_ARTICLES = {'de', 'd', 'du', 'des', 'la', 'le', 'les', 'l'}
+
+_LEADING_ARTICLE_RE = re.compile(r"^(?:(?:des|du|de)\s+|d['’]\s*)", re.IGNORECASE)
+_NUMBER = r"\d+(?:\.\d+)?(?:\s*/\s*\d+)?"
+_QUANTITY_RE = re.compile(rf"^\s*(?P<whole>\d+\s+(?=\d+\s*/))?(?P<low>{_NUMBER})"
+                          rf"(?:\s*(?:-|à|a|~)\s*(?P<high>{_NUMBER}))?\s*(?P<rest>.*)$")
+
+
+def _fold(text: str) -> str:
+    return normalize_recipe_name(text.replace('œ', 'oe').replace('Œ', 'oe').replace('æ', 'ae'))
+
+
+def singular(word: str) -> str:
+    return word[:-1] if len(word) > 3 and word[-1] in 'sx' else word
+
+
+def _number(text: str) -> float:
+    if '/' in text:
+        numerator, denominator = text.split('/')
+        return float(numerator) / float(denominator)
+    return float(text)
+
+
+def parse_quantity(text: Optional[str]) -> Tuple[Optional[float], str]:
+    """
+    Valeur numérique d'une quantité et le texte qui la suit ("200g" -> 200, "g").
+    Pour un intervalle ("2-3"), la borne haute : c'est ce qu'il faut acheter.
+    """
+    text = (text or '').strip().lower()
+    for symbol, fraction in FRACTIONS.items():
+        text = text.replace(symbol, f' {fraction}')
+    text = text.replace(',', '.').strip()
+    match = _QUANTITY_RE.match(text)
+    if match:
+        value = _number(match['high'] or match['low'])
+        if match['whole'] and not match['high']:
+            value += float(match['whole'])
+        return (value if math.isfinite(value) else None), match['rest'].strip()
+    first, _, rest = text.partition(' ')
+    if first in NUMBER_WORDS:
+        return float(NUMBER_WORDS[first]), rest.strip()
+    return None, text
+
+
+def canonical_unit(unit: str) -> Optional[Tuple[str, float]]:
+    """(unité canonique, facteur) pour une unité connue, None sinon."""
+    key = ' '.join(singular(word) for word in _fold(unit).split())
+    if key in UNIT_CONVERSIONS:
+        return UNIT_CONVERSIONS[key]
+    if key in COUNT_UNITS:
+        return key, 1
+    return None
+
+
+def ingredient_name_key(name: str) -> str:
+    """Clé de regroupement : sans accents, articles ni pluriels (« Oignons verts » -> « oignon vert »)."""
+    words = _fold(name).split()
+    while len(words) > 1 and words[0] in NAME_ARTICLES:
+        words = words[1:]
+    return ' '.join(singular(word) for word in words)
+
+
+def split_ingredient(ingredient: dict) -> Tuple[Optional[float], str, Tuple[str, float]]:
+    """
+    (valeur, nom, (unité canonique, facteur)) d'un ingrédient {name, quantity, unit}.
+    Une « unité » inconnue vient en général d'une ligne sans unité mal découpée
+    (« 1 oignon émincé ») : elle est rendue au nom, compté en pièces.
+    """
+    name = (ingredient.get('name') or '').strip()
+    unit = (ingredient.get('unit') or '').strip()
+    value, rest = parse_quantity(ingredient.get('quantity'))
+    if rest and not unit:
+        unit = rest
+    conversion = canonical_unit(unit) if unit else (PIECE, 1)
+    if conversion is None:
+        if _fold(unit) not in UNQUANTIFIED_UNITS:
+            name = f'{unit} {name}'
+        conversion = (PIECE, 1)
+    return value, name, conversion
+
+
+def display_name(name: str) -> str:
+    """Nom affiché dans une liste : sans article de tête (« d'ail » -> « Ail »)."""
+    name = _LEADING_ARTICLE_RE.sub('', name.strip(), count=1) or name.strip()
+    return name[:1].upper() + name[1:]
+
+
+def canonical_ingredient(ingredient: dict) -> dict:
+    """Colonnes canoniques d'un ingrédient : quantity_value (None si non chiffrée), canonical_unit, name_key."""
+    value, name, (unit, factor) = split_ingredient(ingredient)
+    return {
+        'quantity_value': None if value is None else round(value * factor, 3),
+        'canonical_unit': unit,
+        'name_key': ingredient_name_key(name)
+    }
+
+
+def _format_number(value: float) -> str:
+    return f"{round(value, 2):g}".replace('.', ',')
+
+
+def display_quantity(value: float, unit: str) -> Tuple[str, str]:
+    """Quantité canonique -> texte affiché, dans l'unité la plus lisible."""
+    if unit == GRAM:
+        return (_format_number(value / 1000), 'kg') if value >= 1000 else (_format_number(math.ceil(value)), 'g')
+    if unit == MILLILITER:
+        if value >= 1000:
+            return _format_number(value / 1000), 'l'
+        if value < 15:
+            return _format_number(math.ceil(value / 5 * 2) / 2), 'c. à café'
+        if value < 60:
+            return _format_number(math.ceil(value / 15 * 2) / 2), 'c. à soupe'
+        return _format_number(math.ceil(value)), 'ml'
+    # On n'achète pas 1,3 oeuf
+    count = math.ceil(value - 1e-9)
+    label = COUNT_UNITS.get(unit, unit)
+    if count > 1 and label and label[-1] not in 'sx':
+        label += 'x' if label.endswith('eau') else 's'
+    return _format_number(count), label
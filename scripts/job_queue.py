@@ -0,0 +1,603 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+TERMINAL_STATUSES = (JOB_COMPLETED, JOB_FAILED)
+# Durée du bail d'un job en cours, prolongé par le worker tant qu'il tourne
+LEASE_DURATION = float(os.getenv('JOB_LEASE_SECONDS', 60))
+MAX_ATTEMPTS = 3
+# Attente maximale d'un worker entre deux accès à une file en erreur
+WORKER_MAX_BACKOFF = 30.0
+# Marque, dans les événements d'un job repris, le début de la nouvelle tentative
+RETRYING_EVENT = 'retrying'
+
+
+class QueueFullError(Exception):
+    """Levée quand la file d'attente a atteint sa capacité maximale."""
+
+
+class InMemoryJobBackend:
+    """
+    File de jobs en mémoire, propre au processus courant. Les jobs terminés et
+    leurs événements sont oubliés après `retention` secondes.
+    """
+
+    def __init__(self, retention: float = 600.0):
+        self.retention = retention
+        self._jobs: Dict[str, dict] = {}
+        self._events: Dict[str, List[dict]] = {}
+        self._active: Dict[str, str] = {}
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._cond = threading.Condition()
+
+    def enqueue(self, job_id: str, payload: dict, dedup_key: Optional[str] = None) -> Tuple[str, bool]:
+        """Crée le job, ou retourne le job actif de même clé. Retourne (id, créé)."""
+        now = time.time()
+        with self._cond:
+            self._forget_expired(now)
+            if dedup_key and dedup_key in self._active:
+                return self._active[dedup_key], False
+            self._jobs[job_id] = {
+                'id': job_id, 'status': JOB_PENDING, 'payload': payload, 'dedup_key': dedup_key,
+                'result': None, 'error': None, 'created_at': now, 'updated_at': now,
+            }
+            self._events[job_id] = []
+            if dedup_key:
+                self._active[dedup_key] = job_id
+        self._queue.put(job_id)
+        return job_id, True
+
+    def _forget_expired(self, now: float) -> None:
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job['status'] in TERMINAL_STATUSES and now - job['updated_at'] > self.retention]
+        for job_id in expired:
+            del self._jobs[job_id], self._events[job_id]
+
+    def active_job(self, dedup_key: str) -> Optional[str]:
+        """Job en attente ou en cours pour cette clé."""
+        with self._cond:
+            return self._active.get(dedup_key)
+
+    def claim(self, timeout: float) -> Optional[dict]:
+        try:
+            job_id = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        with self._cond:
+            job = self._jobs[job_id]
+            job['status'] = JOB_RUNNING
+            job['updated_at'] = time.time()
+            self._cond.notify_all()
+            return dict(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def pending_count(self) -> int:
+        return self._queue.qsize()
+
+    def heartbeat(self, job_id: str) -> None:
+        """Sans objet en mémoire : la file disparaît avec le processus qui exécute ses jobs."""
+
+    def set_status(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        with self._cond:
+            job = self._jobs[job_id]
+            job.update(status=status, result=result, error=error, updated_at=time.time())
+            if status in TERMINAL_STATUSES and self._active.get(job['dedup_key']) == job_id:
+                del self._active[job['dedup_key']]
+            self._cond.notify_all()
+
+    def append_event(self, job_id: str, event: dict) -> int:
+        with self._cond:
+            events = self._events[job_id]
+            events.append(event)
+            self._cond.notify_all()
+            return len(events)
+
+    def events_since(self, job_id: str, after: int, timeout: float) -> Tuple[List[Tuple[int, dict]], str]:
+        """Retourne les événements de numéro > after, en attendant au plus `timeout`."""
+        with self._cond:
+            deadline = time.time() + timeout
+            while True:
+                if job_id not in self._jobs:
+                    # Job oublié entre-temps : plus rien à attendre
+                    return [], JOB_FAILED
+                events = self._events[job_id]
+                status = self._jobs[job_id]['status']
+                if len(events) > after or status in TERMINAL_STATUSES:
+                    return list(enumerate(events[after:], start=after + 1)), status
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return [], status
+                self._cond.wait(remaining)
+
+
+# Job actif d'une clé de déduplication : un job en cours dont le bail a expiré n'attire plus de requêtes
+ACTIVE_JOB_QUERY = (
+    'SELECT id FROM jobs WHERE dedup_key = ? AND (status = ? OR (status = ? AND lease_expires_at > ?)) LIMIT 1'
+)
+
+
+class SQLiteJobBackend:
+    """
+    File de jobs persistée dans SQLite, partageable entre processus. Un job en
+    cours porte un bail (lease_expires_at) que son worker prolonge : à
+    l'expiration, le worker est présumé mort et le job est repris par un autre,
+    au plus MAX_ATTEMPTS fois. Les événements de la tentative interrompue sont
+    conservés et suivis d'un événement RETRYING_EVENT : à sa réception, un
+    client repart de zéro dans l'affichage de la progression. Les jobs terminés
+    et leurs événements sont supprimés après `retention` secondes.
+    """
+
+    def __init__(self, path: str, poll_interval: float = 0.2, lease_duration: float = LEASE_DURATION,
+                 retention: float = 600.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.lease_duration = lease_duration
+        self.retention = retention
+        self._pruned_at = 0.0
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    dedup_key TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    lease_expires_at REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS jobs_status_idx ON jobs (status, created_at);
+                CREATE INDEX IF NOT EXISTS jobs_dedup_idx ON jobs (dedup_key, status);
+                CREATE INDEX IF NOT EXISTS jobs_updated_idx ON jobs (status, updated_at);
+                CREATE TABLE IF NOT EXISTS job_events (
+                    job_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (job_id, seq)
+                );
+            """)
+            # Fichiers créés avant l'ajout des baux
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+            if 'lease_expires_at' not in columns:
+                conn.execute('ALTER TABLE jobs ADD COLUMN lease_expires_at REAL')
+            if 'attempts' not in columns:
+                conn.execute('ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0')
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.row_factory = sqlite3.Row
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> dict:
+        return {
+            'id': row['id'],
+            'status': row['status'],
+            'payload': json.loads(row['payload']),
+            'dedup_key': row['dedup_key'],
+            'result': json.loads(row['result']) if row['result'] is not None else None,
+            'error': row['error'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+        }
+
+    def enqueue(self, job_id: str, payload: dict, dedup_key: Optional[str] = None) -> Tuple[str, bool]:
+        now = time.time()
+        with self._connect() as conn:
+            # Vérification et insertion dans la même transaction pour être atomique entre processus
+            conn.execute('BEGIN IMMEDIATE')
+            self._prune(conn, now)
+            if dedup_key:
+                row = conn.execute(
+                    ACTIVE_JOB_QUERY,
+                    (dedup_key, JOB_PENDING, JOB_RUNNING, now),
+                ).fetchone()
+                if row:
+                    conn.execute('COMMIT')
+                    return row['id'], False
+            conn.execute(
+                'INSERT INTO jobs (id, status, payload, dedup_key, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (job_id, JOB_PENDING, json.dumps(payload), dedup_key, now, now),
+            )
+            conn.execute('COMMIT')
+            return job_id, True
+
+    def claim(self, timeout: float) -> Optional[dict]:
+        deadline = time.time() + timeout
+        while True:
+            now = time.time()
+            with self._connect() as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                self._fail_abandoned(conn, now)
+                # Jobs en attente, puis jobs dont le worker a cessé de prolonger le bail
+                row = conn.execute(
+                    'SELECT * FROM jobs WHERE status = ? OR (status = ? AND lease_expires_at <= ?) '
+                    'ORDER BY created_at LIMIT 1',
+                    (JOB_PENDING, JOB_RUNNING, now),
+                ).fetchone()
+                if row:
+                    conn.execute(
+                        'UPDATE jobs SET status = ?, updated_at = ?, lease_expires_at = ?, attempts = attempts + 1 '
+                        'WHERE id = ?',
+                        (JOB_RUNNING, now, now + self.lease_duration, row['id']),
+                    )
+                    if row['status'] == JOB_RUNNING:
+                        logger.warning(f"♻️ Bail expiré, job {row['id']} repris")
+                        self._insert_event(conn, row['id'], {
+                            'type': RETRYING_EVENT,
+                            'attempt': row['attempts'] + 1,
+                            'message': f"Nouvelle tentative ({row['attempts'] + 1}/{MAX_ATTEMPTS})",
+                        })
+                conn.execute('COMMIT')
+            if row:
+                job = self._row_to_job(row)
+                job['status'] = JOB_RUNNING
+                return job
+            if time.time() >= deadline:
+                return None
+            time.sleep(self.poll_interval)
+
+    def _prune(self, conn: sqlite3.Connection, now: float) -> None:
+        """Supprime les jobs terminés depuis plus de `retention` secondes, au plus une fois par minute."""
+        if now - self._pruned_at < min(60.0, self.retention):
+            return
+        self._pruned_at = now
+        expired = (JOB_COMPLETED, JOB_FAILED, now - self.retention)
+        conn.execute(
+            'DELETE FROM job_events WHERE job_id IN '
+            '(SELECT id FROM jobs WHERE status IN (?, ?) AND updated_at < ?)', expired,
+        )
+        removed = conn.execute('DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?', expired).rowcount
+        if removed:
+            logger.info(f"🧹 {removed} jobs terminés supprimés de la file")
+
+    @staticmethod
+    def _fail_abandoned(conn: sqlite3.Connection, now: float) -> None:
+        """Passe en échec les jobs dont le bail a expiré à chacune de leurs tentatives."""
+        conn.execute(
+            'UPDATE jobs SET status = ?, error = ?, updated_at = ?, lease_expires_at = NULL '
+            'WHERE status = ? AND lease_expires_at <= ? AND attempts >= ?',
+            (JOB_FAILED, f"Worker interrompu {MAX_ATTEMPTS} fois", now, JOB_RUNNING, now, MAX_ATTEMPTS),
+        )
+
+    def active_job(self, dedup_key: str) -> Optional[str]:
+        with self._connect() as conn:
+            row = conn.execute(
+                ACTIVE_JOB_QUERY,
+                (dedup_key, JOB_PENDING, JOB_RUNNING, time.time()),
+            ).fetchone()
+        return row['id'] if row else None
+
+    def heartbeat(self, job_id: str) -> None:
+        """Prolonge le bail du job tant que son worker est en vie."""
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND status = ?',
+                (time.time() + self.lease_duration, job_id, JOB_RUNNING),
+            )
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def pending_count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM jobs WHERE status = ?', (JOB_PENDING,)).fetchone()[0]
+
+    def set_status(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?, lease_expires_at = NULL WHERE id = ?',
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+            )
+
+    @staticmethod
+    def _insert_event(conn: sqlite3.Connection, job_id: str, event: dict) -> int:
+        seq = conn.execute(
+            'SELECT COALESCE(MAX(seq), 0) + 1 FROM job_events WHERE job_id = ?', (job_id,)
+        ).fetchone()[0]
+        conn.execute(
+            'INSERT INTO job_events (job_id, seq, data) VALUES (?, ?, ?)',
+            (job_id, seq, json.dumps(event)),
+        )
+        return seq
+
+    def append_event(self, job_id: str, event: dict) -> int:
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            seq = self._insert_event(conn, job_id, event)
+            conn.execute('COMMIT')
+            return seq
+
+    def events_since(self, job_id: str, after: int, timeout: float) -> Tuple[List[Tuple[int, dict]], str]:
+        deadline = time.time() + timeout
+        while True:
+            with self._connect() as conn:
+                job = conn.execute('SELECT status FROM jobs WHERE id = ?', (job_id,)).fetchone()
+                if job is None:
+                    return [], JOB_FAILED
+                status = job['status']
+                rows = conn.execute(
+                    'SELECT seq, data FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq',
+                    (job_id, after),
+                ).fetchall()
+            if rows or status in TERMINAL_STATUSES or time.time() >= deadline:
+                return [(row['seq'], json.loads(row['data'])) for row in rows], status
+            time.sleep(self.poll_interval)
+
+
+def create_job_backend():
+    """Instancie le backend choisi via JOB_QUEUE_BACKEND (memory ou sqlite)."""
+    backend = os.getenv('JOB_QUEUE_BACKEND', 'memory')
+    if backend == 'sqlite':
+        return SQLiteJobBackend(os.getenv('JOB_QUEUE_PATH', 'jobs.sqlite3'))
+    if backend == 'memory':
+        return InMemoryJobBackend()
+    raise ValueError(f"Backend de file inconnu: {backend}")
+
+
+class JobManager:
+    """
+    Pool borné de workers qui consomment la file de jobs.
+    Le handler reçoit le job et une fonction `emit(event)` pour publier
+    des événements de progression ; sa valeur de retour devient le résultat.
+    """
+
+    def __init__(self, backend, handler: Callable[[dict, Callable[[dict], None]], Any],
+                 max_workers: int = 4, max_pending: int = 100):
+        self.backend = backend
+        self.handler = handler
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._workers: List[threading.Thread] = []
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_workers(self) -> None:
+        # Démarrage paresseux : les threads ne survivent pas au fork des workers gunicorn
+        with self._lock:
+            if self._pid == os.getpid() and all(w.is_alive() for w in self._workers):
+                return
+            self._pid = os.getpid()
+            self._workers = [w for w in self._workers if w.is_alive()]
+            for i in range(len(self._workers), self.max_workers):
+                worker = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            logger.info(f"🧵 {self.max_workers} workers de génération actifs")
+
+    def _work(self) -> None:
+        # Une erreur de la file (SQLite verrouillé, disque plein) ne doit pas tuer le worker
+        failures = 0
+        while True:
+            try:
+                job = self.backend.claim(timeout=1.0)
+                failures = 0
+                if job is not None:
+                    self._run(job)
+            except Exception as e:
+                failures += 1
+                delay = min(WORKER_MAX_BACKOFF, 0.5 * 2 ** (failures - 1))
+                logger.error(f"File de jobs indisponible: {str(e)}, nouvel essai dans {delay:.1f}s")
+                time.sleep(delay)
+
+    def _run(self, job: dict) -> None:
+        job_id = job['id']
+        logger.info(f"▶️ Job {job_id} démarré")
+        stop_heartbeat = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job_id, stop_heartbeat),
+                         name=f"job-heartbeat-{job_id}", daemon=True).start()
+        try:
+            result = self.handler(job, lambda event: self.backend.append_event(job_id, event))
+        except Exception as e:
+            logger.error(f"❌ Job {job_id} en échec: {str(e)}")
+            self._finish(job_id, JOB_FAILED, error=str(e))
+        else:
+            if self._finish(job_id, JOB_COMPLETED, result=result):
+                logger.info(f"✅ Job {job_id} terminé")
+        finally:
+            stop_heartbeat.set()
+
+    def _finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> bool:
+        """Enregistre l'état final ; en cas d'échec, le job sera repris à l'expiration de son bail."""
+        try:
+            self.backend.set_status(job_id, status, result=result, error=error)
+            return True
+        except Exception as e:
+            logger.error(f"État {status} du job {job_id} non enregistré: {str(e)}")
+            return False
+
+    def _heartbeat(self, job_id: str, stop: threading.Event) -> None:
+        # Trois prolongations par bail : une écriture SQLite ralentie ne suffit pas à le perdre
+        while not stop.wait(getattr(self.backend, 'lease_duration', LEASE_DURATION) / 3):
+            try:
+                self.backend.heartbeat(job_id)
+            except Exception as e:
+                logger.warning(f"Bail du job {job_id} non prolongé: {str(e)}")
+
+    def submit(self, payload: dict, dedup_key: Optional[str] = None) -> Tuple[str, bool]:
+        """
+        Met un job en file et retourne (identifiant, créé) immédiatement.
+        Si un job de même `dedup_key` est en attente ou en cours, l'appelant
+        est rattaché à ce job au lieu d'en créer un nouveau (single-flight).
+        """
+        self._ensure_workers()
+        # Le rattachement à un job existant passe avant la limite : il n'ajoute rien à la file
+        job_id = self.backend.active_job(dedup_key) if dedup_key else None
+        if job_id:
+            logger.info(f"🔗 Requête rattachée au job en cours {job_id}")
+            return job_id, False
+        if self.backend.pending_count() >= self.max_pending:
+            raise QueueFullError("La file de génération est pleine")
+        job_id, created = self.backend.enqueue(uuid.uuid4().hex, payload, dedup_key)
+        if not created:
+            logger.info(f"🔗 Requête rattachée au job en cours {job_id}")
+        return job_id, created
+
+    def get(self, job_id: str) -> Optional[dict]:
+        return self.backend.get(job_id)
+
+    def events(self, job_id: str, after: int = 0, poll_timeout: float = 15.0) -> Iterator[Tuple[Optional[int], Optional[dict]]]:
+        """
+        Itère sur les événements du job jusqu'à sa fin. Produit (None, None)
+        quand aucun événement n'arrive pendant `poll_timeout`, ce qui permet
+        à l'appelant d'envoyer un keep-alive.
+        """
+        while True:
+            events, status = self.backend.events_since(job_id, after, poll_timeout)
+            for seq, event in events:
+                after = seq
+                yield seq, event
+            if status in TERMINAL_STATUSES and not events:
+                return
+            if not events:
+                yield None, None
+
+    def wait(self, job_id: str, poll_timeout: float = 15.0) -> dict:
+        """Bloque jusqu'à la fin du job et retourne son état final."""
+        for _ in self.events(job_id, poll_timeout=poll_timeout):
+            pass
+        return self.backend.get(job_id)
+
+
+class AsyncJobManager:
+    """
+    Équivalent de JobManager pour le serveur ASGI, en mémoire : chaque job est
+    une tâche asyncio de la boucle courante, sans thread dédié. Au plus
+    `max_running` handlers tournent en même temps, `max_pending` attendent.
+    Les jobs terminés sont oubliés après `retention` secondes.
+    """
+
+    def __init__(self, handler: Callable[[dict, Callable[[dict], None]], Awaitable[Any]],
+                 max_running: int = 200, max_pending: int = 1000, retention: float = 600.0):
+        self.handler = handler
+        self.max_running = max_running
+        self.max_pending = max_pending
+        self.retention = retention
+        self._jobs: Dict[str, dict] = {}
+        self._events: Dict[str, List[dict]] = {}
+        self._changed: Dict[str, asyncio.Event] = {}
+        self._active: Dict[str, str] = {}
+        self._tasks = set()
+        self._pending = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _forget_expired(self, now: float) -> None:
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job['status'] in TERMINAL_STATUSES and now - job['updated_at'] > self.retention]
+        for job_id in expired:
+            del self._jobs[job_id], self._events[job_id], self._changed[job_id]
+
+    def _notify(self, job_id: str) -> None:
+        self._changed[job_id].set()
+        self._changed[job_id] = asyncio.Event()
+
+    def _append_event(self, job_id: str, event: dict) -> None:
+        self._events[job_id].append(event)
+        self._notify(job_id)
+
+    def _set_status(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        job = self._jobs[job_id]
+        job.update(status=status, result=result, error=error, updated_at=time.time())
+        if status in TERMINAL_STATUSES and self._active.get(job['dedup_key']) == job_id:
+            del self._active[job['dedup_key']]
+        self._notify(job_id)
+
+    async def _run(self, job_id: str) -> None:
+        async with self._semaphore:
+            self._pending -= 1
+            self._set_status(job_id, JOB_RUNNING)
+            logger.info(f"▶️ Job {job_id} démarré")
+            try:
+                result = await self.handler(dict(self._jobs[job_id]), lambda event: self._append_event(job_id, event))
+                self._set_status(job_id, JOB_COMPLETED, result=result)
+                logger.info(f"✅ Job {job_id} terminé")
+            except Exception as e:
+                logger.error(f"❌ Job {job_id} en échec: {str(e)}")
+                self._set_status(job_id, JOB_FAILED, error=str(e))
+
+    def submit(self, payload: dict, dedup_key: Optional[str] = None) -> Tuple[str, bool]:
+        """Comme JobManager.submit ; à appeler depuis la boucle d'événements."""
+        now = time.time()
+        self._forget_expired(now)
+        if dedup_key and dedup_key in self._active:
+            job_id = self._active[dedup_key]
+            logger.info(f"🔗 Requête rattachée au job en cours {job_id}")
+            return job_id, False
+        if self._pending >= self.max_pending:
+            raise QueueFullError("La file de génération est pleine")
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_running)
+
+        job_id = uuid.uuid4().hex
+        self._jobs[job_id] = {
+            'id': job_id, 'status': JOB_PENDING, 'payload': payload, 'dedup_key': dedup_key,
+            'result': None, 'error': None, 'created_at': now, 'updated_at': now,
+        }
+        self._events[job_id] = []
+        self._changed[job_id] = asyncio.Event()
+        if dedup_key:
+            self._active[dedup_key] = job_id
+        self._pending += 1
+        task = asyncio.ensure_future(self._run(job_id))
+        # Référence forte : la boucle ne garde que des références faibles aux tâches
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job_id, True
+
+    def get(self, job_id: str) -> Optional[dict]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job else None
+
+    def pending_count(self) -> int:
+        return self._pending
+
+    async def events(self, job_id: str, after: int = 0,
+                     poll_timeout: float = 15.0) -> AsyncIterator[Tuple[Optional[int], Optional[dict]]]:
+        """Comme JobManager.events : (None, None) signale un keep-alive."""
+        while job_id in self._jobs:
+            events = self._events[job_id]
+            if len(events) > after:
+                for seq, event in enumerate(events[after:], start=after + 1):
+                    after = seq
+                    yield seq, event
+                continue
+            if self._jobs[job_id]['status'] in TERMINAL_STATUSES:
+                return
+            try:
+                await asyncio.wait_for(self._changed[job_id].wait(), poll_timeout)
+            except asyncio.TimeoutError:
+                yield None, None
+
+    async def wait(self, job_id: str, poll_timeout: float = 15.0) -> Optional[dict]:
+        async for _ in self.events(job_id, poll_timeout=poll_timeout):
+            pass
+        return self.get(job_id)
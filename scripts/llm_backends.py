@@ -0,0 +1,226 @@
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterator, Optional, Protocol, Tuple
+
+from clients import get_async_openai_client, get_openai_client
+from rate_limiter import RateGovernor
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
+
+
+@dataclass
+class AICompletion:
+    """Réponse d'un appel au modèle avec sa consommation de tokens."""
+    text: str
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    cached: bool = False
+    retries: int = 0
+
+
+class LLMBackend(Protocol):
+    """
+    Ce dont generate_recipe a besoin d'un modèle. `stage` identifie le prompt
+    (origin, steps...) quand il est connu ; les backends réels l'ignorent.
+    """
+    model: str
+
+    def complete(self, system: str, prompt: str, temperature: float, max_tokens: int,
+                 stage: Optional[str] = None) -> AICompletion: ...
+
+    def stream(self, system: str, prompt: str, temperature: float, max_tokens: int,
+               stage: Optional[str] = None) -> Iterator[str]: ...
+
+    def complete_structured(self, system: str, prompt: str, schema: dict, name: str,
+                            temperature: float, max_tokens: int) -> Tuple[str, AICompletion]: ...
+
+    # Variantes asynchrones, utilisées par le serveur ASGI
+    async def complete_async(self, system: str, prompt: str, temperature: float, max_tokens: int,
+                             stage: Optional[str] = None) -> AICompletion: ...
+
+    def stream_async(self, system: str, prompt: str, temperature: float, max_tokens: int,
+                     stage: Optional[str] = None) -> AsyncIterator[str]: ...
+
+    async def complete_structured_async(self, system: str, prompt: str, schema: dict, name: str,
+                                        temperature: float, max_tokens: int) -> Tuple[str, AICompletion]: ...
+
+
+def estimate_tokens(system: str, prompt: str, max_tokens: int) -> int:
+    """Estimation grossière (4 caractères par token) plus le maximum de la réponse."""
+    return (len(system) + len(prompt)) // 4 + max_tokens
+
+
+class OpenAIBackend:
+    """Chat Completions d'OpenAI, derrière le gouverneur de débit partagé."""
+
+    def __init__(self, model: str = OPENAI_MODEL, governor: Optional[RateGovernor] = None):
+        self.model = model
+        # Budgets du compte OpenAI ; RATE_LIMIT_STATE_PATH partage l'état entre workers
+        self.governor = governor or RateGovernor(
+            rpm=float(os.getenv('OPENAI_RPM', 3500)),
+            tpm=float(os.getenv('OPENAI_TPM', 90000)),
+            state_path=os.getenv('RATE_LIMIT_STATE_PATH') or None,
+            max_retries=int(os.getenv('OPENAI_MAX_RETRIES', 5))
+        )
+
+    def _create(self, estimated: int, **params):
+        return self.governor.call(
+            lambda: get_openai_client().chat.completions.create(model=self.model, **params), estimated
+        )
+
+    async def _create_async(self, estimated: int, **params):
+        return await self.governor.call_async(
+            lambda: get_async_openai_client().chat.completions.create(model=self.model, **params), estimated
+        )
+
+    @staticmethod
+    def _chat_params(system, prompt, temperature, max_tokens) -> dict:
+        return {
+            'messages': [
+                {"role": "system", "content": system},
+                {"role": "user", "content": prompt}
+            ],
+            'temperature': temperature,
+            'max_tokens': max_tokens
+        }
+
+    @staticmethod
+    def _tool_params(schema, name) -> dict:
+        return {
+            'tools': [{'type': 'function', 'function': {'name': name, 'parameters': schema}}],
+            'tool_choice': {'type': 'function', 'function': {'name': name}}
+        }
+
+    def _completion(self, response, estimated: int, retries: int, text: str) -> AICompletion:
+        usage = response.usage
+        self.governor.record_usage(estimated, usage.total_tokens if usage else None)
+        return self._to_completion(usage, retries, text)
+
+    async def _completion_async(self, response, estimated: int, retries: int, text: str) -> AICompletion:
+        usage = response.usage
+        await self.governor.record_usage_async(estimated, usage.total_tokens if usage else None)
+        return self._to_completion(usage, retries, text)
+
+    @staticmethod
+    def _to_completion(usage, retries: int, text: str) -> AICompletion:
+        return AICompletion(
+            text=text,
+            prompt_tokens=usage.prompt_tokens if usage else None,
+            completion_tokens=usage.completion_tokens if usage else None,
+            retries=retries
+        )
+
+    def complete(self, system, prompt, temperature, max_tokens, stage=None):
+        estimated = estimate_tokens(system, prompt, max_tokens)
+        try:
+            response, retries = self._create(estimated, **self._chat_params(system, prompt, temperature, max_tokens))
+        except Exception as e:
+            logger.error(f"Erreur lors de l'appel à OpenAI: {str(e)}")
+            raise
+        return self._completion(response, estimated, retries, response.choices[0].message.content.strip())
+
+    def stream(self, system, prompt, temperature, max_tokens, stage=None):
+        estimated = estimate_tokens(system, prompt, max_tokens)
+        try:
+            # Seule l'ouverture du flux est relancée : un fragment déjà transmis ne peut pas être repris
+            stream, _ = self._create(
+                estimated, stream=True, **self._chat_params(system, prompt, temperature, max_tokens)
+            )
+            chunks = 0
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    chunks += 1
+                    yield chunk.choices[0].delta.content
+            self.governor.record_usage(estimated, estimated - max_tokens + chunks)
+        except Exception as e:
+            logger.error(f"Erreur lors de l'appel à OpenAI (streaming): {str(e)}")
+            raise
+
+    def complete_structured(self, system, prompt, schema, name, temperature, max_tokens):
+        estimated = estimate_tokens(system, prompt, max_tokens)
+        try:
+            response, retries = self._create(
+                estimated, **self._chat_params(system, prompt, temperature, max_tokens), **self._tool_params(schema, name)
+            )
+        except Exception as e:
+            logger.error(f"Erreur lors de l'appel à OpenAI (sortie structurée): {str(e)}")
+            raise
+        arguments = response.choices[0].message.tool_calls[0].function.arguments
+        return arguments, self._completion(response, estimated, retries, arguments)
+
+    async def complete_async(self, system, prompt, temperature, max_tokens, stage=None):
+        estimated = estimate_tokens(system, prompt, max_tokens)
+        try:
+            response, retries = await self._create_async(
+                estimated, **self._chat_params(system, prompt, temperature, max_tokens)
+            )
+        except Exception as e:
+            logger.error(f"Erreur lors de l'appel à OpenAI: {str(e)}")
+            raise
+        return await self._completion_async(response, estimated, retries, response.choices[0].message.content.strip())
+
+    async def stream_async(self, system, prompt, temperature, max_tokens, stage=None):
+        estimated = estimate_tokens(system, prompt, max_tokens)
+        try:
+            stream, _ = await self._create_async(
+                estimated, stream=True, **self._chat_params(system, prompt, temperature, max_tokens)
+            )
+            chunks = 0
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    chunks += 1
+                    yield chunk.choices[0].delta.content
+            await self.governor.record_usage_async(estimated, estimated - max_tokens + chunks)
+        except Exception as e:
+            logger.error(f"Erreur lors de l'appel à OpenAI (streaming): {str(e)}")
+            raise
+
+    async def complete_structured_async(self, system, prompt, schema, name, temperature, max_tokens):
+        estimated = estimate_tokens(system, prompt, max_tokens)
+        try:
+            response, retries = await self._create_async(
+                estimated, **self._chat_params(system, prompt, temperature, max_tokens), **self._tool_params(schema, name)
+            )
+        except Exception as e:
+            logger.error(f"Erreur lors de l'appel à OpenAI (sortie structurée): {str(e)}")
+            raise
+        arguments = response.choices[0].message.tool_calls[0].function.arguments
+        return arguments, await self._completion_async(response, estimated, retries, arguments)
+
+
+def create_llm_backend(name: Optional[str] = None) -> LLMBackend:
+    """LLM_BACKEND vaut 'openai' (défaut) ou 'fake' (réponses locales, voir fake_llm)."""
+    name = name or os.getenv('LLM_BACKEND', 'openai')
+    if name == 'fake':
+        from fake_llm import FakeLLMBackend
+        logger.warning("⚠️ Backend LLM factice : aucune requête n'est envoyée à OpenAI")
+        return FakeLLMBackend.from_env()
+    if name != 'openai':
+        raise ValueError(f"Backend LLM inconnu: {name}")
+    return OpenAIBackend()
+
+
+_backend: Optional[LLMBackend] = None
+_lock = threading.Lock()
+
+
+def get_llm_backend() -> LLMBackend:
+    """Backend partagé par le processus, créé au premier appel."""
+    global _backend
+    if _backend is None:
+        with _lock:
+            if _backend is None:
+                _backend = create_llm_backend()
+    return _backend
+
+
+def set_llm_backend(backend: Optional[LLMBackend]) -> None:
+    """Remplace le backend (benchmarks) ; None revient à la configuration LLM_BACKEND."""
+    global _backend
+    with _lock:
+        _backend = backend
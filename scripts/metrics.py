@@ -0,0 +1,200 @@
+"""
+Métriques au format texte Prometheus, sans dépendance externe.
+
+Les valeurs vivent dans la mémoire du processus : avec plusieurs workers
+gunicorn, chaque worker expose ses propres compteurs (à agréger côté Prometheus).
+"""
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LLM_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+INDEX_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return self.header() + [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Gauge(_Metric):
+    """Jauge lue au moment de l'export par une fonction sans argument."""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, read: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.read = read
+
+    def render(self) -> List[str]:
+        try:
+            value = self.read()
+        except Exception:
+            return []
+        return self.header() + [f"{self.name} {_format_value(value)}"]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * len(self.buckets), [0.0]))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            total[0] += value
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Tuple[int, float]]:
+        """Nombre d'observations et somme, par combinaison de labels."""
+        with self._lock:
+            return {key: (counts[-1], total[0]) for key, (counts, total) in self._values.items()}
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = {key: (list(counts), total[0]) for key, (counts, total) in self._values.items()}
+        lines = self.header()
+        for key, (counts, total) in sorted(values.items()):
+            for bound, count in zip(self.buckets, counts):
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(round(total, 6))}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {counts[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            # Un module rechargé retrouve la métrique existante
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def counter(name: str, documentation: str, labels: Iterable[str] = ()) -> Counter:
+    return registry.register(Counter(name, documentation, labels))
+
+
+def histogram(name: str, documentation: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return registry.register(Histogram(name, documentation, labels, buckets))
+
+
+def gauge(name: str, documentation: str, read: Callable[[], float]) -> Gauge:
+    return registry.register(Gauge(name, documentation, read))
+
+
+# Appels au modèle, par prompt
+LLM_DURATION = histogram('recipe_llm_call_duration_seconds', "Durée des appels au modèle", ('stage', 'model'), LLM_BUCKETS)
+LLM_CALLS = counter('recipe_llm_calls_total', "Appels au modèle par issue (ok, cached, error)", ('stage', 'outcome'))
+LLM_TOKENS = counter('recipe_llm_tokens_total', "Tokens consommés", ('stage', 'kind'))
+LLM_RETRIES = counter('recipe_llm_retries_total', "Relances après erreur transitoire", ('stage',))
+
+# Écritures Supabase
+DB_WRITE_DURATION = histogram('recipe_db_write_duration_seconds', "Durée des écritures Supabase", ('operation',))
+DB_WRITES = counter('recipe_db_writes_total', "Écritures Supabase par issue", ('operation', 'outcome'))
+
+# Requêtes HTTP et générations
+HTTP_DURATION = histogram('recipe_http_request_duration_seconds',
+                          "Durée des requêtes HTTP (jusqu'aux en-têtes pour les flux SSE)", ('method', 'endpoint'))
+HTTP_REQUESTS = counter('recipe_http_requests_total', "Requêtes HTTP", ('method', 'endpoint', 'status'))
+GENERATION_DURATION = histogram('recipe_generation_duration_seconds', "Durée d'une génération complète, sauvegarde comprise",
+                                ('outcome',), LLM_BUCKETS)
+
+# Index en mémoire
+GEO_QUERY_DURATION = histogram('recipe_geo_query_duration_seconds', "Durée des requêtes de l'index spatial",
+                               ('query',), INDEX_BUCKETS)
+SEARCH_DURATION = histogram('recipe_search_duration_seconds', "Durée des recherches plein texte", (), INDEX_BUCKETS)
+
+
+def observe_llm_call(stage: Optional[str], model: str, duration: float, completion=None, error: bool = False) -> None:
+    """Enregistre un appel au modèle ; `completion` est un llm_backends.AICompletion."""
+    stage = stage or 'other'
+    if error:
+        LLM_CALLS.inc(stage=stage, outcome='error')
+        return
+    if completion.cached:
+        LLM_CALLS.inc(stage=stage, outcome='cached')
+        return
+    LLM_CALLS.inc(stage=stage, outcome='ok')
+    LLM_DURATION.observe(duration, stage=stage, model=model)
+    if completion.prompt_tokens:
+        LLM_TOKENS.inc(completion.prompt_tokens, stage=stage, kind='prompt')
+    if completion.completion_tokens:
+        LLM_TOKENS.inc(completion.completion_tokens, stage=stage, kind='completion')
+    if completion.retries:
+        LLM_RETRIES.inc(completion.retries, stage=stage)
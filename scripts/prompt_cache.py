@@ -0,0 +1,159 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 3600
+
+# Durées de vie par type de prompt. Seuls les prompts entièrement déterminés par
+# le nom de la recette sont mis en cache ; les prompts narratifs doivent varier.
+DEFAULT_TTLS = {
+    'origin': 30 * DAY,
+    'ingredients': 7 * DAY,
+    'playlist': 7 * DAY,
+    'wine': 7 * DAY,
+}
+
+
+def prompt_cache_key(model: str, system_prompt: str, prompt: str, temperature: float) -> str:
+    """Clé adressée par le contenu : toute variation du prompt donne une autre clé."""
+    raw = json.dumps([model, system_prompt, prompt, temperature], ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class PromptCache:
+    """
+    Cache des réponses du modèle à deux niveaux : LRU en mémoire puis SQLite sur disque.
+    Les valeurs sont des dictionnaires sérialisables en JSON. Le fichier SQLite
+    (`path`, facultatif) n'est créé qu'au premier accès au niveau disque.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 1000,
+                 max_disk_entries: int = 50000, ttls: Optional[Dict[str, int]] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._schema_ready = False
+
+    def _ensure_schema(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            if self._schema_ready:
+                return
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS prompt_cache (
+                    key TEXT PRIMARY KEY,
+                    prompt_type TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS prompt_cache_access_idx ON prompt_cache (last_access);
+            """)
+            self._schema_ready = True
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._ensure_schema(conn)
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _count(self, prompt_type: str, outcome: str, amount: int = 1) -> None:
+        with self._lock:
+            counters = self._stats.setdefault(prompt_type, {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0})
+            counters[outcome] += amount
+
+    def is_cacheable(self, prompt_type: Optional[str]) -> bool:
+        return bool(prompt_type) and self.ttls.get(prompt_type, 0) > 0
+
+    def _remember(self, key: str, value: dict, expires_at: float) -> int:
+        """Ajoute au niveau mémoire et retourne le nombre d'entrées évincées."""
+        evicted = 0
+        with self._lock:
+            self._memory[key] = (value, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                evicted += 1
+        return evicted
+
+    def get(self, key: str, prompt_type: str) -> Optional[dict]:
+        if not self.is_cacheable(prompt_type):
+            return None
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[1] > now:
+                self._memory.move_to_end(key)
+            elif entry:
+                del self._memory[key]
+                entry = None
+        if entry:
+            self._count(prompt_type, 'memory_hits')
+            return entry[0]
+
+        if self.path:
+            with self._connect() as conn:
+                row = conn.execute(
+                    'SELECT value, expires_at FROM prompt_cache WHERE key = ? AND expires_at > ?', (key, now)
+                ).fetchone()
+                if row:
+                    conn.execute('UPDATE prompt_cache SET last_access = ? WHERE key = ?', (now, key))
+            if row:
+                value = json.loads(row[0])
+                self._remember(key, value, row[1])
+                self._count(prompt_type, 'disk_hits')
+                return value
+
+        self._count(prompt_type, 'misses')
+        return None
+
+    def set(self, key: str, prompt_type: str, value: dict) -> None:
+        if not self.is_cacheable(prompt_type):
+            return
+        now = time.time()
+        expires_at = now + self.ttls[prompt_type]
+        evicted = self._remember(key, value, expires_at)
+
+        if self.path:
+            with self._connect() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO prompt_cache (key, prompt_type, value, expires_at, last_access) VALUES (?, ?, ?, ?, ?)',
+                    (key, prompt_type, json.dumps(value, ensure_ascii=False), expires_at, now)
+                )
+                conn.execute('DELETE FROM prompt_cache WHERE expires_at <= ?', (now,))
+                # Éviction des entrées les moins récemment utilisées au-delà de la limite
+                evicted += conn.execute("""
+                    DELETE FROM prompt_cache WHERE key IN (
+                        SELECT key FROM prompt_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_disk_entries,)).rowcount
+
+        if evicted:
+            self._count(prompt_type, 'evictions', evicted)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Compteurs de hits/misses/évictions par type de prompt."""
+        with self._lock:
+            return {prompt_type: dict(counters) for prompt_type, counters in self._stats.items()}
@@ -0,0 +1,133 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PromptTask:
+    """Nœud du graphe de génération : un prompt et les sorties dont il dépend."""
+    name: str
+    inputs: Tuple[str, ...]
+    run: Callable[[Dict[str, Any]], Any]
+
+
+def check_dag(tasks: Dict[str, PromptTask]) -> None:
+    """Vérifie que les dépendances existent et que le graphe est acyclique."""
+    for task in tasks.values():
+        for dep in task.inputs:
+            if dep not in tasks:
+                raise ValueError(f"Dépendance inconnue pour {task.name}: {dep}")
+
+    visiting, done = set(), set()
+
+    def visit(name):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Cycle détecté autour de: {name}")
+        visiting.add(name)
+        for dep in tasks[name].inputs:
+            visit(dep)
+        visiting.discard(name)
+        done.add(name)
+
+    for name in tasks:
+        visit(name)
+
+
+def dag_waves(tasks: Dict[str, PromptTask]) -> List[List[str]]:
+    """
+    Découpe le graphe en vagues : chaque vague ne dépend que des précédentes.
+    Utile quand les tâches d'une vague doivent être soumises ensemble (API Batch).
+    """
+    check_dag(tasks)
+    waves: List[List[str]] = []
+    placed = set()
+    while len(placed) < len(tasks):
+        wave = [name for name, task in tasks.items()
+                if name not in placed and all(dep in placed for dep in task.inputs)]
+        waves.append(wave)
+        placed.update(wave)
+    return waves
+
+
+def run_dag(tasks: Dict[str, PromptTask], max_workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Exécute les tâches en parallèle dès que leurs dépendances sont disponibles.
+    Chaque tâche reçoit un dictionnaire contenant uniquement les sorties déclarées
+    dans `inputs`. En cas d'erreur, les tâches non démarrées sont annulées et
+    l'exception est relancée.
+    """
+    check_dag(tasks)
+    results: Dict[str, Any] = {}
+    pending = dict(tasks)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers or max(len(tasks), 1)) as executor:
+        while pending or running:
+            ready = [t for t in pending.values() if all(dep in results for dep in t.inputs)]
+            for task in ready:
+                del pending[task.name]
+                inputs = {dep: results[dep] for dep in task.inputs}
+                running[executor.submit(task.run, inputs)] = task.name
+
+            if not running:
+                raise RuntimeError(f"Tâches bloquées: {', '.join(pending)}")
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception:
+                    for other in running:
+                        other.cancel()
+                    logger.error(f"❌ Échec de la tâche: {name}")
+                    raise
+
+    return results
+
+
+async def run_dag_async(tasks: Dict[str, PromptTask]) -> Dict[str, Any]:
+    """
+    Équivalent asynchrone de run_dag : `run` retourne une coroutine, et chaque
+    tâche prête devient une tâche asyncio au lieu d'occuper un thread.
+    """
+    check_dag(tasks)
+    results: Dict[str, Any] = {}
+    pending = dict(tasks)
+    running = {}
+
+    try:
+        while pending or running:
+            ready = [t for t in pending.values() if all(dep in results for dep in t.inputs)]
+            for task in ready:
+                del pending[task.name]
+                inputs = {dep: results[dep] for dep in task.inputs}
+                running[asyncio.ensure_future(task.run(inputs))] = task.name
+
+            if not running:
+                raise RuntimeError(f"Tâches bloquées: {', '.join(pending)}")
+
+            finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception:
+                    logger.error(f"❌ Échec de la tâche: {name}")
+                    # Comme run_dag : les prompts déjà lancés vont au bout (et au journal)
+                    await asyncio.gather(*running, return_exceptions=True)
+                    running.clear()
+                    raise
+    finally:
+        # Annulation (client déconnecté) : on n'attend pas les autres prompts
+        for other in running:
+            other.cancel()
+
+    return results
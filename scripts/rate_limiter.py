@@ -0,0 +1,262 @@
+import asyncio
+import logging
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Iterator, Optional, Tuple, TypeVar
+
+import openai
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Erreurs transitoires qui méritent une nouvelle tentative
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+# Codes d'erreur 429 qui ne se résorbent pas en attendant (crédit épuisé)
+FATAL_RATE_LIMIT_CODES = ('insufficient_quota',)
+
+
+class LocalBudgetState:
+    """Seaux de jetons requêtes/tokens propres au processus."""
+
+    def __init__(self, rpm: float, tpm: float):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = rpm
+        self._tokens = tpm
+        self._blocked_until = 0.0
+        self._updated_at = time.time()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated_at
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+        self._updated_at = now
+
+    def try_acquire(self, tokens: int) -> float:
+        """Consomme 1 requête et `tokens` tokens, ou retourne le temps d'attente nécessaire."""
+        with self._lock:
+            now = time.time()
+            self._refill(now)
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            # Une requête plus grosse que tout le budget passe quand le seau est plein
+            tokens = min(tokens, self.tpm)
+            if self._requests >= 1 and self._tokens >= tokens:
+                self._requests -= 1
+                self._tokens -= tokens
+                return 0.0
+            return max((1 - self._requests) * 60 / self.rpm, (tokens - self._tokens) * 60 / self.tpm, 0.01)
+
+    def adjust_tokens(self, delta: int) -> None:
+        with self._lock:
+            self._tokens = min(self.tpm, self._tokens - delta)
+
+    def block_until(self, until: float) -> None:
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, until)
+
+
+class SQLiteBudgetState:
+    """Mêmes seaux, partagés entre processus via un fichier SQLite."""
+
+    def __init__(self, path: str, rpm: float, tpm: float, name: str = 'openai'):
+        self.path = path
+        self.rpm = rpm
+        self.tpm = tpm
+        self.name = name
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_budgets (
+                    name TEXT PRIMARY KEY,
+                    requests REAL NOT NULL,
+                    tokens REAL NOT NULL,
+                    blocked_until REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute(
+                'INSERT OR IGNORE INTO rate_budgets VALUES (?, ?, ?, 0, ?)',
+                (name, rpm, tpm, time.time())
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _locked_state(self) -> Iterator[Tuple[sqlite3.Connection, list]]:
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute(
+                    'SELECT requests, tokens, blocked_until, updated_at FROM rate_budgets WHERE name = ?',
+                    (self.name,)
+                ).fetchone()
+                now = time.time()
+                elapsed = now - row[3]
+                state = [
+                    min(self.rpm, row[0] + elapsed * self.rpm / 60),
+                    min(self.tpm, row[1] + elapsed * self.tpm / 60),
+                    row[2],
+                    now
+                ]
+                yield conn, state
+                conn.execute(
+                    'UPDATE rate_budgets SET requests = ?, tokens = ?, blocked_until = ?, updated_at = ? WHERE name = ?',
+                    (*state, self.name)
+                )
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+    def try_acquire(self, tokens: int) -> float:
+        tokens = min(tokens, self.tpm)
+        with self._locked_state() as (conn, state):
+            requests, available, blocked_until, now = state
+            if now < blocked_until:
+                return blocked_until - now
+            if requests >= 1 and available >= tokens:
+                state[0] -= 1
+                state[1] -= tokens
+                return 0.0
+            return max((1 - requests) * 60 / self.rpm, (tokens - available) * 60 / self.tpm, 0.01)
+
+    def adjust_tokens(self, delta: int) -> None:
+        with self._locked_state() as (conn, state):
+            state[1] = min(self.tpm, state[1] - delta)
+
+    def block_until(self, until: float) -> None:
+        with self._locked_state() as (conn, state):
+            state[2] = max(state[2], until)
+
+
+def is_fatal_error(error: Exception) -> bool:
+    """Un 429 pour quota épuisé ne mérite pas de nouvelle tentative."""
+    return isinstance(error, openai.RateLimitError) and getattr(error, 'code', None) in FATAL_RATE_LIMIT_CODES
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Lit le délai suggéré par le serveur (retry-after-ms ou retry-after)."""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if 'retry-after-ms' in headers:
+            return float(headers['retry-after-ms']) / 1000
+        if 'retry-after' in headers:
+            return float(headers['retry-after'])
+    except ValueError:
+        return None
+    return None
+
+
+class RateGovernor:
+    """
+    Régule les appels au modèle : budgets requêtes/minute et tokens/minute,
+    backoff exponentiel avec jitter sur les erreurs transitoires, et respect
+    des délais retry-after renvoyés par l'API.
+    """
+
+    def __init__(self, rpm: float, tpm: float, state_path: Optional[str] = None,
+                 max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.state = SQLiteBudgetState(state_path, rpm, tpm) if state_path else LocalBudgetState(rpm, tpm)
+        # L'état SQLite ouvre une transaction : hors de la boucle d'événements en mode asynchrone
+        self._blocking_state = isinstance(self.state, SQLiteBudgetState)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def acquire(self, estimated_tokens: int) -> None:
+        """Bloque jusqu'à ce que le budget permette un nouvel appel."""
+        while True:
+            wait = self.state.try_acquire(estimated_tokens)
+            if wait <= 0:
+                return
+            time.sleep(min(wait, 5.0))
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Corrige le budget avec la consommation réelle une fois connue."""
+        if actual_tokens is not None and actual_tokens != estimated_tokens:
+            self.state.adjust_tokens(actual_tokens - estimated_tokens)
+
+    async def record_usage_async(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        if actual_tokens is not None and actual_tokens != estimated_tokens:
+            await self._state_async(self.state.adjust_tokens, actual_tokens - estimated_tokens)
+
+    def backoff_delay(self, attempt: int, error: Exception) -> float:
+        hinted = retry_after_seconds(error)
+        if hinted is not None:
+            return min(hinted, self.max_delay)
+        # Full jitter : évite que tous les workers réessaient en même temps
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _retry_delay(self, attempt: int, e: Exception) -> float:
+        """Retourne le délai avant la prochaine tentative, ou relance l'erreur si elles sont épuisées ou inutiles."""
+        if is_fatal_error(e):
+            logger.error(f"❌ Quota OpenAI épuisé, pas de nouvelle tentative: {str(e)}")
+            raise e
+        if attempt >= self.max_retries:
+            raise e
+        delay = self.backoff_delay(attempt, e)
+        logger.warning(f"⏳ Erreur transitoire OpenAI ({type(e).__name__}), nouvelle tentative {attempt + 1}/{self.max_retries} dans {delay:.1f}s")
+        return delay
+
+    def call(self, fn: Callable[[], T], estimated_tokens: int) -> Tuple[T, int]:
+        """Exécute `fn` sous le contrôle du budget. Retourne (résultat, nombre de relances)."""
+        attempt = 0
+        while True:
+            self.acquire(estimated_tokens)
+            try:
+                return fn(), attempt
+            except RETRYABLE_ERRORS as e:
+                delay = self._retry_delay(attempt, e)
+                if isinstance(e, openai.RateLimitError):
+                    # Un 429 concerne tout le compte : on suspend aussi les autres appels
+                    self.state.block_until(time.time() + delay)
+                attempt += 1
+                time.sleep(delay)
+
+    async def _state_async(self, method: Callable[..., T], *args) -> T:
+        if self._blocking_state:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def acquire_async(self, estimated_tokens: int) -> None:
+        """Comme acquire, sans bloquer la boucle d'événements."""
+        while True:
+            wait = await self._state_async(self.state.try_acquire, estimated_tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(min(wait, 5.0))
+
+    async def call_async(self, fn: Callable[[], Awaitable[T]], estimated_tokens: int) -> Tuple[T, int]:
+        """Version asynchrone de call : `fn` retourne une coroutine."""
+        attempt = 0
+        while True:
+            await self.acquire_async(estimated_tokens)
+            try:
+                return await fn(), attempt
+            except RETRYABLE_ERRORS as e:
+                delay = self._retry_delay(attempt, e)
+                if isinstance(e, openai.RateLimitError):
+                    await self._state_async(self.state.block_until, time.time() + delay)
+                attempt += 1
+                await asyncio.sleep(delay)
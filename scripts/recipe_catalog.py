@@ -0,0 +1,179 @@
+"""
+Catalogue des recettes pour les écrans de liste : pagination par curseur sur
+(created_at, id), colonnes choisies par le client parmi une liste autorisée
+(jamais image_data) et JSON compact.
+
+Les réponses portent un ETag fort dérivé de la version du catalogue et des
+paramètres : un client qui renvoie If-None-Match reçoit un 304 sans lire la
+page tant que rien n'a été écrit. La version est un compteur incrémenté par
+trigger à chaque INSERT, UPDATE ou DELETE sur recipes (migration 16) ; sans
+cette table, l'ETag est calculé sur le contenu de la page.
+"""
+import base64
+import binascii
+import hashlib
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from postgrest.exceptions import APIError
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+CATALOG_FIELDS = (
+    'id', 'title', 'country', 'region', 'description', 'preparation_time', 'cooking_time', 'total_time',
+    'difficulty', 'servings', 'calories', 'is_premium', 'image_url', 'latitude', 'longitude',
+    'category_id', 'created_at', 'image_variants',
+)
+DEFAULT_FIELDS = ('id', 'title', 'country', 'region', 'difficulty', 'preparation_time', 'cooking_time',
+                  'servings', 'is_premium', 'image_url')
+# Colonnes de la clé de pagination, toujours lues
+KEY_FIELDS = ('created_at', 'id')
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+CACHE_CONTROL = 'private, no-cache'
+# Table absente du cache de schéma PostgREST, ou de la base
+UNDEFINED_TABLE_CODES = ('PGRST205', '42P01')
+
+
+@dataclass(frozen=True)
+class CatalogQuery:
+    fields: Tuple[str, ...]
+    limit: int
+    # (created_at, id) de la dernière recette de la page précédente
+    after: Optional[Tuple[str, int]]
+
+
+def encode_cursor(created_at: str, recipe_id: int) -> str:
+    raw = json.dumps([created_at, recipe_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        created_at, recipe_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(created_at, str) or not isinstance(recipe_id, int):
+            raise ValueError
+    except (ValueError, TypeError, binascii.Error):
+        raise ValueError("cursor invalide")
+    return created_at, recipe_id
+
+
+def parse_catalog_request(params) -> CatalogQuery:
+    """Paramètres fields, limit et cursor ; ValueError si invalides."""
+    fields = DEFAULT_FIELDS
+    if params.get('fields'):
+        fields = tuple(dict.fromkeys(field.strip() for field in params['fields'].split(',') if field.strip()))
+        unknown = [field for field in fields if field not in CATALOG_FIELDS]
+        if unknown or not fields:
+            raise ValueError(f"Champs non disponibles: {', '.join(unknown)}. Champs possibles: {', '.join(CATALOG_FIELDS)}")
+    try:
+        limit = int(params.get('limit') or DEFAULT_LIMIT)
+    except ValueError:
+        raise ValueError("limit doit être un entier")
+    if not 0 < limit <= MAX_LIMIT:
+        raise ValueError(f"limit doit être compris entre 1 et {MAX_LIMIT}")
+    after = decode_cursor(params['cursor']) if params.get('cursor') else None
+    return CatalogQuery(fields, limit, after)
+
+
+class CatalogVersion:
+    """
+    Version du catalogue : le compteur de la table catalog_version, relu au
+    plus toutes les `refresh_interval` secondes et dès que ce processus a écrit
+    une recette (bump). Tenu par la base, il est le même pour tous les workers
+    et change aussi pour les modifications et suppressions faites ailleurs.
+    current() retourne None si la table n'existe pas.
+    """
+
+    def __init__(self, refresh_interval: float = 5.0):
+        self.refresh_interval = refresh_interval
+        self._token: Optional[str] = None
+        self._checked_at = 0.0
+        self._table_available = True
+        self._lock = threading.Lock()
+
+    def bump(self) -> None:
+        with self._lock:
+            self._token = None
+
+    def current(self, client) -> Optional[str]:
+        with self._lock:
+            if not self._table_available:
+                return None
+            if self._token is not None and time.time() - self._checked_at < self.refresh_interval:
+                return self._token
+        try:
+            rows = client.table('catalog_version').select('version').eq('id', 1).execute().data or []
+        except APIError as e:
+            if e.code not in UNDEFINED_TABLE_CODES:
+                raise
+            logger.warning("Table catalog_version absente (migration 16), ETag calculé sur le contenu des pages")
+            with self._lock:
+                self._table_available = False
+            return None
+        if not rows:
+            return None
+        token = str(rows[0]['version'])
+        with self._lock:
+            if token != self._token:
+                logger.info(f"📒 Version du catalogue: {token}")
+            self._token, self._checked_at = token, time.time()
+        return token
+
+
+def catalog_etag(version: str, query: CatalogQuery) -> str:
+    key = json.dumps([version, query.fields, query.limit, query.after], separators=(',', ':'))
+    return '"' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:20] + '"'
+
+
+def content_etag(body: bytes) -> str:
+    """ETag d'une page déjà encodée, quand la version du catalogue n'est pas disponible."""
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match contient-il l'ETag (comparaison faible, comme le veut la RFC 9110) ?"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return '*' in candidates or any(candidate.removeprefix('W/') == etag for candidate in candidates)
+
+
+def _catalog_select(client, query: CatalogQuery):
+    columns = ','.join(dict.fromkeys(query.fields + KEY_FIELDS))
+    select = client.table('recipes').select(columns)
+    if query.after:
+        created_at, recipe_id = query.after
+        select = select.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{recipe_id})')
+    # Une ligne de plus que demandé : elle indique s'il reste une page
+    return select.order('created_at', desc=True).order('id', desc=True).range(0, query.limit)
+
+
+def _catalog_page(rows: list, query: CatalogQuery) -> dict:
+    page = rows[:query.limit]
+    next_cursor = encode_cursor(page[-1]['created_at'], page[-1]['id']) if len(rows) > query.limit else None
+    return {
+        'recipes': [{field: row.get(field) for field in query.fields} for row in page],
+        'nextCursor': next_cursor
+    }
+
+
+def catalog_page(client, query: CatalogQuery) -> dict:
+    """Une page du catalogue, de la recette la plus récente à la plus ancienne."""
+    return _catalog_page(_catalog_select(client, query).execute().data or [], query)
+
+
+async def catalog_page_async(client, query: CatalogQuery) -> dict:
+    response = await _catalog_select(client, query).execute()
+    return _catalog_page(response.data or [], query)
+
+
+def encode_catalog(payload: dict) -> bytes:
+    """JSON compact : sans espaces ni échappement des accents."""
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
@@ -0,0 +1,56 @@
+"""
+Format des réponses de génération (étapes, événements SSE, état des jobs),
+partagé par le serveur Flask et le serveur ASGI.
+"""
+import json
+
+
+def generate_step_response(step, status, message):
+    return {
+        'step': step,
+        'status': status,
+        'message': message
+    }
+
+def sse_event(payload):
+    return 'data: ' + json.dumps(payload) + '\n\n'
+
+# Correspondance entre les prompts de generate_recipe et les étapes affichées au client
+STAGE_PROGRESS = {
+    'origin': (2, 'Recherche de l\'origine de la recette...', 'Origine trouvée'),
+    'general': (2, 'Génération des informations de base...', 'Informations de base générées'),
+    'ingredients': (3, 'Ajout des ingrédients...', 'Ingrédients ajoutés'),
+    'steps': (4, 'Ajout des instructions de préparation...', 'Instructions ajoutées'),
+    'character': (5, 'Création du chef et de son univers...', 'Chef créé'),
+    'story': (5, 'Création de l\'histoire immersive...', 'Histoire créée'),
+    'wine': (6, 'Recherche de l\'accord de vin parfait...', 'Accord de vin trouvé'),
+    'playlist': (7, 'Création de la playlist d\'ambiance...', 'Playlist créée'),
+    'structured': (2, 'Génération de la recette complète...', 'Recette complète générée'),
+    'images': (7, 'Préparation des images...', 'Images prêtes'),
+}
+
+def generation_event_response(event):
+    """Convertit un événement de generate_recipe au format SSE des étapes."""
+    step, started, done = STAGE_PROGRESS.get(event['stage'], (2, 'Génération en cours...', 'Génération en cours...'))
+    message = done if event['type'] in ('stage_completed', 'partial') else started
+    return {**generate_step_response(step=step, status='loading', message=message), **event}
+
+def job_status_payload(job):
+    return {
+        'jobId': job['id'],
+        'status': job['status'],
+        'result': job['result'],
+        'error': job['error'],
+        'createdAt': job['created_at'],
+        'updatedAt': job['updated_at']
+    }
+
+def parse_event_cursor(value):
+    """Numéro du dernier événement reçu (Last-Event-ID ou ?after=) ; ValueError si invalide."""
+    try:
+        after = int(value or 0)
+    except (TypeError, ValueError):
+        raise ValueError("Last-Event-ID doit être un entier positif")
+    if after < 0:
+        raise ValueError("Last-Event-ID doit être un entier positif")
+    return after
@@ -0,0 +1,102 @@
+"""
+Chargement incrémental de la table recipes, commun aux index en mémoire
+(titres, carte, recherche).
+
+Les lignes sont lues par pages sur la clé (updated_at, id), chaque page
+reprenant strictement après la dernière ligne lue : des recettes écrites dans
+la même transaction (save_recipe_graphs) partagent leur horodatage, et une
+simple comparaison > dernier vu perdrait celles restées après la limite d'une
+page. updated_at (migration 15) fait aussi remonter les lignes modifiées après
+coup, comme les coordonnées du géocodage (gazetteer.py --backfill) ; sans
+cette migration, l'index se replie sur created_at et ne voit que les créations.
+"""
+import logging
+import threading
+import time
+from typing import Optional, Tuple
+
+from postgrest.exceptions import APIError
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 1000
+FEED_KEY = 'updated_at'
+FALLBACK_FEED_KEY = 'created_at'
+UNDEFINED_COLUMN_CODE = '42703'
+
+
+def after_key_filter(column: str, value: str, recipe_id: int) -> str:
+    """Filtre PostgREST `or` des lignes strictement après (value, recipe_id) sur (column, id)."""
+    return f'{column}.gt."{value}",and({column}.eq."{value}",id.gt.{recipe_id})'
+
+
+class RecipeFeedIndex:
+    """
+    Base des index chargés depuis Supabase au démarrage (warm) puis rafraîchis
+    au plus toutes les `refresh_interval` secondes (refresh). Les sous-classes
+    définissent FEED_COLUMNS, FEED_NAME et _ingest(row).
+    """
+
+    FEED_COLUMNS: Tuple[str, ...] = ('id',)
+    FEED_NAME = 'Index'
+    FEED_ICON = '📚'
+
+    def __init__(self, refresh_interval: float = 60.0):
+        self.refresh_interval = refresh_interval
+        self._key = FEED_KEY
+        # (horodatage, id) de la dernière ligne chargée, sur la colonne self._key
+        self._cursor: Optional[Tuple[str, int]] = None
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+
+    def _ingest(self, row: dict) -> None:
+        raise NotImplementedError
+
+    def _loaded_message(self, count: int) -> str:
+        return f"{count} recettes"
+
+    def _fetch_page(self, client) -> list:
+        columns = ','.join(dict.fromkeys(self.FEED_COLUMNS + ('id', self._key)))
+        query = client.table('recipes').select(columns).order(self._key).order('id')
+        if self._cursor:
+            query = query.or_(after_key_filter(self._key, *self._cursor))
+        try:
+            return query.range(0, PAGE_SIZE - 1).execute().data or []
+        except APIError as e:
+            if e.code != UNDEFINED_COLUMN_CODE or self._key == FALLBACK_FEED_KEY:
+                raise
+            logger.warning(f"Colonne {self._key} absente (migration 15), {self.FEED_NAME} suivi sur {FALLBACK_FEED_KEY}")
+            self._key, self._cursor = FALLBACK_FEED_KEY, None
+            return self._fetch_page(client)
+
+    def _fetch_since_cursor(self, client) -> int:
+        fetched = 0
+        while True:
+            rows = self._fetch_page(client)
+            for row in rows:
+                self._ingest(row)
+            fetched += len(rows)
+            if rows:
+                with self._lock:
+                    self._cursor = (rows[-1][self._key], rows[-1]['id'])
+            if len(rows) < PAGE_SIZE:
+                return fetched
+
+    def warm(self, client) -> None:
+        """Chargement complet des recettes existantes."""
+        count = self._fetch_since_cursor(client)
+        self._last_refresh = time.time()
+        logger.info(f"{self.FEED_ICON} {self.FEED_NAME} chargé: {self._loaded_message(count)}")
+
+    def refresh(self, client, force: bool = False) -> None:
+        """Charge uniquement les recettes créées ou modifiées depuis le dernier passage."""
+        if not force and time.time() - self._last_refresh < self.refresh_interval:
+            return
+        self._last_refresh = time.time()
+        try:
+            count = self._fetch_since_cursor(client)
+            if count:
+                logger.info(f"{self.FEED_ICON} {self.FEED_NAME}: {count} recettes nouvelles ou modifiées")
+        except Exception as e:
+            logger.warning(f"Rafraîchissement impossible ({self.FEED_NAME}): {str(e)}")
@@ -0,0 +1,306 @@
+"""
+Index spatial en mémoire des recettes géolocalisées, pour la carte du monde.
+
+Pyramide de grilles en latitude/longitude : cases de 360 / 2**GRID_LEVEL
+degrés au niveau 0, chaque niveau doublant la taille des cases. Une requête ne
+parcourt que les cases occupées de la zone visible ; les cases gardent le
+nombre et la somme des coordonnées de leurs recettes, si bien qu'un niveau de
+la pyramide donne directement les regroupements d'un zoom de la carte.
+"""
+import heapq
+import logging
+import math
+import time
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from metrics import GEO_QUERY_DURATION
+from recipe_feed import RecipeFeedIndex
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+GRID_LEVEL = 9
+CELL_DEGREES = 360 / 2 ** GRID_LEVEL
+ROWS = 2 ** (GRID_LEVEL - 1)
+COLUMNS = 2 ** GRID_LEVEL
+# Niveau le plus grossier de la pyramide : cases de 90 degrés
+TOP_SHIFT = GRID_LEVEL - 2
+# Au-delà, la carte reçoit les recettes une par une
+CLUSTER_MAX_ZOOM = TOP_SHIFT
+EARTH_RADIUS_KM = 6371.0
+
+MAP_COLUMNS = ('id', 'title', 'country', 'region', 'latitude', 'longitude', 'image_url')
+
+Vector = Tuple[float, float, float]
+
+
+def _unit_vector(latitude: float, longitude: float) -> Vector:
+    lat, lon = math.radians(latitude), math.radians(longitude)
+    return math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)
+
+
+def _chord(a: Vector, b: Vector) -> float:
+    return math.sqrt((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2)
+
+
+def chord_to_km(chord: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+def cell_of(latitude: float, longitude: float) -> Tuple[int, int]:
+    row = min(int((latitude + 90) / CELL_DEGREES), ROWS - 1)
+    column = int(((longitude + 180) % 360) / CELL_DEGREES) % COLUMNS
+    return row, column
+
+
+def cluster_shift(zoom: int) -> int:
+    """Niveau de la pyramide dont les cases servent de regroupements au zoom donné."""
+    return max(0, TOP_SHIFT - max(0, zoom))
+
+
+class _Cell:
+    """
+    Case de la pyramide : au niveau 0 elle porte les recettes, au-dessus les
+    clés de ses cases filles. Chaque case garde le nombre et la somme des
+    coordonnées de ses recettes, et le rayon d'une sphère englobante autour de
+    son centre (qui ne rétrécit pas au retrait d'une recette).
+    """
+    __slots__ = ('key', 'shift', 'count', 'latitude_sum', 'longitude_sum', 'center', 'radius', 'recipes', 'children')
+
+    def __init__(self, key: Tuple[int, int], shift: int):
+        self.key = key
+        self.shift = shift
+        self.count = 0
+        self.latitude_sum = 0.0
+        self.longitude_sum = 0.0
+        size = CELL_DEGREES * 2 ** shift
+        self.center = _unit_vector(-90 + (key[0] + 0.5) * size, -180 + (key[1] + 0.5) * size)
+        self.radius = 0.0
+        self.recipes: Dict[int, Tuple[dict, Vector]] = {}
+        self.children: Set[Tuple[int, int]] = set()
+
+
+class RecipeGeoIndex(RecipeFeedIndex):
+    """
+    Pyramide de grilles des recettes géolocalisées. Chargée depuis Supabase au
+    démarrage, rafraîchie par incréments (recipe_feed) et complétée à chaque
+    insertion.
+    """
+
+    FEED_COLUMNS = MAP_COLUMNS
+    FEED_NAME = 'Index spatial'
+    FEED_ICON = '🗺️'
+
+    def __init__(self, refresh_interval: float = 60.0):
+        super().__init__(refresh_interval)
+        # Un dictionnaire de cases occupées par niveau : cases de CELL_DEGREES * 2**niveau degrés
+        self._levels: List[Dict[Tuple[int, int], _Cell]] = [{} for _ in range(TOP_SHIFT + 1)]
+        self._cell_by_recipe: Dict[int, Tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._cell_by_recipe)
+
+    def _remove(self, recipe_id: int) -> None:
+        key = self._cell_by_recipe.pop(recipe_id, None)
+        if key is None:
+            return
+        recipe, _ = self._levels[0][key].recipes.pop(recipe_id)
+        row, column = key
+        for shift, level in enumerate(self._levels):
+            cell = level[(row >> shift, column >> shift)]
+            cell.count -= 1
+            cell.latitude_sum -= recipe['latitude']
+            cell.longitude_sum -= recipe['longitude']
+            if cell.count == 0:
+                del level[cell.key]
+                if shift < TOP_SHIFT:
+                    self._levels[shift + 1][(row >> (shift + 1), column >> (shift + 1))].children.discard(cell.key)
+
+    def add(self, recipe: dict) -> None:
+        """Ajoute (ou déplace) une recette ; celles sans coordonnées sont retirées de l'index."""
+        if recipe.get('id') is None:
+            return
+        if recipe.get('latitude') is None or recipe.get('longitude') is None:
+            with self._lock:
+                self._remove(recipe['id'])
+            return
+        entry = {column: recipe.get(column) for column in MAP_COLUMNS}
+        entry['latitude'], entry['longitude'] = float(entry['latitude']), float(entry['longitude'])
+        vector = _unit_vector(entry['latitude'], entry['longitude'])
+        row, column = key = cell_of(entry['latitude'], entry['longitude'])
+        with self._lock:
+            self._remove(entry['id'])
+            for shift, level in enumerate(self._levels):
+                cell_key = (row >> shift, column >> shift)
+                cell = level.get(cell_key)
+                if cell is None:
+                    cell = level[cell_key] = _Cell(cell_key, shift)
+                cell.count += 1
+                cell.latitude_sum += entry['latitude']
+                cell.longitude_sum += entry['longitude']
+                cell.radius = max(cell.radius, _chord(cell.center, vector))
+                if shift:
+                    cell.children.add((row >> (shift - 1), column >> (shift - 1)))
+            self._levels[0][key].recipes[entry['id']] = (entry, vector)
+            self._cell_by_recipe[entry['id']] = key
+
+    def _ingest(self, row: dict) -> None:
+        self.add(row)
+
+    def _loaded_message(self, count: int) -> str:
+        return f"{len(self)} recettes géolocalisées sur {count}"
+
+    def _cells_in_bbox(self, south: float, west: float, north: float, east: float, shift: int = 0) -> Iterator[_Cell]:
+        """Cases du niveau `shift` qui recoupent la zone ; west > east quand elle traverse l'antiméridien."""
+        level = self._levels[shift]
+        first_row, last_row = cell_of(south, 0)[0] >> shift, cell_of(north, 0)[0] >> shift
+        first_column, last_column = cell_of(0, west)[1] >> shift, cell_of(0, east)[1] >> shift
+        last_index = (COLUMNS >> shift) - 1
+        wraps = west > east
+        if (wraps and first_column <= last_column) or east - west >= 360 - CELL_DEGREES:
+            first_column, last_column, wraps = 0, last_index, False
+        columns = list(range(first_column, last_index + 1)) + list(range(0, last_column + 1)) if wraps \
+            else range(first_column, last_column + 1)
+        if (last_row - first_row + 1) * len(columns) > len(level):
+            # Zone plus grande que l'ensemble des cases occupées : on parcourt ces dernières
+            for (row, column), cell in level.items():
+                in_columns = (column >= first_column or column <= last_column) if wraps \
+                    else first_column <= column <= last_column
+                if first_row <= row <= last_row and in_columns:
+                    yield cell
+            return
+        for row in range(first_row, last_row + 1):
+            for column in columns:
+                cell = level.get((row, column))
+                if cell is not None:
+                    yield cell
+
+    @staticmethod
+    def _contains(recipe: dict, south: float, west: float, north: float, east: float) -> bool:
+        if not south <= recipe['latitude'] <= north:
+            return False
+        if west <= east:
+            return west <= recipe['longitude'] <= east
+        return recipe['longitude'] >= west or recipe['longitude'] <= east
+
+    def in_bbox(self, south: float, west: float, north: float, east: float, limit: Optional[int] = None) -> List[dict]:
+        """Recettes de la zone visible, au plus `limit`."""
+        found = []
+        with self._lock:
+            for cell in self._cells_in_bbox(south, west, north, east):
+                for recipe, _ in cell.recipes.values():
+                    if self._contains(recipe, south, west, north, east):
+                        found.append(recipe)
+                        if limit is not None and len(found) >= limit:
+                            return found
+        return found
+
+    def _first_recipe(self, cell: _Cell) -> dict:
+        while cell.shift:
+            cell = self._levels[cell.shift - 1][next(iter(cell.children))]
+        return next(iter(cell.recipes.values()))[0]
+
+    def clusters(self, south: float, west: float, north: float, east: float, zoom: int) -> Tuple[List[dict], List[dict]]:
+        """
+        Regroupements de la zone visible au zoom donné : (groupes d'au moins deux
+        recettes, recettes isolées). Les cases du bord sont comptées entières.
+        """
+        clusters, singles = [], []
+        with self._lock:
+            for cell in self._cells_in_bbox(south, west, north, east, cluster_shift(zoom)):
+                if cell.count == 1:
+                    singles.append(self._first_recipe(cell))
+                    continue
+                clusters.append({
+                    'latitude': round(cell.latitude_sum / cell.count, 5),
+                    'longitude': round(cell.longitude_sum / cell.count, 5),
+                    'count': cell.count
+                })
+        return clusters, singles
+
+    def nearest(self, latitude: float, longitude: float, limit: int = 10) -> List[Tuple[float, dict]]:
+        """
+        Les `limit` recettes les plus proches, avec leur distance en km. La
+        pyramide est descendue en visitant d'abord les cases dont la sphère
+        englobante est la plus proche, jusqu'à ce qu'aucune ne puisse contenir mieux.
+        """
+        query = _unit_vector(latitude, longitude)
+        best: List[Tuple[float, int, dict]] = []
+        with self._lock:
+            pending = [(max(0.0, _chord(query, cell.center) - cell.radius), id(cell), cell)
+                       for cell in self._levels[TOP_SHIFT].values()]
+            heapq.heapify(pending)
+            while pending and (len(best) < limit or pending[0][0] <= -best[0][0]):
+                _, _, cell = heapq.heappop(pending)
+                if cell.shift:
+                    children = self._levels[cell.shift - 1]
+                    for key in cell.children:
+                        child = children[key]
+                        heapq.heappush(pending, (max(0.0, _chord(query, child.center) - child.radius), id(child), child))
+                    continue
+                for recipe_id, (recipe, vector) in cell.recipes.items():
+                    candidate = (-_chord(query, vector), recipe_id, recipe)
+                    if len(best) < limit:
+                        heapq.heappush(best, candidate)
+                    elif candidate > best[0]:
+                        heapq.heapreplace(best, candidate)
+        return [(round(chord_to_km(-chord), 1), recipe) for chord, _, recipe in sorted(best, reverse=True)]
+
+
+DEFAULT_MAP_LIMIT = 500
+MAX_MAP_LIMIT = 2000
+DEFAULT_NEAREST = 10
+MAX_NEAREST = 100
+
+
+def _bounded_int(value, default: int, low: int, high: int, name: str) -> int:
+    try:
+        number = int(value) if value not in (None, '') else default
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} doit être un entier")
+    if not low <= number <= high:
+        raise ValueError(f"{name} doit être compris entre {low} et {high}")
+    return number
+
+
+def parse_bbox(text: Optional[str]) -> Tuple[float, float, float, float]:
+    """« ouest,sud,est,nord » (ordre GeoJSON) -> (sud, ouest, nord, est) ; ValueError si invalide."""
+    try:
+        west, south, east, north = (float(part) for part in (text or '').split(','))
+    except ValueError:
+        raise ValueError("bbox doit être de la forme ouest,sud,est,nord")
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        raise ValueError("bbox hors des limites (latitude -90..90, longitude -180..180)")
+    return south, west, north, east
+
+
+def map_query(index: RecipeGeoIndex, params) -> dict:
+    """
+    Contenu de la carte pour les paramètres bbox, zoom et limit : regroupements
+    sous CLUSTER_MAX_ZOOM, recettes une par une au-delà. ValueError si invalides.
+    """
+    bbox = parse_bbox(params.get('bbox'))
+    zoom = _bounded_int(params.get('zoom'), CLUSTER_MAX_ZOOM, 0, 22, 'zoom')
+    limit = _bounded_int(params.get('limit'), DEFAULT_MAP_LIMIT, 1, MAX_MAP_LIMIT, 'limit')
+    started_at = time.perf_counter()
+    if zoom < CLUSTER_MAX_ZOOM:
+        clusters, recipes = index.clusters(*bbox, zoom)
+    else:
+        clusters, recipes = [], index.in_bbox(*bbox, limit=limit + 1)
+    GEO_QUERY_DURATION.observe(time.perf_counter() - started_at, query='map')
+    return {'zoom': zoom, 'clusters': clusters, 'recipes': recipes[:limit], 'truncated': len(recipes) > limit}
+
+
+def nearest_query(index: RecipeGeoIndex, params) -> dict:
+    """Recettes les plus proches des paramètres lat et lon, au plus limit. ValueError si invalides."""
+    try:
+        latitude, longitude = float(params.get('lat')), float(params.get('lon'))
+    except (TypeError, ValueError):
+        raise ValueError("lat et lon sont obligatoires")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("lat ou lon hors des limites")
+    limit = _bounded_int(params.get('limit'), DEFAULT_NEAREST, 1, MAX_NEAREST, 'limit')
+    started_at = time.perf_counter()
+    found = index.nearest(latitude, longitude, limit)
+    GEO_QUERY_DURATION.observe(time.perf_counter() - started_at, query='nearest')
+    return {'recipes': [{**recipe, 'distanceKm': distance} for distance, recipe in found]}
@@ -2,9 +2,20 @@ import tkinter as tk
 from tkinter import ttk
 import threading
 from generate_recipe import generate_recipe
-import time
-import json
-import os
+from generation_journal import get_generation_journal
+from clients import get_supabase_client
+from recipe_persistence import save_recipe_graph
+
+# Prompts de generate_recipe regroupés par étape affichée ; la dernière étape est la sauvegarde
+GUI_STEPS = [
+    ("🌍 Infos générales", ('origin', 'character', 'story', 'general')),
+    ("📝 Ingrédients", ('ingredients',)),
+    ("👩‍🍳 Étapes", ('steps',)),
+    ("🎵 Playlist", ('playlist',)),
+    ("🍷 Vin", ('wine',)),
+    ("💾 Sauvegarde", ()),
+]
+SAVE_STEP = len(GUI_STEPS) - 1
 
 class RecipeGeneratorApp:
     def __init__(self):
@@ -18,9 +29,9 @@ class RecipeGeneratorApp:
         self.style.configure("Error.TLabel", foreground="red")
         self.style.configure("Success.TLabel", foreground="green")
         
-        # État de la génération
+        # État de la génération : prompts terminés de la recette en cours
         self.current_recipe = None
-        self.generation_state = {}
+        self.completed_stages = set()
         
         self.create_widgets()
         
@@ -56,14 +67,7 @@ class RecipeGeneratorApp:
         self.steps_frame.pack(fill=tk.X, pady=20)
         
         # Étapes de progression
-        self.steps = [
-            ("🌍 Infos générales", self.generate_general_info),
-            ("📝 Ingrédients", self.generate_ingredients),
-            ("👩‍🍳 Étapes", self.generate_steps),
-            ("🎵 Playlist", self.generate_playlist),
-            ("🍷 Vin", self.generate_wine),
-            ("💾 Sauvegarde", self.save_recipe)
-        ]
+        self.steps = GUI_STEPS
         
         self.step_frames = []
         self.step_labels = []
@@ -120,158 +124,95 @@ class RecipeGeneratorApp:
         self.step_progresses[step_index]["value"] = progress
         self.root.update_idletasks()
     
-    def save_progress(self):
-        if self.current_recipe:
-            progress_file = f"{self.current_recipe.replace(' ', '_').lower()}_progress.json"
-            with open(progress_file, "w", encoding="utf-8") as f:
-                json.dump(self.generation_state, f, ensure_ascii=False, indent=2)
+    def refresh_step(self, step_index, resumed=False):
+        """Met à jour la barre et le statut d'une étape d'après les prompts terminés."""
+        stages = self.steps[step_index][1]
+        done = len([stage for stage in stages if stage in self.completed_stages])
+        self.update_progress(step_index, 100 * done // len(stages))
+        if done == len(stages):
+            self.update_step_status(step_index, "♻️ Repris" if resumed else "✅ Complété")
+    
+    def on_generation_event(self, event):
+        """Appelé depuis les threads de generate_recipe : l'affichage passe par la boucle Tk."""
+        if event['type'] != 'stage_completed':
+            return
+        self.completed_stages.add(event['stage'])
+        for i, (_, stages) in enumerate(self.steps):
+            if event['stage'] in stages:
+                self.root.after(0, self.refresh_step, i, event.get('cached', False))
     
     def load_progress(self, recipe_name):
-        progress_file = f"{recipe_name.replace(' ', '_').lower()}_progress.json"
-        if os.path.exists(progress_file):
-            with open(progress_file, "r", encoding="utf-8") as f:
-                self.generation_state = json.load(f)
-                return True
-        return False
+        """Reprend l'affichage des prompts déjà journalisés pour cette recette."""
+        journal = get_generation_journal()
+        if not journal:
+            return False
+        self.completed_stages = set(journal.completed_stages(recipe_name))
+        if journal.recipe_data(recipe_name):
+            self.completed_stages.update(stage for _, stages in self.steps for stage in stages)
+        for i in range(SAVE_STEP):
+            self.refresh_step(i, resumed=True)
+        return bool(self.completed_stages)
     
     def retry_step(self, step_index):
+        # Relancer reprend au premier prompt incomplet grâce au journal
         if self.current_recipe:
-            self.step_progresses[step_index]["value"] = 0
             self.update_step_status(step_index, "Relance...", False)
-            thread = threading.Thread(target=self.steps[step_index][1], args=(self.current_recipe,))
-            thread.start()
-    
-    def generate_general_info(self, recipe_name):
-        try:
-            for j in range(0, 101, 10):
-                self.root.after(0, self.update_progress, 0, j)
-                time.sleep(0.1)
-            self.generation_state["general_info"] = {"status": "success"}
-            self.update_step_status(0, "✅ Complété")
-            self.save_progress()
-        except Exception as e:
-            self.generation_state["general_info"] = {"status": "error", "message": str(e)}
-            self.update_step_status(0, "❌ Erreur", True)
-            self.save_progress()
-            raise e
-    
-    def generate_ingredients(self, recipe_name):
-        try:
-            for j in range(0, 101, 10):
-                self.root.after(0, self.update_progress, 1, j)
-                time.sleep(0.1)
-            self.generation_state["ingredients"] = {"status": "success"}
-            self.update_step_status(1, "✅ Complété")
-            self.save_progress()
-        except Exception as e:
-            self.generation_state["ingredients"] = {"status": "error", "message": str(e)}
-            self.update_step_status(1, "❌ Erreur", True)
-            self.save_progress()
-            raise e
-    
-    def generate_steps(self, recipe_name):
-        try:
-            for j in range(0, 101, 10):
-                self.root.after(0, self.update_progress, 2, j)
-                time.sleep(0.1)
-            self.generation_state["steps"] = {"status": "success"}
-            self.update_step_status(2, "✅ Complété")
-            self.save_progress()
-        except Exception as e:
-            self.generation_state["steps"] = {"status": "error", "message": str(e)}
-            self.update_step_status(2, "❌ Erreur", True)
-            self.save_progress()
-            raise e
-    
-    def generate_playlist(self, recipe_name):
-        try:
-            for j in range(0, 101, 10):
-                self.root.after(0, self.update_progress, 3, j)
-                time.sleep(0.1)
-            self.generation_state["playlist"] = {"status": "success"}
-            self.update_step_status(3, "✅ Complété")
-            self.save_progress()
-        except Exception as e:
-            self.generation_state["playlist"] = {"status": "error", "message": str(e)}
-            self.update_step_status(3, "❌ Erreur", True)
-            self.save_progress()
-            raise e
-    
-    def generate_wine(self, recipe_name):
-        try:
-            for j in range(0, 101, 10):
-                self.root.after(0, self.update_progress, 4, j)
-                time.sleep(0.1)
-            self.generation_state["wine"] = {"status": "success"}
-            self.update_step_status(4, "✅ Complété")
-            self.save_progress()
-        except Exception as e:
-            self.generation_state["wine"] = {"status": "error", "message": str(e)}
-            self.update_step_status(4, "❌ Erreur", True)
-            self.save_progress()
-            raise e
-    
-    def save_recipe(self, recipe_name):
-        try:
-            for j in range(0, 101, 10):
-                self.root.after(0, self.update_progress, 5, j)
-                time.sleep(0.1)
-            
-            sql_output = generate_recipe(recipe_name)
-            filename = f"{recipe_name.replace(' ', '_').lower()}.sql"
-            
-            with open(filename, "w", encoding="utf-8") as f:
-                f.write(sql_output)
-            
-            self.generation_state["save"] = {"status": "success", "filename": filename}
-            self.update_step_status(5, "✅ Complété")
-            self.save_progress()
-        except Exception as e:
-            self.generation_state["save"] = {"status": "error", "message": str(e)}
-            self.update_step_status(5, "❌ Erreur", True)
-            self.save_progress()
-            raise e
+            self.launch_generation(self.current_recipe)
     
     def start_generation(self):
         recipe_name = self.recipe_entry.get()
         if recipe_name and recipe_name != "Entrez le nom de votre recette...":
             self.current_recipe = recipe_name
-            self.generate_btn["state"] = "disabled"
-            self.status_label["text"] = "Génération en cours..."
-            
-            # Réinitialiser les barres de progression
-            for progress in self.step_progresses:
-                progress["value"] = 0
-            
-            # Réinitialiser l'état de génération
-            self.generation_state = {}
-            
-            # Vérifier s'il existe une progression sauvegardée
-            if self.load_progress(recipe_name):
-                self.status_label["text"] = "Reprise de la génération précédente..."
-            
-            # Lancer la génération dans un thread séparé
-            thread = threading.Thread(target=self.generate_recipe_thread, args=(recipe_name,))
-            thread.start()
+            self.launch_generation(recipe_name)
+    
+    def launch_generation(self, recipe_name):
+        self.generate_btn["state"] = "disabled"
+        self.status_label["text"] = "Génération en cours..."
+        
+        # Réinitialiser les barres de progression
+        for i, progress in enumerate(self.step_progresses):
+            progress["value"] = 0
+            self.step_status[i].configure(text="En attente...", style="TLabel")
+            self.retry_buttons[i].pack_forget()
+        self.completed_stages = set()
+        
+        # Vérifier s'il existe une génération précédente dans le journal
+        if self.load_progress(recipe_name):
+            self.status_label["text"] = "Reprise de la génération précédente..."
+        
+        # Lancer la génération dans un thread séparé
+        thread = threading.Thread(target=self.generate_recipe_thread, args=(recipe_name,))
+        thread.start()
     
     def generate_recipe_thread(self, recipe_name):
+        journal = get_generation_journal()
         try:
-            for i, (_, step_function) in enumerate(self.steps):
-                if not self.generation_state.get(f"step_{i}", {}).get("status") == "success":
-                    try:
-                        step_function(recipe_name)
-                    except Exception as e:
-                        self.root.after(0, self.generation_error, f"Erreur à l'étape {i+1}: {str(e)}")
-                        return
+            recipe_data = journal.recipe_data(recipe_name) if journal else None
+            if recipe_data is None:
+                recipe_data = generate_recipe(recipe_name, on_event=self.on_generation_event, journal=journal)
+                if journal:
+                    journal.record_recipe_data(recipe_name, recipe_data)
             
-            self.root.after(0, self.generation_complete, recipe_name)
+            self.root.after(0, self.update_progress, SAVE_STEP, 50)
+            recipe_id = save_recipe_graph(get_supabase_client(), recipe_data)
+            if journal:
+                journal.record_saved(recipe_name, recipe_id)
+            self.root.after(0, self.update_progress, SAVE_STEP, 100)
+            self.root.after(0, self.update_step_status, SAVE_STEP, "✅ Complété")
+            self.root.after(0, self.generation_complete, recipe_id)
             
         except Exception as e:
-            self.root.after(0, self.generation_error, str(e))
-    
-    def generation_complete(self, recipe_name):
-        filename = f"{recipe_name.replace(' ', '_').lower()}.sql"
-        self.status_label["text"] = f"✅ Recette générée avec succès ! Fichier : {filename}"
+            if journal:
+                journal.record_failure(recipe_name, str(e))
+            failed_step = next(
+                (i for i, (_, stages) in enumerate(self.steps) if any(s not in self.completed_stages for s in stages)),
+                SAVE_STEP
+            )
+            self.root.after(0, self.update_step_status, failed_step, "❌ Erreur", True)
+            self.root.after(0, self.generation_error, f"Erreur à l'étape {failed_step + 1}: {str(e)}")
+    
+    def generation_complete(self, recipe_id):
+        self.status_label["text"] = f"✅ Recette générée et sauvegardée avec succès ! ID : {recipe_id}"
         self.generate_btn["state"] = "normal"
     
     def generation_error(self, error):
@@ -0,0 +1,58 @@
+import logging
+from typing import Dict, Optional
+
+from recipe_feed import RecipeFeedIndex
+from recipe_names import normalize_recipe_name
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Variantes courantes -> forme canonique (après normalisation)
+RECIPE_ALIASES = {
+    'tagine': 'tajine',
+    'tajine marocain': 'tajine',
+    'paella valenciana': 'paella',
+    'paella valencienne': 'paella',
+    'chicken yassa': 'poulet yassa',
+    'yassa au poulet': 'poulet yassa',
+    'yassa poulet': 'poulet yassa',
+    'spaghetti bolognaise': 'spaghetti bolognese',
+    'spaghettis bolognaise': 'spaghetti bolognese',
+    'tiramisu italien': 'tiramisu',
+    'ramen japonais': 'ramen',
+}
+
+
+def recipe_title_key(title: str) -> str:
+    """Clé de recherche d'un titre : normalisé puis ramené à sa forme canonique."""
+    key = normalize_recipe_name(title)
+    return RECIPE_ALIASES.get(key, key)
+
+
+class RecipeTitleIndex(RecipeFeedIndex):
+    """
+    Index en mémoire des titres de recettes existantes, par clé normalisée.
+    Chargé depuis Supabase au démarrage puis rafraîchi par incréments (recipe_feed).
+    """
+
+    FEED_COLUMNS = ('id', 'title')
+    FEED_NAME = 'Index des recettes'
+    FEED_ICON = '📚'
+
+    def __init__(self, refresh_interval: float = 60.0):
+        super().__init__(refresh_interval)
+        self._by_key: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_key)
+
+    def add(self, title: str, recipe_id: int) -> None:
+        with self._lock:
+            self._by_key.setdefault(recipe_title_key(title), recipe_id)
+
+    def _ingest(self, row: dict) -> None:
+        self.add(row['title'], row['id'])
+
+    def lookup(self, title: str) -> Optional[int]:
+        with self._lock:
+            return self._by_key.get(recipe_title_key(title))
@@ -0,0 +1,15 @@
+import re
+import unicodedata
+
+
+def fold_accents(text: str) -> str:
+    """Supprime les accents et signes diacritiques (rāmen -> ramen)."""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def normalize_recipe_name(name: str) -> str:
+    """Forme canonique d'un nom de recette : sans accents, casse, ponctuation ni espaces superflus."""
+    folded = fold_accents(name).casefold()
+    folded = re.sub(r"[^\w\s]", ' ', folded)
+    return ' '.join(folded.split())
@@ -0,0 +1,314 @@
+import logging
+import time
+from contextlib import contextmanager
+from postgrest.exceptions import APIError
+
+from ingredient_units import canonical_ingredient
+from metrics import DB_WRITE_DURATION, DB_WRITES
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Code PostgREST quand la fonction RPC n'existe pas (migration non appliquée)
+RPC_NOT_FOUND_CODES = ('PGRST202', '42883')
+# Violation de contrainte unique : un autre appel a sauvegardé le même request_id
+UNIQUE_VIOLATION_CODE = '23505'
+# Colonne inconnue du cache de schéma PostgREST, ou de la base
+UNDEFINED_COLUMN_CODES = ('PGRST204', '42703')
+
+RECIPE_COLUMNS = [
+    'title', 'country', 'region', 'description', 'preparation_time', 'cooking_time',
+    'difficulty', 'servings', 'is_premium', 'image_url', 'latitude', 'longitude',
+    'story_intro', 'story_intro_audio_url', 'request_id', 'image_hash', 'image_variants'
+]
+# Colonnes ajoutées après le modèle : request_id (migration 11), image_hash et
+# image_variants (migration 14). La fonction save_recipe_graph les demande
+# toutes ; le repli par insertions ne les envoie que renseignées et se passe
+# de celles que la base ne connaît pas encore.
+OPTIONAL_RECIPE_COLUMNS = ('request_id', 'image_hash', 'image_variants')
+# quantity_value, canonical_unit, name_key : quantités converties à l'écriture (migration 12)
+INGREDIENT_COLUMNS = ['name', 'quantity', 'unit', 'quantity_value', 'canonical_unit', 'name_key']
+STEP_COLUMNS = [
+    'order_number', 'title', 'description', 'story_content',
+    'story_audio_url', 'story_background_image_url'
+]
+PLAYLIST_COLUMNS = ['title', 'description', 'spotify_link', 'image_url']
+WINE_COLUMNS = ['name', 'description', 'region', 'image_url']
+
+_rpc_available = True
+_batch_rpc_available = True
+# Colonnes optionnelles absentes de la base, apprises des erreurs d'insertion
+_missing_recipe_columns = set()
+
+
+@contextmanager
+def _observe_write(operation):
+    started_at = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        DB_WRITES.inc(operation=operation, outcome='error')
+        raise
+    finally:
+        DB_WRITE_DURATION.observe(time.perf_counter() - started_at, operation=operation)
+    DB_WRITES.inc(operation=operation, outcome='ok')
+
+
+def _pick(row, columns):
+    return {column: row.get(column) for column in columns}
+
+
+def recipe_graph_payload(recipe_data, request_id=None):
+    """
+    Ne garde que les colonnes connues du schéma pour chaque table et ajoute les
+    quantités canoniques des ingrédients. `request_id` (clé fournie par le
+    client) remplace celui attribué à la génération.
+    """
+    recipe = _pick(recipe_data['recipe'], RECIPE_COLUMNS)
+    if request_id:
+        recipe['request_id'] = request_id
+    return {
+        'recipe': recipe,
+        'ingredients': [_pick({**i, **canonical_ingredient(i)}, INGREDIENT_COLUMNS) for i in recipe_data['ingredients']],
+        'steps': [_pick(s, STEP_COLUMNS) for s in recipe_data['steps']],
+        'playlist': _pick(recipe_data['playlist'], PLAYLIST_COLUMNS),
+        'wine_pairing': _pick(recipe_data['wine_pairing'], WINE_COLUMNS)
+    }
+
+
+def _recipe_row(recipe):
+    """Ligne recipes du repli par insertions, sans les colonnes optionnelles vides ou absentes de la base."""
+    return {column: value for column, value in recipe.items()
+            if column not in _missing_recipe_columns and not (column in OPTIONAL_RECIPE_COLUMNS and value is None)}
+
+
+def _forget_missing_column(e, row):
+    """
+    Retire de `row` la colonne optionnelle que la base ne connaît pas d'après
+    l'erreur PostgREST ; False si l'erreur est d'une autre nature.
+    """
+    if e.code not in UNDEFINED_COLUMN_CODES:
+        return False
+    message = f"{e.message or ''} {e.details or ''}"
+    column = next((column for column in OPTIONAL_RECIPE_COLUMNS if column in row and column in message), None)
+    if column is None:
+        return False
+    logger.warning(f"Colonne recipes.{column} absente (migration non appliquée), sauvegarde sans elle")
+    _missing_recipe_columns.add(column)
+    del row[column]
+    return True
+
+
+def save_recipe_graph_rpc(client, payload):
+    """Un seul aller-retour : la fonction save_recipe_graph écrit tout dans une transaction."""
+    with _observe_write('rpc_save_recipe_graph'):
+        response = client.rpc('save_recipe_graph', {'payload': payload}).execute()
+    if response.data is None:
+        raise Exception("Erreur lors de la sauvegarde de la recette (RPC)")
+    return response.data
+
+
+def _existing_recipe_id(client, payload):
+    """
+    Recette déjà sauvegardée avec ce request_id. Sans transaction, une recette
+    dont la dernière table (vin) manque est une sauvegarde interrompue : on la
+    supprime pour la réécrire.
+    """
+    request_id = payload['recipe'].get('request_id')
+    if not request_id or 'request_id' in _missing_recipe_columns:
+        return None
+    try:
+        rows = client.table('recipes').select('id').eq('request_id', request_id).execute().data
+    except APIError as e:
+        if _forget_missing_column(e, {'request_id': request_id}):
+            return None
+        raise
+    if not rows:
+        return None
+    recipe_id = rows[0]['id']
+    if client.table('wine_pairings').select('id').eq('recipe_id', recipe_id).execute().data:
+        return recipe_id
+    logger.warning(f"Sauvegarde incomplète de la recette {recipe_id}, réécriture")
+    with _observe_write('delete_recipes'):
+        client.table('recipes').delete().eq('id', recipe_id).execute()
+    return None
+
+
+def save_recipe_graph_bulk(client, payload):
+    """
+    Repli sans la fonction SQL : une insertion par table (5 allers-retours),
+    avec suppression de la recette en cas d'échec pour ne pas laisser de lignes orphelines.
+    """
+    existing_id = _existing_recipe_id(client, payload)
+    if existing_id is not None:
+        logger.info(f"Recette déjà sauvegardée (ID {existing_id}) pour ce request_id")
+        return existing_id
+
+    row = _recipe_row(payload['recipe'])
+    while True:
+        try:
+            with _observe_write('insert_recipes'):
+                recipe_insert = client.table('recipes').insert(row).execute()
+            break
+        except APIError as e:
+            if _forget_missing_column(e, row):
+                continue
+            if e.code != UNIQUE_VIOLATION_CODE:
+                raise
+            # Sauvegarde concurrente du même request_id
+            rows = client.table('recipes').select('id').eq('request_id', row['request_id']).execute().data
+            return rows[0]['id']
+    if not recipe_insert.data:
+        raise Exception("Erreur lors de l'insertion de la recette")
+    recipe_id = recipe_insert.data[0]['id']
+
+    try:
+        with_recipe = lambda row: {**row, 'recipe_id': recipe_id}
+        if payload['ingredients']:
+            with _observe_write('insert_ingredients'):
+                client.table('ingredients').insert([with_recipe(i) for i in payload['ingredients']]).execute()
+        if payload['steps']:
+            with _observe_write('insert_steps'):
+                client.table('steps').insert([with_recipe(s) for s in payload['steps']]).execute()
+        with _observe_write('insert_playlists'):
+            client.table('playlists').insert(with_recipe(payload['playlist'])).execute()
+        with _observe_write('insert_wine_pairings'):
+            client.table('wine_pairings').insert(with_recipe(payload['wine_pairing'])).execute()
+    except Exception:
+        # Les tables enfants sont en ON DELETE CASCADE
+        logger.error(f"Échec de l'insertion groupée, suppression de la recette {recipe_id}")
+        with _observe_write('delete_recipes'):
+            client.table('recipes').delete().eq('id', recipe_id).execute()
+        raise
+
+    return recipe_id
+
+
+def save_recipe_graph(client, recipe_data, request_id=None):
+    """
+    Sauvegarde la recette et toutes ses données associées, et retourne son ID.
+    Une recette de même request_id déjà en base n'est pas réécrite : son ID est retourné.
+    """
+    global _rpc_available
+    payload = recipe_graph_payload(recipe_data, request_id)
+
+    if _rpc_available:
+        try:
+            return save_recipe_graph_rpc(client, payload)
+        except APIError as e:
+            if e.code not in RPC_NOT_FOUND_CODES:
+                raise
+            logger.warning("Fonction save_recipe_graph absente, repli sur les insertions groupées")
+            _rpc_available = False
+
+    return save_recipe_graph_bulk(client, payload)
+
+
+async def save_recipe_graph_rpc_async(client, payload):
+    with _observe_write('rpc_save_recipe_graph'):
+        response = await client.rpc('save_recipe_graph', {'payload': payload}).execute()
+    if response.data is None:
+        raise Exception("Erreur lors de la sauvegarde de la recette (RPC)")
+    return response.data
+
+
+async def _existing_recipe_id_async(client, payload):
+    request_id = payload['recipe'].get('request_id')
+    if not request_id or 'request_id' in _missing_recipe_columns:
+        return None
+    try:
+        rows = (await client.table('recipes').select('id').eq('request_id', request_id).execute()).data
+    except APIError as e:
+        if _forget_missing_column(e, {'request_id': request_id}):
+            return None
+        raise
+    if not rows:
+        return None
+    recipe_id = rows[0]['id']
+    if (await client.table('wine_pairings').select('id').eq('recipe_id', recipe_id).execute()).data:
+        return recipe_id
+    logger.warning(f"Sauvegarde incomplète de la recette {recipe_id}, réécriture")
+    with _observe_write('delete_recipes'):
+        await client.table('recipes').delete().eq('id', recipe_id).execute()
+    return None
+
+
+async def save_recipe_graph_bulk_async(client, payload):
+    """Repli asynchrone sans la fonction SQL, même logique que save_recipe_graph_bulk."""
+    existing_id = await _existing_recipe_id_async(client, payload)
+    if existing_id is not None:
+        logger.info(f"Recette déjà sauvegardée (ID {existing_id}) pour ce request_id")
+        return existing_id
+
+    row = _recipe_row(payload['recipe'])
+    while True:
+        try:
+            with _observe_write('insert_recipes'):
+                recipe_insert = await client.table('recipes').insert(row).execute()
+            break
+        except APIError as e:
+            if _forget_missing_column(e, row):
+                continue
+            if e.code != UNIQUE_VIOLATION_CODE:
+                raise
+            rows = (await client.table('recipes').select('id').eq('request_id', row['request_id']).execute()).data
+            return rows[0]['id']
+    if not recipe_insert.data:
+        raise Exception("Erreur lors de l'insertion de la recette")
+    recipe_id = recipe_insert.data[0]['id']
+
+    try:
+        with_recipe = lambda row: {**row, 'recipe_id': recipe_id}
+        if payload['ingredients']:
+            with _observe_write('insert_ingredients'):
+                await client.table('ingredients').insert([with_recipe(i) for i in payload['ingredients']]).execute()
+        if payload['steps']:
+            with _observe_write('insert_steps'):
+                await client.table('steps').insert([with_recipe(s) for s in payload['steps']]).execute()
+        with _observe_write('insert_playlists'):
+            await client.table('playlists').insert(with_recipe(payload['playlist'])).execute()
+        with _observe_write('insert_wine_pairings'):
+            await client.table('wine_pairings').insert(with_recipe(payload['wine_pairing'])).execute()
+    except Exception:
+        logger.error(f"Échec de l'insertion groupée, suppression de la recette {recipe_id}")
+        with _observe_write('delete_recipes'):
+            await client.table('recipes').delete().eq('id', recipe_id).execute()
+        raise
+
+    return recipe_id
+
+
+async def save_recipe_graph_async(client, recipe_data, request_id=None):
+    """Version asynchrone de save_recipe_graph, pour un client PostgREST asynchrone."""
+    global _rpc_available
+    payload = recipe_graph_payload(recipe_data, request_id)
+
+    if _rpc_available:
+        try:
+            return await save_recipe_graph_rpc_async(client, payload)
+        except APIError as e:
+            if e.code not in RPC_NOT_FOUND_CODES:
+                raise
+            logger.warning("Fonction save_recipe_graph absente, repli sur les insertions groupées")
+            _rpc_available = False
+
+    return await save_recipe_graph_bulk_async(client, payload)
+
+
+def save_recipe_graphs(client, recipes):
+    """Sauvegarde un lot de recettes et retourne leurs IDs, dans l'ordre du lot."""
+    global _batch_rpc_available
+    payloads = [recipe_graph_payload(recipe_data) for recipe_data in recipes]
+
+    if _batch_rpc_available:
+        try:
+            with _observe_write('rpc_save_recipe_graphs'):
+                response = client.rpc('save_recipe_graphs', {'payloads': payloads}).execute()
+            return response.data
+        except APIError as e:
+            if e.code not in RPC_NOT_FOUND_CODES:
+                raise
+            logger.warning("Fonction save_recipe_graphs absente, repli recette par recette")
+            _batch_rpc_available = False
+
+    return [save_recipe_graph(client, recipe_data) for recipe_data in recipes]
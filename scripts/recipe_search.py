@@ -0,0 +1,253 @@
+"""
+Recherche plein texte en mémoire sur les recettes : titre, pays, région,
+description et noms d'ingrédients.
+
+Un index inversé associe chaque terme (sans accents, au singulier) aux
+recettes qui le contiennent, pondéré par le champ. Le dernier mot d'une
+requête est complété par préfixe (saisie au fil de l'eau), et un mot absent du
+vocabulaire est rapproché des termes voisins par trigrammes puis distance
+d'édition (« safarn » -> « safran »).
+"""
+import bisect
+import heapq
+import logging
+import math
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+from ingredient_units import singular
+from metrics import SEARCH_DURATION
+from recipe_feed import RecipeFeedIndex
+from recipe_names import normalize_recipe_name
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+SEARCH_COLUMNS = ('id', 'title', 'country', 'region', 'description', 'image_url', 'ingredients(name)')
+RESULT_COLUMNS = ('id', 'title', 'country', 'region', 'image_url')
+
+# Poids d'un terme selon le champ où il apparaît
+FIELD_WEIGHTS = (('title', 5.0), ('country', 3.0), ('region', 3.0), ('description', 1.0))
+INGREDIENT_WEIGHT = 2.0
+
+STOPWORDS = {
+    'a', 'au', 'aux', 'avec', 'd', 'de', 'des', 'du', 'en', 'et', 'l', 'la', 'le', 'les', 'ou', 'par',
+    'pour', 'sur', 'un', 'une', 'recette', 'the', 'of', 'and', 'with', 'from',
+}
+
+MIN_PREFIX_LENGTH = 3
+MAX_PREFIX_TERMS = 64
+PREFIX_FACTOR = 0.8
+# Une faute de frappe tolérée à partir de 4 lettres, deux à partir de 8
+MIN_FUZZY_LENGTH = 4
+MAX_FUZZY_CANDIDATES = 64
+FUZZY_FACTOR = 0.7
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+MAX_QUERY_LENGTH = 200
+
+
+def search_terms(text: Optional[str]) -> List[str]:
+    """Termes indexés d'un texte, dans l'ordre et sans doublons (« Œufs brouillés » -> oeuf, brouille)."""
+    words = normalize_recipe_name((text or '').replace('œ', 'oe').replace('Œ', 'oe')).split()
+    return list(dict.fromkeys(singular(word) for word in words if word not in STOPWORDS and len(word) > 1))
+
+
+def trigrams(term: str) -> Set[str]:
+    padded = f'  {term} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_typos(term: str) -> int:
+    if len(term) < MIN_FUZZY_LENGTH:
+        return 0
+    return 1 if len(term) < 8 else 2
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Distance de Damerau-Levenshtein (transpositions adjacentes), plafonnée à limit + 1."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+    return min(current[-1], limit + 1)
+
+
+class RecipeSearchIndex(RecipeFeedIndex):
+    """
+    Index inversé et trigrammes du vocabulaire. Chargé depuis Supabase au
+    démarrage, rafraîchi par incréments (recipe_feed) et complété à chaque
+    insertion.
+    """
+
+    FEED_COLUMNS = SEARCH_COLUMNS
+    FEED_NAME = 'Index de recherche'
+    FEED_ICON = '🔎'
+
+    def __init__(self, refresh_interval: float = 60.0):
+        super().__init__(refresh_interval)
+        # Terme -> {recipe_id: poids}
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._terms_by_recipe: Dict[int, Tuple[str, ...]] = {}
+        self._documents: Dict[int, dict] = {}
+        # Vocabulaire trié (préfixes) et trigramme -> termes (fautes de frappe)
+        self._sorted_terms: List[str] = []
+        self._trigrams: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def _index_term(self, term: str) -> None:
+        self._postings[term] = {}
+        bisect.insort(self._sorted_terms, term)
+        for gram in trigrams(term):
+            self._trigrams.setdefault(gram, set()).add(term)
+
+    def _drop_term(self, term: str) -> None:
+        del self._postings[term]
+        del self._sorted_terms[bisect.bisect_left(self._sorted_terms, term)]
+        for gram in trigrams(term):
+            terms = self._trigrams[gram]
+            terms.discard(term)
+            if not terms:
+                del self._trigrams[gram]
+
+    def _remove(self, recipe_id: int) -> None:
+        for term in self._terms_by_recipe.pop(recipe_id, ()):
+            postings = self._postings[term]
+            del postings[recipe_id]
+            if not postings:
+                self._drop_term(term)
+        self._documents.pop(recipe_id, None)
+
+    def add(self, recipe: dict) -> None:
+        """Indexe (ou réindexe) une recette ; `ingredients` est une liste de {name}."""
+        if recipe.get('id') is None:
+            return
+        weights: Dict[str, float] = {}
+        fields = [(recipe.get(field), weight) for field, weight in FIELD_WEIGHTS]
+        fields += [(ingredient.get('name'), INGREDIENT_WEIGHT) for ingredient in recipe.get('ingredients') or []]
+        seen = set()
+        for text, weight in fields:
+            for term in search_terms(text):
+                # Un terme compte une fois par champ, quel que soit le nombre d'ingrédients qui le citent
+                if (term, weight) not in seen:
+                    seen.add((term, weight))
+                    weights[term] = weights.get(term, 0.0) + weight
+        with self._lock:
+            self._remove(recipe['id'])
+            for term, weight in weights.items():
+                if term not in self._postings:
+                    self._index_term(term)
+                self._postings[term][recipe['id']] = weight
+            self._terms_by_recipe[recipe['id']] = tuple(weights)
+            self._documents[recipe['id']] = {column: recipe.get(column) for column in RESULT_COLUMNS}
+
+    def _ingest(self, row: dict) -> None:
+        self.add(row)
+
+    def _loaded_message(self, count: int) -> str:
+        return f"{count} recettes, {len(self._postings)} termes"
+
+    def _expansions(self, term: str, prefix: bool) -> List[Tuple[str, float]]:
+        """Termes du vocabulaire qui répondent à un mot de la requête, avec leur facteur."""
+        found: Dict[str, float] = {}
+        if term in self._postings:
+            found[term] = 1.0
+        if prefix and len(term) >= MIN_PREFIX_LENGTH:
+            start = bisect.bisect_left(self._sorted_terms, term)
+            for candidate in self._sorted_terms[start:start + MAX_PREFIX_TERMS]:
+                if not candidate.startswith(term):
+                    break
+                found.setdefault(candidate, PREFIX_FACTOR)
+        typos = max_typos(term)
+        if found or not typos:
+            return list(found.items())
+        # Candidats : les termes qui partagent assez de trigrammes (une faute en détruit au plus quatre)
+        grams = trigrams(term)
+        shared = Counter(candidate for gram in grams for candidate in self._trigrams.get(gram, ()))
+        needed = max(1, len(grams) - 4 * typos)
+        for candidate, count in shared.most_common(MAX_FUZZY_CANDIDATES):
+            if count < needed:
+                break
+            distance = edit_distance(term, candidate, typos)
+            if distance <= typos:
+                found[candidate] = FUZZY_FACTOR ** distance
+        return list(found.items())
+
+    def _term_scores(self, expansions: List[Tuple[str, float]], documents: int,
+                     among: Optional[Dict[int, float]] = None) -> Dict[int, float]:
+        """Meilleur score de chaque recette pour un mot ; limité à `among` quand c'est moins coûteux."""
+        scored = [(self._postings[term], factor * math.log(1 + documents / len(self._postings[term])))
+                  for term, factor in expansions]
+        candidates = among if among is not None and \
+            len(among) * len(scored) < sum(len(postings) for postings, _ in scored) else None
+        if len(scored) == 1:
+            postings, idf = scored[0]
+            if candidates is None:
+                return {recipe_id: weight * idf for recipe_id, weight in postings.items()}
+            return {recipe_id: postings[recipe_id] * idf for recipe_id in candidates if recipe_id in postings}
+        scores: Dict[int, float] = {}
+        for postings, idf in scored:
+            pairs = postings.items() if candidates is None else \
+                ((recipe_id, postings[recipe_id]) for recipe_id in candidates if recipe_id in postings)
+            for recipe_id, weight in pairs:
+                if weight * idf > scores.get(recipe_id, 0.0):
+                    scores[recipe_id] = weight * idf
+        return scores
+
+    def search(self, query: str, limit: int = DEFAULT_LIMIT) -> Tuple[List[dict], int]:
+        """
+        Recettes qui répondent à tous les mots de la requête, les mieux classées
+        d'abord, et leur nombre total. Le dernier mot est complété par préfixe,
+        sauf si la requête se termine par une espace.
+        """
+        terms = search_terms(query)
+        if not terms:
+            return [], 0
+        started_at = time.perf_counter()
+        prefix_last = not query[-1:].isspace()
+        with self._lock:
+            expanded = [self._expansions(term, prefix_last and i == len(terms) - 1) for i, term in enumerate(terms)]
+            # Du mot le plus sélectif au moins sélectif : les suivants ne sont cherchés que parmi les retenus
+            expanded.sort(key=lambda expansions: sum(len(self._postings[term]) for term, _ in expansions))
+            scores: Optional[Dict[int, float]] = None
+            for expansions in expanded:
+                term_scores = self._term_scores(expansions, len(self._documents), scores)
+                scores = term_scores if scores is None else {
+                    recipe_id: score + term_scores[recipe_id]
+                    for recipe_id, score in scores.items() if recipe_id in term_scores
+                }
+                if not scores:
+                    break
+            top = heapq.nlargest(limit, scores.items(), key=lambda entry: (entry[1], -entry[0]))
+            results = [{**self._documents[recipe_id], 'score': round(score, 3)} for recipe_id, score in top]
+        SEARCH_DURATION.observe(time.perf_counter() - started_at)
+        return results, len(scores)
+
+
+def search_query(index: RecipeSearchIndex, params) -> dict:
+    """Résultats pour les paramètres q et limit ; ValueError si invalides."""
+    query = params.get('q') or ''
+    if not query.strip():
+        raise ValueError("Le paramètre q est obligatoire")
+    if len(query) > MAX_QUERY_LENGTH:
+        raise ValueError(f"Requête limitée à {MAX_QUERY_LENGTH} caractères")
+    try:
+        limit = int(params.get('limit') or DEFAULT_LIMIT)
+    except ValueError:
+        raise ValueError("limit doit être un entier")
+    if not 0 < limit <= MAX_LIMIT:
+        raise ValueError(f"limit doit être compris entre 1 et {MAX_LIMIT}")
+    results, total = index.search(query, limit)
+    return {'query': query, 'results': results, 'total': total}
@@ -1,11 +1,26 @@
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, g, send_from_directory
 from flask_cors import CORS
-from generate_recipe import generate_recipe
-from supabase import create_client
+from generate_recipe import generate_recipe, prompt_cache
+from job_queue import JobManager, QueueFullError, create_job_backend, JOB_PENDING, JOB_COMPLETED
+from clients import get_supabase_client
+from recipe_persistence import save_recipe_graph
+from recipe_names import normalize_recipe_name
+from recipe_index import RecipeTitleIndex
+from recipe_geo_index import RecipeGeoIndex, map_query, nearest_query
+from recipe_search import RecipeSearchIndex, search_query
+from image_pipeline import IMAGE_STORE_DIR, IMMUTABLE_CACHE_CONTROL
+from recipe_catalog import (CACHE_CONTROL, CatalogVersion, catalog_etag, content_etag, encode_catalog, etag_matches,
+                            parse_catalog_request, catalog_page)
+from generation_journal import get_generation_journal
+from shopping_list import parse_shopping_request, shopping_list_for_recipes
+from recipe_events import (generate_step_response, generation_event_response, job_status_payload, parse_event_cursor,
+                           sse_event)
+import metrics
 import os
 import logging
 import sys
-import json
+import time
+import uuid
 from logging.handlers import RotatingFileHandler
 from dotenv import load_dotenv
 
@@ -34,11 +49,20 @@ logger = logging.getLogger(__name__)
 # Configuration de l'application
 app = Flask(__name__)
 
-# Configuration Supabase
-supabase = create_client(
-    os.getenv('SUPABASE_URL'),
-    os.getenv('SUPABASE_SERVICE_KEY')
-)
+# Index des titres existants, pour ne pas régénérer une recette déjà en base
+recipe_index = RecipeTitleIndex(refresh_interval=float(os.getenv('RECIPE_INDEX_REFRESH_INTERVAL', 60)))
+# Recettes géolocalisées, pour la carte
+geo_index = RecipeGeoIndex(refresh_interval=float(os.getenv('RECIPE_INDEX_REFRESH_INTERVAL', 60)))
+# Recherche plein texte (titre, origine, description, ingrédients)
+search_index = RecipeSearchIndex(refresh_interval=float(os.getenv('RECIPE_INDEX_REFRESH_INTERVAL', 60)))
+# Version du catalogue, pour les ETag de /recipes
+catalog_version = CatalogVersion(refresh_interval=float(os.getenv('CATALOG_VERSION_REFRESH_INTERVAL', 5)))
+try:
+    recipe_index.warm(get_supabase_client())
+    geo_index.warm(get_supabase_client())
+    search_index.warm(get_supabase_client())
+except Exception as e:
+    logger.warning(f"Chargement de l'index des recettes impossible: {str(e)}")
 
 # En production, on limite les origines CORS
 ALLOWED_ORIGINS = os.getenv('ALLOWED_ORIGINS', 'https://cuisine-voyage.com').split(',')
@@ -46,13 +70,35 @@ CORS(app, resources={
     r"/*": {
         "origins": ALLOWED_ORIGINS,
         "methods": ["GET", "POST", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization", "X-API-Key"]
+        "allow_headers": ["Content-Type", "Authorization", "X-API-Key", "Idempotency-Key", "If-None-Match"],
+        "expose_headers": ["ETag"]
     }
 })
 
 # Configuration de la sécurité
 API_KEY = os.getenv('API_KEY')
 
+# Identifiant de trace par requête : repris de X-Request-ID, ou généré si TRACE_IDS=1
+TRACE_IDS = os.getenv('TRACE_IDS', '1') == '1'
+
+@app.before_request
+def start_request_metrics():
+    g.started_at = time.perf_counter()
+    g.trace_id = request.headers.get('X-Request-ID') or (uuid.uuid4().hex if TRACE_IDS else None)
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.HTTP_REQUESTS.inc(method=request.method, endpoint=endpoint, status=response.status_code)
+    metrics.HTTP_DURATION.observe(time.perf_counter() - g.started_at, method=request.method, endpoint=endpoint)
+    if g.trace_id:
+        response.headers['X-Request-ID'] = g.trace_id
+    return response
+
+def idempotency_key(data):
+    """Clé fournie par le client (en-tête Idempotency-Key ou champ requestId) pour rejouer une demande sans doublon."""
+    return request.headers.get('Idempotency-Key') or data.get('requestId')
+
 def require_api_key(f):
     def decorated_function(*args, **kwargs):
         api_key = request.headers.get('X-API-Key')
@@ -62,92 +108,113 @@ def require_api_key(f):
     decorated_function.__name__ = f.__name__
     return decorated_function
 
-def execute_sql(recipe_data):
-    """Exécute le SQL pour insérer les données de la recette dans Supabase"""
+def execute_sql(recipe_data, request_id=None):
+    """
+    Insère la recette et ses données associées dans Supabase, et retourne son ID.
+    Idempotent : une recette de même request_id déjà insérée n'est pas dupliquée.
+    """
     try:
-        # 1. Insertion de la recette
         logger.info("Insertion de la recette dans la base de données...")
-        
-        recipe = recipe_data['recipe']
-        recipe_insert = supabase.table('recipes').insert({
-            'title': recipe['title'],
-            'country': recipe['country'],
-            'region': recipe['region'],
-            'description': recipe['description'],
-            'preparation_time': recipe['preparation_time'],
-            'cooking_time': recipe['cooking_time'],
-            'difficulty': recipe['difficulty'],
-            'servings': recipe['servings'],
-            'is_premium': recipe['is_premium'],
-            'image_url': recipe['image_url'],
-            'latitude': recipe['latitude'],
-            'longitude': recipe['longitude'],
-            'story_intro': recipe['story_intro'],
-            'story_intro_audio_url': recipe['story_intro_audio_url']
-        }).execute()
-        
-        if not recipe_insert.data or len(recipe_insert.data) == 0:
-            raise Exception("Erreur lors de l'insertion de la recette")
-            
-        recipe_id = recipe_insert.data[0]['id']
+        recipe_id = save_recipe_graph(get_supabase_client(), recipe_data, request_id)
         logger.info(f"Recette insérée avec l'ID: {recipe_id}")
-        
-        # 2. Insertion des ingrédients
-        logger.info("Insertion des ingrédients...")
-        for ingredient in recipe_data['ingredients']:
-            supabase.table('ingredients').insert({
-                'recipe_id': recipe_id,
-                'name': ingredient['name'],
-                'quantity': ingredient['quantity'],
-                'unit': ingredient['unit']
-            }).execute()
-        
-        # 3. Insertion des étapes
-        logger.info("Insertion des étapes...")
-        for step in recipe_data['steps']:
-            supabase.table('steps').insert({
-                'recipe_id': recipe_id,
-                'order_number': step['order_number'],
-                'title': step['title'],
-                'description': step['description'],
-                'story_content': step['story_content'],
-                'story_audio_url': step['story_audio_url'],
-                'story_background_image_url': step['story_background_image_url']
-            }).execute()
-        
-        # 4. Insertion de la playlist
-        logger.info("Insertion de la playlist...")
-        supabase.table('playlists').insert({
-            'recipe_id': recipe_id,
-            'title': recipe_data['playlist']['title'],
-            'description': recipe_data['playlist']['description'],
-            'spotify_link': recipe_data['playlist']['spotify_link'],
-            'image_url': recipe_data['playlist']['image_url']
-        }).execute()
-        
-        # 5. Insertion de l'accord de vin
-        logger.info("Insertion de l'accord de vin...")
-        supabase.table('wine_pairings').insert({
-            'recipe_id': recipe_id,
-            'name': recipe_data['wine_pairing']['name'],
-            'description': recipe_data['wine_pairing']['description'],
-            'region': recipe_data['wine_pairing']['region'],
-            'image_url': recipe_data['wine_pairing']['image_url']
-        }).execute()
-        
+        catalog_version.bump()
         logger.info("Toutes les données ont été insérées avec succès.")
-        return True
+        return recipe_id
         
     except Exception as e:
         logger.error(f"Erreur lors de l'exécution SQL: {str(e)}")
         raise e
 
-def generate_step_response(step, status, message):
-    return {
-        'step': step,
-        'status': status,
-        'message': message
-    }
+def sse_response(stream):
+    # Configuration plus permissive des CORS pour les SSE
+    response = Response(stream, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Connection'] = 'keep-alive'
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, X-API-Key, Accept, Idempotency-Key'
+    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def run_generation_job(job, emit):
+    """Exécuté par un worker : génère la recette puis la sauvegarde."""
+    recipe_name = job['payload']['recipeName']
+    trace_id = job['payload'].get('traceId')
+    if trace_id:
+        # Chaque événement SSE porte l'identifiant de trace de la requête d'origine
+        emit_event = emit
+        emit = lambda event: emit_event({**event, 'traceId': trace_id})
+        logger.info(f"Génération de {recipe_name} (trace {trace_id})")
+    # Les prompts déjà payés lors d'une tentative échouée sont repris du journal
+    journal = get_generation_journal()
+    started_at = time.perf_counter()
+    try:
+        # Étape 1: Initialisation
+        emit(generate_step_response(
+            step=1,
+            status='loading',
+            message='Recherche de la recette...'
+        ))
+
+        # Une tentative précédente a pu échouer après la génération : on reprend à la sauvegarde
+        recipe_data = journal.recipe_data(recipe_name) if journal else None
+        if recipe_data:
+            logger.info("Recette déjà générée lors d'une tentative précédente, reprise à la sauvegarde")
+        else:
+            # Les étapes 2 à 7 sont publiées au fil des prompts
+            recipe_data = generate_recipe(
+                recipe_name,
+                on_event=lambda event: emit(generation_event_response(event)),
+                journal=journal
+            )
+            if journal:
+                journal.record_recipe_data(recipe_name, recipe_data)
+
+        # Sauvegarde dans Supabase
+        logger.info("Sauvegarde dans Supabase...")
+        recipe_id = execute_sql(recipe_data, job['payload'].get('requestId'))
+        recipe_index.add(recipe_name, recipe_id)
+        geo_index.add({**recipe_data['recipe'], 'id': recipe_id})
+        search_index.add({**recipe_data['recipe'], 'id': recipe_id, 'ingredients': recipe_data['ingredients']})
+        if journal:
+            journal.record_saved(recipe_name, recipe_id)
+
+        # Étape finale: Succès
+        emit({**generate_step_response(
+            step=8,
+            status='completed',
+            message='Recette générée et sauvegardée avec succès !'
+        ), 'recipeId': recipe_id})
+        metrics.GENERATION_DURATION.observe(time.perf_counter() - started_at, outcome='ok')
+        return {'message': 'Recette générée et sauvegardée avec succès !', 'recipeId': recipe_id}
+
+    except Exception as e:
+        metrics.GENERATION_DURATION.observe(time.perf_counter() - started_at, outcome='error')
+        logger.error(f"Erreur lors de la génération: {str(e)}")
+        if journal:
+            journal.record_failure(recipe_name, str(e))
+        emit({
+            'error': str(e),
+            'details': 'Erreur lors de la génération de la recette'
+        })
+        raise
+
+# File de génération : les requêtes ne font qu'enfiler, un pool borné génère
+job_manager = JobManager(
+    create_job_backend(),
+    run_generation_job,
+    max_workers=int(os.getenv('JOB_WORKERS', 4)),
+    max_pending=int(os.getenv('JOB_MAX_PENDING', 100))
+)
+metrics.gauge('recipe_jobs_pending', "Générations en attente d'un worker", job_manager.backend.pending_count)
+
+def stream_job_events(job_id, after=0):
+    for seq, event in job_manager.events(job_id, after=after):
+        if event is None:
+            # Keep-alive pour éviter la coupure par les proxys
+            yield ': keep-alive\n\n'
+        else:
+            yield f'id: {seq}\n' + sse_event(event)
 
 @app.route('/generate-recipe', methods=['POST', 'OPTIONS'])
 @require_api_key
@@ -164,108 +231,71 @@ def handle_generate_recipe():
         if not recipe_name:
             logger.error("Nom de recette manquant dans la requête")
             return jsonify({'error': 'Le nom de la recette est requis'}), 400
+
+        # Recette déjà en base : on retourne son ID sans rien générer, sauf si `force`
+        if not data.get('force'):
+            recipe_index.refresh(get_supabase_client())
+            existing_id = recipe_index.lookup(recipe_name)
+            if existing_id is not None:
+                logger.info(f"Recette déjà existante (ID {existing_id}), génération ignorée")
+                existing = {
+                    **generate_step_response(
+                        step=8,
+                        status='completed',
+                        message='Cette recette existe déjà !'
+                    ),
+                    'success': True,
+                    'existing': True,
+                    'recipeId': existing_id
+                }
+                if g.trace_id:
+                    existing['traceId'] = g.trace_id
+                if 'application/json' in request.headers.get('Accept', '') or data.get('async'):
+                    return jsonify(existing)
+                return sse_response(iter([sse_event(existing)]))
+
+        try:
+            # Les demandes simultanées d'une même recette partagent une seule génération
+            job_id, created = job_manager.submit(
+                {'recipeName': recipe_name, 'traceId': g.trace_id, 'requestId': idempotency_key(data)},
+                dedup_key=normalize_recipe_name(recipe_name)
+            )
+        except QueueFullError as e:
+            logger.warning(f"File de génération saturée: {str(e)}")
+            return jsonify({'error': str(e), 'details': 'Réessayez dans quelques instants'}), 503
+
+        # Mode asynchrone : on retourne l'identifiant du job immédiatement
+        if data.get('async') or 'respond-async' in request.headers.get('Prefer', ''):
+            logger.info(f"Job {job_id} mis en file (mode asynchrone)")
+            return jsonify({
+                'jobId': job_id,
+                'status': JOB_PENDING if created else job_manager.get(job_id)['status'],
+                'coalesced': not created,
+                'statusUrl': f'/jobs/{job_id}',
+                'eventsUrl': f'/jobs/{job_id}/events'
+            }), 202
             
         # Vérifier si le client préfère une réponse JSON au lieu de SSE
         accept_header = request.headers.get('Accept', '')
         if 'application/json' in accept_header:
             # Mode simplifié - pas de streaming, juste une réponse JSON
-            try:
-                logger.info("Mode simplifié demandé (JSON)")
-                recipe_data = generate_recipe(recipe_name)
-                execute_sql(recipe_data)
-                return jsonify({
-                    'success': True,
-                    'message': 'Recette générée et sauvegardée avec succès !'
-                })
-            except Exception as e:
-                logger.error(f"Erreur lors de la génération (mode simplifié): {str(e)}")
+            logger.info("Mode simplifié demandé (JSON)")
+            job = job_manager.wait(job_id)
+            if job['status'] != JOB_COMPLETED:
+                logger.error(f"Erreur lors de la génération (mode simplifié): {job['error']}")
                 return jsonify({
                     'success': False,
-                    'error': str(e),
+                    'error': job['error'],
                     'details': 'Erreur lors de la génération de la recette'
                 }), 500
+            return jsonify({
+                'success': True,
+                'message': 'Recette générée et sauvegardée avec succès !',
+                'recipeId': job['result']['recipeId']
+            })
 
         # Mode streaming avec Server-Sent Events (SSE)
-        def generate():
-            try:
-                # Étape 1: Initialisation
-                yield 'data: ' + json.dumps(generate_step_response(
-                    step=1,
-                    status='loading',
-                    message='Recherche de la recette...'
-                )) + '\n\n'
-
-                # Étape 2: Génération de la recette
-                yield 'data: ' + json.dumps(generate_step_response(
-                    step=2,
-                    status='loading',
-                    message='Génération des informations de base...'
-                )) + '\n\n'
-                
-                recipe_data = generate_recipe(recipe_name)
-                
-                # Étape 3: Ajout des ingrédients
-                yield 'data: ' + json.dumps(generate_step_response(
-                    step=3,
-                    status='loading',
-                    message='Ajout des ingrédients...'
-                )) + '\n\n'
-
-                # Étape 4: Ajout des instructions
-                yield 'data: ' + json.dumps(generate_step_response(
-                    step=4,
-                    status='loading',
-                    message='Ajout des instructions de préparation...'
-                )) + '\n\n'
-
-                # Étape 5: Génération de l'histoire
-                yield 'data: ' + json.dumps(generate_step_response(
-                    step=5,
-                    status='loading',
-                    message='Création de l\'histoire immersive...'
-                )) + '\n\n'
-
-                # Étape 6: Accord de vin
-                yield 'data: ' + json.dumps(generate_step_response(
-                    step=6,
-                    status='loading',
-                    message='Recherche de l\'accord de vin parfait...'
-                )) + '\n\n'
-
-                # Étape 7: Playlist
-                yield 'data: ' + json.dumps(generate_step_response(
-                    step=7,
-                    status='loading',
-                    message='Création de la playlist d\'ambiance...'
-                )) + '\n\n'
-
-                # Sauvegarde dans Supabase
-                logger.info("Sauvegarde dans Supabase...")
-                execute_sql(recipe_data)
-
-                # Étape finale: Succès
-                yield 'data: ' + json.dumps(generate_step_response(
-                    step=8,
-                    status='completed',
-                    message='Recette générée et sauvegardée avec succès !'
-                )) + '\n\n'
-
-            except Exception as e:
-                logger.error(f"Erreur lors de la génération: {str(e)}")
-                yield 'data: ' + json.dumps({
-                    'error': str(e),
-                    'details': 'Erreur lors de la génération de la recette'
-                }) + '\n\n'
-
-        # Configuration plus permissive des CORS pour les SSE
-        response = Response(generate(), mimetype='text/event-stream')
-        response.headers['Cache-Control'] = 'no-cache'
-        response.headers['Connection'] = 'keep-alive'
-        response.headers['Access-Control-Allow-Origin'] = '*'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, X-API-Key, Accept'
-        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
-        response.headers['X-Accel-Buffering'] = 'no'
-        return response
+        return sse_response(stream_job_events(job_id))
         
     except Exception as e:
         logger.error(f"Erreur serveur: {str(e)}")
@@ -275,6 +305,111 @@ def handle_generate_recipe():
             'details': 'Erreur serveur inattendue'
         }), 500
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+@require_api_key
+def handle_job_status(job_id):
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job introuvable'}), 404
+    return jsonify(job_status_payload(job))
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+@require_api_key
+def handle_job_events(job_id):
+    if not job_manager.get(job_id):
+        return jsonify({'error': 'Job introuvable'}), 404
+    # Reprise après déconnexion via l'en-tête standard Last-Event-ID
+    try:
+        after = parse_event_cursor(request.headers.get('Last-Event-ID', request.args.get('after')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return sse_response(stream_job_events(job_id, after=after))
+
+@app.route('/shopping-list', methods=['POST'])
+@require_api_key
+def handle_shopping_list():
+    """Liste de courses des recettes choisies, pour `servings` portions."""
+    try:
+        recipe_ids, servings = parse_shopping_request(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        return jsonify(shopping_list_for_recipes(get_supabase_client(), recipe_ids, servings))
+    except Exception as e:
+        logger.error(f"Erreur lors du calcul de la liste de courses: {str(e)}")
+        return jsonify({'error': str(e), 'details': 'Erreur lors du calcul de la liste de courses'}), 500
+
+@app.route('/recipes/map', methods=['GET'])
+@require_api_key
+def handle_recipes_map():
+    """Recettes de la zone visible (bbox=ouest,sud,est,nord), regroupées aux petits zooms."""
+    geo_index.refresh(get_supabase_client())
+    try:
+        return jsonify(map_query(geo_index, request.args))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/recipes/nearest', methods=['GET'])
+@require_api_key
+def handle_recipes_nearest():
+    """Recettes les plus proches d'un point (lat, lon)."""
+    geo_index.refresh(get_supabase_client())
+    try:
+        return jsonify(nearest_query(geo_index, request.args))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/recipes', methods=['GET'])
+@require_api_key
+def handle_catalog():
+    """Catalogue paginé par curseur (fields, limit, cursor), avec ETag et 304."""
+    try:
+        query = parse_catalog_request(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        client = get_supabase_client()
+        version = catalog_version.current(client)
+        # Sans la table catalog_version (migration 16), l'ETag est calculé sur la page
+        body = encode_catalog(catalog_page(client, query)) if version is None else None
+        etag = catalog_etag(version, query) if body is None else content_etag(body)
+        headers = {'ETag': etag, 'Cache-Control': CACHE_CONTROL}
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            return Response(status=304, headers=headers)
+        if body is None:
+            body = encode_catalog(catalog_page(client, query))
+        return Response(body, content_type='application/json', headers=headers)
+    except Exception as e:
+        logger.error(f"Erreur lors de la lecture du catalogue: {str(e)}")
+        return jsonify({'error': str(e), 'details': 'Erreur lors de la lecture du catalogue'}), 500
+
+@app.route('/images/<path:path>', methods=['GET'])
+def handle_image(path):
+    """Fichiers du stockage local d'images : chemins par empreinte, donc immuables et publics."""
+    response = send_from_directory(IMAGE_STORE_DIR, path, max_age=31536000)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+@app.route('/search', methods=['GET'])
+@require_api_key
+def handle_search():
+    """Recherche tolérante aux accents et aux fautes de frappe (q, limit)."""
+    search_index.refresh(get_supabase_client())
+    try:
+        return jsonify(search_query(search_index, request.args))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/cache/stats', methods=['GET'])
+@require_api_key
+def handle_cache_stats():
+    return jsonify(prompt_cache.stats())
+
+@app.route('/metrics', methods=['GET'])
+@require_api_key
+def handle_metrics():
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
     debug = os.getenv('FLASK_ENV') == 'development'
@@ -0,0 +1,403 @@
+"""
+Serveur ASGI (Starlette) équivalent à recipe_server, sans thread par requête :
+les appels OpenAI et Supabase sont attendus sur la boucle d'événements, et un
+flux SSE ne coûte qu'une coroutine. Mêmes routes et même format de réponse.
+
+    uvicorn recipe_server_async:app --host 0.0.0.0 --port 5000
+"""
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from generate_recipe import generate_recipe_async, prompt_cache
+from job_queue import AsyncJobManager, QueueFullError, JOB_PENDING, JOB_COMPLETED
+from clients import get_async_supabase_client, get_supabase_client
+from recipe_persistence import save_recipe_graph_async
+from recipe_names import normalize_recipe_name
+from recipe_index import RecipeTitleIndex
+from recipe_geo_index import RecipeGeoIndex, map_query, nearest_query
+from recipe_search import RecipeSearchIndex, search_query
+from image_pipeline import IMAGE_STORE_DIR, IMMUTABLE_CACHE_CONTROL
+from recipe_catalog import (CACHE_CONTROL, CatalogVersion, catalog_etag, content_etag, encode_catalog, etag_matches,
+                            parse_catalog_request, catalog_page_async)
+from generation_journal import get_generation_journal
+from shopping_list import parse_shopping_request, shopping_list_for_recipes_async
+from recipe_events import (generate_step_response, generation_event_response, job_status_payload, parse_event_cursor,
+                           sse_event)
+import metrics
+import asyncio
+import contextlib
+import os
+import logging
+import sys
+import time
+import uuid
+from dotenv import load_dotenv
+
+# Charger les variables d'environnement
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+logger = logging.getLogger(__name__)
+
+# Index des titres existants, pour ne pas régénérer une recette déjà en base
+recipe_index = RecipeTitleIndex(refresh_interval=float(os.getenv('RECIPE_INDEX_REFRESH_INTERVAL', 60)))
+# Recettes géolocalisées, pour la carte
+geo_index = RecipeGeoIndex(refresh_interval=float(os.getenv('RECIPE_INDEX_REFRESH_INTERVAL', 60)))
+# Recherche plein texte (titre, origine, description, ingrédients)
+search_index = RecipeSearchIndex(refresh_interval=float(os.getenv('RECIPE_INDEX_REFRESH_INTERVAL', 60)))
+# Version du catalogue, pour les ETag de /recipes
+catalog_version = CatalogVersion(refresh_interval=float(os.getenv('CATALOG_VERSION_REFRESH_INTERVAL', 5)))
+
+ALLOWED_ORIGINS = os.getenv('ALLOWED_ORIGINS', 'https://cuisine-voyage.com').split(',')
+API_KEY = os.getenv('API_KEY')
+TRACE_IDS = os.getenv('TRACE_IDS', '1') == '1'
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'Connection': 'keep-alive',
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type, X-API-Key, Accept, Idempotency-Key',
+    'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+    'X-Accel-Buffering': 'no'
+}
+
+
+class RequestMetricsMiddleware:
+    """Métriques HTTP et identifiant de trace, comme les hooks Flask de recipe_server."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        started_at = time.perf_counter()
+        headers = dict(scope['headers'])
+        request_id = headers.get(b'x-request-id')
+        trace_id = request_id.decode('latin-1') if request_id else (uuid.uuid4().hex if TRACE_IDS else None)
+        scope.setdefault('state', {})['trace_id'] = trace_id
+
+        async def send_with_metrics(message):
+            if message['type'] == 'http.response.start':
+                endpoint = ROUTE_PATHS.get(scope.get('endpoint'), 'unmatched')
+                metrics.HTTP_REQUESTS.inc(method=scope['method'], endpoint=endpoint, status=message['status'])
+                metrics.HTTP_DURATION.observe(time.perf_counter() - started_at, method=scope['method'], endpoint=endpoint)
+                if trace_id:
+                    message.setdefault('headers', []).append((b'x-request-id', trace_id.encode('latin-1')))
+            await send(message)
+
+        await self.app(scope, receive, send_with_metrics)
+
+
+def require_api_key(f):
+    async def decorated_function(request):
+        api_key = request.headers.get('X-API-Key')
+        if not api_key or api_key != API_KEY:
+            return JSONResponse({'error': 'Accès non autorisé'}, status_code=401)
+        return await f(request)
+    decorated_function.__name__ = f.__name__
+    return decorated_function
+
+
+async def run_generation_job(job, emit):
+    """Tâche asyncio : génère la recette puis la sauvegarde."""
+    recipe_name = job['payload']['recipeName']
+    trace_id = job['payload'].get('traceId')
+    if trace_id:
+        emit_event = emit
+        emit = lambda event: emit_event({**event, 'traceId': trace_id})
+        logger.info(f"Génération de {recipe_name} (trace {trace_id})")
+    journal = get_generation_journal()
+    started_at = time.perf_counter()
+    try:
+        emit(generate_step_response(
+            step=1,
+            status='loading',
+            message='Recherche de la recette...'
+        ))
+
+        recipe_data = await asyncio.to_thread(journal.recipe_data, recipe_name) if journal else None
+        if recipe_data:
+            logger.info("Recette déjà générée lors d'une tentative précédente, reprise à la sauvegarde")
+        else:
+            recipe_data = await generate_recipe_async(
+                recipe_name,
+                on_event=lambda event: emit(generation_event_response(event)),
+                journal=journal
+            )
+            if journal:
+                await asyncio.to_thread(journal.record_recipe_data, recipe_name, recipe_data)
+
+        logger.info("Sauvegarde dans Supabase...")
+        recipe_id = await save_recipe_graph_async(get_async_supabase_client(), recipe_data, job['payload'].get('requestId'))
+        logger.info(f"Recette insérée avec l'ID: {recipe_id}")
+        catalog_version.bump()
+        recipe_index.add(recipe_name, recipe_id)
+        geo_index.add({**recipe_data['recipe'], 'id': recipe_id})
+        search_index.add({**recipe_data['recipe'], 'id': recipe_id, 'ingredients': recipe_data['ingredients']})
+        if journal:
+            await asyncio.to_thread(journal.record_saved, recipe_name, recipe_id)
+
+        emit({**generate_step_response(
+            step=8,
+            status='completed',
+            message='Recette générée et sauvegardée avec succès !'
+        ), 'recipeId': recipe_id})
+        metrics.GENERATION_DURATION.observe(time.perf_counter() - started_at, outcome='ok')
+        return {'message': 'Recette générée et sauvegardée avec succès !', 'recipeId': recipe_id}
+
+    except Exception as e:
+        metrics.GENERATION_DURATION.observe(time.perf_counter() - started_at, outcome='error')
+        logger.error(f"Erreur lors de la génération: {str(e)}")
+        if journal:
+            await asyncio.to_thread(journal.record_failure, recipe_name, str(e))
+        emit({
+            'error': str(e),
+            'details': 'Erreur lors de la génération de la recette'
+        })
+        raise
+
+# Les générations ne bloquent aucun thread : la limite porte sur les appels simultanés au modèle
+job_manager = AsyncJobManager(
+    run_generation_job,
+    max_running=int(os.getenv('ASYNC_MAX_GENERATIONS', 200)),
+    max_pending=int(os.getenv('JOB_MAX_PENDING', 1000))
+)
+metrics.gauge('recipe_jobs_pending', "Générations en attente d'un worker", job_manager.pending_count)
+
+async def stream_job_events(job_id, after=0):
+    async for seq, event in job_manager.events(job_id, after=after):
+        if event is None:
+            # Keep-alive pour éviter la coupure par les proxys
+            yield ': keep-alive\n\n'
+        else:
+            yield f'id: {seq}\n' + sse_event(event)
+
+def sse_response(stream):
+    return StreamingResponse(stream, media_type='text/event-stream', headers=SSE_HEADERS)
+
+@require_api_key
+async def handle_generate_recipe(request: Request):
+    trace_id = request.state.trace_id
+    try:
+        logger.info("Nouvelle requête de génération reçue")
+
+        data = await request.json()
+        recipe_name = data.get('recipeName')
+
+        if not recipe_name:
+            logger.error("Nom de recette manquant dans la requête")
+            return JSONResponse({'error': 'Le nom de la recette est requis'}, status_code=400)
+
+        accept_header = request.headers.get('Accept', '')
+        wants_async = data.get('async') or 'respond-async' in request.headers.get('Prefer', '')
+
+        if not data.get('force'):
+            # Le rafraîchissement de l'index passe par le client Supabase synchrone
+            await asyncio.to_thread(recipe_index.refresh, get_supabase_client())
+            existing_id = recipe_index.lookup(recipe_name)
+            if existing_id is not None:
+                logger.info(f"Recette déjà existante (ID {existing_id}), génération ignorée")
+                existing = {
+                    **generate_step_response(
+                        step=8,
+                        status='completed',
+                        message='Cette recette existe déjà !'
+                    ),
+                    'success': True,
+                    'existing': True,
+                    'recipeId': existing_id
+                }
+                if trace_id:
+                    existing['traceId'] = trace_id
+                if 'application/json' in accept_header or data.get('async'):
+                    return JSONResponse(existing)
+                return sse_response(iter([sse_event(existing)]))
+
+        try:
+            job_id, created = job_manager.submit(
+                {'recipeName': recipe_name, 'traceId': trace_id,
+                 'requestId': request.headers.get('Idempotency-Key') or data.get('requestId')},
+                dedup_key=normalize_recipe_name(recipe_name)
+            )
+        except QueueFullError as e:
+            logger.warning(f"File de génération saturée: {str(e)}")
+            return JSONResponse({'error': str(e), 'details': 'Réessayez dans quelques instants'}, status_code=503)
+
+        if wants_async:
+            logger.info(f"Job {job_id} mis en file (mode asynchrone)")
+            return JSONResponse({
+                'jobId': job_id,
+                'status': JOB_PENDING if created else job_manager.get(job_id)['status'],
+                'coalesced': not created,
+                'statusUrl': f'/jobs/{job_id}',
+                'eventsUrl': f'/jobs/{job_id}/events'
+            }, status_code=202)
+
+        if 'application/json' in accept_header:
+            logger.info("Mode simplifié demandé (JSON)")
+            job = await job_manager.wait(job_id)
+            if job['status'] != JOB_COMPLETED:
+                logger.error(f"Erreur lors de la génération (mode simplifié): {job['error']}")
+                return JSONResponse({
+                    'success': False,
+                    'error': job['error'],
+                    'details': 'Erreur lors de la génération de la recette'
+                }, status_code=500)
+            return JSONResponse({
+                'success': True,
+                'message': 'Recette générée et sauvegardée avec succès !',
+                'recipeId': job['result']['recipeId']
+            })
+
+        return sse_response(stream_job_events(job_id))
+
+    except Exception as e:
+        logger.error(f"Erreur serveur: {str(e)}")
+        logger.exception(e)
+        return JSONResponse({
+            'error': str(e),
+            'details': 'Erreur serveur inattendue'
+        }, status_code=500)
+
+@require_api_key
+async def handle_job_status(request: Request):
+    job = job_manager.get(request.path_params['job_id'])
+    if not job:
+        return JSONResponse({'error': 'Job introuvable'}, status_code=404)
+    return JSONResponse(job_status_payload(job))
+
+@require_api_key
+async def handle_job_events(request: Request):
+    job_id = request.path_params['job_id']
+    if not job_manager.get(job_id):
+        return JSONResponse({'error': 'Job introuvable'}, status_code=404)
+    # Reprise après déconnexion via l'en-tête standard Last-Event-ID
+    try:
+        after = parse_event_cursor(request.headers.get('Last-Event-ID', request.query_params.get('after')))
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    return sse_response(stream_job_events(job_id, after=after))
+
+@require_api_key
+async def handle_shopping_list(request: Request):
+    try:
+        data = await request.json()
+        recipe_ids, servings = parse_shopping_request(data if isinstance(data, dict) else {})
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    try:
+        return JSONResponse(await shopping_list_for_recipes_async(get_async_supabase_client(), recipe_ids, servings))
+    except Exception as e:
+        logger.error(f"Erreur lors du calcul de la liste de courses: {str(e)}")
+        return JSONResponse({'error': str(e), 'details': 'Erreur lors du calcul de la liste de courses'}, status_code=500)
+
+@require_api_key
+async def handle_recipes_map(request: Request):
+    await asyncio.to_thread(geo_index.refresh, get_supabase_client())
+    try:
+        return JSONResponse(map_query(geo_index, request.query_params))
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+
+@require_api_key
+async def handle_recipes_nearest(request: Request):
+    await asyncio.to_thread(geo_index.refresh, get_supabase_client())
+    try:
+        return JSONResponse(nearest_query(geo_index, request.query_params))
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+
+@require_api_key
+async def handle_catalog(request: Request):
+    try:
+        query = parse_catalog_request(request.query_params)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    try:
+        version = await asyncio.to_thread(catalog_version.current, get_supabase_client())
+        # Sans la table catalog_version (migration 16), l'ETag est calculé sur la page
+        body = encode_catalog(await catalog_page_async(get_async_supabase_client(), query)) if version is None else None
+        etag = catalog_etag(version, query) if body is None else content_etag(body)
+        headers = {'ETag': etag, 'Cache-Control': CACHE_CONTROL}
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            return Response(status_code=304, headers=headers)
+        if body is None:
+            body = encode_catalog(await catalog_page_async(get_async_supabase_client(), query))
+        return Response(body, media_type='application/json', headers=headers)
+    except Exception as e:
+        logger.error(f"Erreur lors de la lecture du catalogue: {str(e)}")
+        return JSONResponse({'error': str(e), 'details': 'Erreur lors de la lecture du catalogue'}, status_code=500)
+
+async def handle_image(request: Request):
+    root = os.path.realpath(IMAGE_STORE_DIR)
+    path = os.path.realpath(os.path.join(root, request.path_params['path']))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+        return JSONResponse({'error': 'Image introuvable'}, status_code=404)
+    return FileResponse(path, headers={'Cache-Control': IMMUTABLE_CACHE_CONTROL})
+
+@require_api_key
+async def handle_search(request: Request):
+    await asyncio.to_thread(search_index.refresh, get_supabase_client())
+    try:
+        return JSONResponse(search_query(search_index, request.query_params))
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+
+@require_api_key
+async def handle_cache_stats(request: Request):
+    return JSONResponse(prompt_cache.stats())
+
+@require_api_key
+async def handle_metrics(request: Request):
+    return Response(metrics.registry.render(), headers={'Content-Type': metrics.CONTENT_TYPE})
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    try:
+        await asyncio.to_thread(recipe_index.warm, get_supabase_client())
+        await asyncio.to_thread(geo_index.warm, get_supabase_client())
+        await asyncio.to_thread(search_index.warm, get_supabase_client())
+    except Exception as e:
+        logger.warning(f"Chargement de l'index des recettes impossible: {str(e)}")
+    yield
+
+app = Starlette(
+    routes=[
+        Route('/generate-recipe', handle_generate_recipe, methods=['POST']),
+        Route('/jobs/{job_id}', handle_job_status, methods=['GET']),
+        Route('/jobs/{job_id}/events', handle_job_events, methods=['GET']),
+        Route('/shopping-list', handle_shopping_list, methods=['POST']),
+        Route('/recipes/map', handle_recipes_map, methods=['GET']),
+        Route('/recipes/nearest', handle_recipes_nearest, methods=['GET']),
+        Route('/recipes', handle_catalog, methods=['GET']),
+        Route('/images/{path:path}', handle_image, methods=['GET']),
+        Route('/search', handle_search, methods=['GET']),
+        Route('/cache/stats', handle_cache_stats, methods=['GET']),
+        Route('/metrics', handle_metrics, methods=['GET']),
+    ],
+    middleware=[
+        Middleware(RequestMetricsMiddleware),
+        Middleware(
+            CORSMiddleware,
+            allow_origins=ALLOWED_ORIGINS,
+            allow_methods=['GET', 'POST', 'OPTIONS'],
+            allow_headers=['Content-Type', 'Authorization', 'X-API-Key', 'Idempotency-Key', 'If-None-Match'],
+            expose_headers=['ETag']
+        ),
+    ],
+    lifespan=lifespan
+)
+# Libellé `endpoint` des métriques : le motif de la route, comme url_rule côté Flask
+ROUTE_PATHS = {route.endpoint: route.path for route in app.routes}
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=int(os.getenv('PORT', 5000)))
@@ -0,0 +1,201 @@
+"""
+Listes de courses agrégées côté serveur.
+
+Les ingrédients des recettes choisies sont lus en une requête (avec les
+portions de chaque recette, par jointure), rangés en colonnes compactes puis
+additionnés en une passe, mis à l'échelle du nombre de portions demandé. Les
+quantités sont déjà canoniques en base (voir ingredient_units) ; les lignes
+écrites avant la migration 12 sont converties à la lecture.
+"""
+import functools
+import math
+from array import array
+from typing import Dict, List, Tuple
+
+from ingredient_units import canonical_ingredient, display_name, display_quantity, split_ingredient
+
+DEFAULT_SERVINGS = 4
+MAX_RECIPES = 50
+MAX_SERVINGS = 100
+
+INGREDIENT_SELECT = 'recipe_id,name,quantity,unit,quantity_value,canonical_unit,name_key,recipes(servings)'
+
+OTHER_CATEGORY = 'Autres'
+# Rayon -> mots-clés (clés d'ingrédient : sans accents, au singulier), dans l'ordre d'affichage
+CATEGORIES = (
+    ('Fruits et légumes', {
+        'ail', 'oignon', 'echalote', 'tomate', 'carotte', 'poivron', 'courgette', 'aubergine', 'pomme',
+        'citron', 'orange', 'banane', 'mangue', 'ananas', 'fraise', 'framboise', 'salade', 'laitue',
+        'epinard', 'chou', 'brocoli', 'champignon', 'haricot', 'pois', 'poireau', 'celeri',
+        'concombre', 'avocat', 'gingembre', 'piment', 'persil', 'coriandre', 'basilic', 'menthe',
+        'ciboulette', 'romarin', 'thym', 'laurier', 'patate', 'navet', 'potiron', 'courge', 'radis',
+        'fenouil', 'artichaut', 'asperge', 'mais', 'datte', 'abricot', 'pruneau', 'raisin', 'olive',
+        'citronnelle', 'lime', 'gombo', 'manioc', 'igname', 'plantain', 'aneth', 'estragon', 'cebette',
+    }),
+    ('Viandes et poissons', {
+        'poulet', 'boeuf', 'veau', 'porc', 'agneau', 'mouton', 'canard', 'dinde', 'lapin', 'jambon',
+        'lardon', 'bacon', 'saucisse', 'chorizo', 'merguez', 'viande', 'steak', 'escalope', 'cuisse',
+        'blanc', 'poitrine', 'os', 'poisson', 'saumon', 'thon', 'cabillaud', 'crevette', 'moule',
+        'calamar', 'seiche', 'poulpe', 'sardine', 'anchois', 'lotte', 'dorade', 'bar', 'gambas',
+        'langoustine', 'homard', 'crabe', 'palourde', 'chair', 'filet',
+    }),
+    ('Crèmerie', {
+        'oeuf', 'lait', 'beurre', 'creme', 'yaourt', 'fromage', 'mascarpone', 'mozzarella', 'parmesan',
+        'ricotta', 'feta', 'gruyere', 'emmental', 'comte', 'chevre', 'pecorino', 'gorgonzola', 'ghee',
+    }),
+    ('Boulangerie', {'pain', 'baguette', 'brioche', 'tortilla', 'pita', 'naan', 'chapelure'}),
+    ('Épices et condiments', {
+        'sel', 'poivre', 'paprika', 'safran', 'cumin', 'curry', 'curcuma', 'cannelle', 'muscade',
+        'girofle', 'cardamome', 'badiane', 'harissa', 'moutarde', 'vinaigre', 'sauce',
+        'huile', 'ketchup', 'mayonnaise', 'mirin', 'sake', 'miso', 'wasabi', 'sesame', 'epice',
+        'ras', 'herbe', 'origan', 'vanille', 'zaatar', 'sumac', 'pimenton', 'nuoc', 'tahini', 'sirop',
+    }),
+    ('Épicerie', {
+        'farine', 'sucre', 'riz', 'pate', 'spaghetti', 'nouille', 'semoule', 'couscous', 'boulgour',
+        'quinoa', 'lentille', 'chiche', 'bouillon', 'cube', 'levure',
+        'cacao', 'chocolat', 'biscuit', 'miel', 'amande', 'noisette', 'noix', 'pistache', 'cacahuete',
+        'concentre', 'coulis', 'coco', 'fecule', 'maizena', 'gelatine',
+        'confiture', 'polenta', 'tapioca', 'vermicelle', 'galette',
+    }),
+    ('Boissons', {'eau', 'vin', 'biere', 'cafe', 'the', 'jus', 'rhum', 'cognac', 'marsala', 'porto', 'cidre'}),
+)
+CATEGORY_ORDER = {name: i for i, (name, _) in enumerate(CATEGORIES)}
+CATEGORY_ORDER[OTHER_CATEGORY] = len(CATEGORIES)
+
+
+@functools.lru_cache(maxsize=4096)
+def ingredient_category(name_key: str) -> str:
+    """Rayon d'un ingrédient : le premier mot reconnu décide (« bouillon de poulet » -> Épicerie)."""
+    for word in name_key.split():
+        for name, keywords in CATEGORIES:
+            if word in keywords:
+                return name
+    return OTHER_CATEGORY
+
+
+class IngredientColumns:
+    """
+    Ingrédients de plusieurs recettes rangés en colonnes : pour chaque ligne,
+    l'index de la recette, le code de l'article (nom + unité canonique) et la
+    quantité canonique (NaN quand elle n'est pas chiffrée).
+    """
+
+    def __init__(self):
+        self.recipe_ids: List[int] = []
+        self.servings = array('d')
+        self.recipe = array('l')
+        self.item = array('l')
+        self.value = array('d')
+        # Par code d'article : (clé du nom, unité canonique), nom affiché, quantité brute
+        self.items: List[Tuple[str, str]] = []
+        self.labels: List[str] = []
+        self.texts: List[str] = []
+        self._recipe_index: Dict[int, int] = {}
+        self._codes: Dict[Tuple[str, str], int] = {}
+
+    def __len__(self) -> int:
+        return len(self.value)
+
+    def add(self, row: dict) -> None:
+        recipe_index = self._recipe_index.get(row['recipe_id'])
+        if recipe_index is None:
+            recipe_index = self._recipe_index[row['recipe_id']] = len(self.recipe_ids)
+            self.recipe_ids.append(row['recipe_id'])
+            servings = (row.get('recipes') or {}).get('servings')
+            self.servings.append(servings if servings and servings > 0 else DEFAULT_SERVINGS)
+        if row.get('name_key') is None:
+            # Ligne antérieure aux colonnes canoniques
+            row = {**row, **canonical_ingredient(row)}
+        key = (row['name_key'], row.get('canonical_unit') or '')
+        code = self._codes.get(key)
+        if code is None:
+            code = self._codes[key] = len(self.items)
+            self.items.append(key)
+            self.labels.append(display_name(split_ingredient(row)[1]))
+            self.texts.append(f"{row.get('quantity') or ''} {row.get('unit') or ''}".strip())
+        self.recipe.append(recipe_index)
+        self.item.append(code)
+        self.value.append(math.nan if row.get('quantity_value') is None else float(row['quantity_value']))
+
+    @classmethod
+    def from_rows(cls, rows: List[dict]) -> 'IngredientColumns':
+        columns = cls()
+        for row in rows:
+            columns.add(row)
+        return columns
+
+
+def aggregate(columns: IngredientColumns, servings: int) -> Tuple[array, bytearray]:
+    """Total de chaque article pour `servings` portions, en une passe sur les colonnes."""
+    factors = [servings / recipe_servings for recipe_servings in columns.servings]
+    totals = array('d', bytes(8 * len(columns.items)))
+    quantified = bytearray(len(columns.items))
+    for recipe, item, value in zip(columns.recipe, columns.item, columns.value):
+        if value == value:
+            totals[item] += value * factors[recipe]
+            quantified[item] = 1
+    return totals, quantified
+
+
+def build_shopping_list(columns: IngredientColumns, servings: int) -> dict:
+    """Liste au format attendu par l'application : articles groupés par rayon."""
+    totals, quantified = aggregate(columns, servings)
+    groups: Dict[str, List[dict]] = {}
+    # Ordre alphabétique des clés, sans accents ni ligatures
+    for code, (name_key, unit) in sorted(enumerate(columns.items), key=lambda entry: entry[1]):
+        if quantified[code]:
+            quantity, unit_label = display_quantity(totals[code], unit)
+        else:
+            quantity, unit_label = columns.texts[code], ''
+        category = ingredient_category(name_key)
+        groups.setdefault(category, []).append({
+            'name': columns.labels[code],
+            'quantity': quantity,
+            'unit': unit_label,
+            'category': category
+        })
+    return {
+        'ingredients': [
+            {'category': category, 'items': items}
+            for category, items in sorted(groups.items(), key=lambda group: CATEGORY_ORDER[group[0]])
+        ],
+        'total_recipes': len(columns.recipe_ids),
+        'servings': servings,
+        'recipe_ids': columns.recipe_ids
+    }
+
+
+def parse_shopping_request(data: dict) -> Tuple[List[int], int]:
+    """recipe_ids et servings du corps de la requête ; ValueError si invalides."""
+    recipe_ids = data.get('recipe_ids')
+    if not isinstance(recipe_ids, list) or not recipe_ids:
+        raise ValueError("recipe_ids doit être une liste non vide")
+    if len(recipe_ids) > MAX_RECIPES:
+        raise ValueError(f"Au plus {MAX_RECIPES} recettes par liste")
+    try:
+        recipe_ids = list(dict.fromkeys(int(recipe_id) for recipe_id in recipe_ids))
+        servings = int(data['servings']) if data.get('servings') is not None else DEFAULT_SERVINGS
+    except (TypeError, ValueError):
+        raise ValueError("recipe_ids et servings doivent être des entiers")
+    if not 0 < servings <= MAX_SERVINGS:
+        raise ValueError(f"servings doit être compris entre 1 et {MAX_SERVINGS}")
+    return recipe_ids, servings
+
+
+def _shopping_list(rows: List[dict], recipe_ids: List[int], servings: int) -> dict:
+    columns = IngredientColumns.from_rows(rows)
+    shopping_list = build_shopping_list(columns, servings)
+    found = set(columns.recipe_ids)
+    shopping_list['missing_recipe_ids'] = [recipe_id for recipe_id in recipe_ids if recipe_id not in found]
+    return shopping_list
+
+
+def shopping_list_for_recipes(client, recipe_ids: List[int], servings: int) -> dict:
+    """Une seule requête : les ingrédients des recettes et, par jointure, leurs portions."""
+    response = client.table('ingredients').select(INGREDIENT_SELECT).in_('recipe_id', recipe_ids).execute()
+    return _shopping_list(response.data or [], recipe_ids, servings)
+
+
+async def shopping_list_for_recipes_async(client, recipe_ids: List[int], servings: int) -> dict:
+    response = await client.table('ingredients').select(INGREDIENT_SELECT).in_('recipe_id', recipe_ids).execute()
+    return _shopping_list(response.data or [], recipe_ids, servings)
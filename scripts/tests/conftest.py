@@ -0,0 +1,16 @@
+"""
+Les modules de scripts/ s'importent à plat (comme depuis recipe_server.py) ;
+les tests tournent sans réseau : cache de prompts en mémoire, pas de clé API.
+
+    cd scripts && python -m pytest -q tests
+"""
+import os
+import sys
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS_DIR)
+
+# Lus à l'import de generate_recipe : pas de fichier SQLite ni d'étape images
+os.environ['PROMPT_CACHE_PATH'] = ''
+os.environ['IMAGE_PIPELINE'] = '0'
+os.environ.setdefault('OPENAI_API_KEY', 'sk-test')
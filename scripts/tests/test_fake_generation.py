@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+import recipe_persistence
+from batch_backend import generate_recipes_batch
+from fake_llm import FakeBatchClient, FakeLLMBackend
+from fake_supabase import InMemorySupabaseClient
+from generate_recipe import generate_recipe, generate_recipe_async, validate_recipe_data
+from llm_backends import set_llm_backend
+from recipe_persistence import save_recipe_graph
+
+
+@pytest.fixture
+def fake_backend():
+    backend = FakeLLMBackend(latency=0, latency_sigma=0, chunk_delay=0, seed=1)
+    set_llm_backend(backend)
+    yield backend
+    set_llm_backend(None)
+
+
+@pytest.fixture(autouse=True)
+def rpc_available(monkeypatch):
+    monkeypatch.setattr(recipe_persistence, '_rpc_available', True)
+
+
+def test_generation_with_the_fake_backend_is_saved(fake_backend):
+    events = []
+    recipe_data = generate_recipe('Tiramisu', on_event=events.append, mode='prompts')
+    client = InMemorySupabaseClient()
+
+    recipe_id = save_recipe_graph(client, recipe_data)
+
+    assert validate_recipe_data(recipe_data)
+    assert fake_backend.calls > 0
+    assert {event['type'] for event in events} >= {'stage_started', 'stage_completed'}
+    assert client.tables['recipes'][0]['id'] == recipe_id
+    assert client.tables['recipes'][0]['title'] == recipe_data['recipe']['title']
+    assert len(client.tables['ingredients']) == len(recipe_data['ingredients'])
+    assert len(client.tables['steps']) == len(recipe_data['steps'])
+
+
+def test_async_generation_with_the_fake_backend(fake_backend):
+    events = []
+    recipe_data = asyncio.run(generate_recipe_async('Tiramisu', on_event=events.append, mode='prompts'))
+
+    assert validate_recipe_data(recipe_data)
+    assert recipe_data['ingredients'] and recipe_data['steps']
+    assert any(event['type'] == 'stage_completed' for event in events)
+
+
+def test_structured_generation_with_the_fake_backend(fake_backend):
+    assert validate_recipe_data(generate_recipe('Tiramisu', mode='structured'))
+
+
+def test_batch_generation_with_the_fake_batch_client(tmp_path):
+    results = generate_recipes_batch(['Paella', 'Ramen'], client=FakeBatchClient(),
+                                     work_dir=str(tmp_path), poll_interval=0)
+
+    assert set(results) == {'Paella', 'Ramen'}
+    assert all(validate_recipe_data(recipe_data) for recipe_data in results.values())
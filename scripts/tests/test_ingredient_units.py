@@ -0,0 +1,45 @@
+import pytest
+
+from ingredient_units import canonical_ingredient, display_name, display_quantity, ingredient_name_key, parse_quantity
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('1/2', (0.5, '')), ('1,5', (1.5, '')), ('½', (0.5, '')), ('1 1/2', (1.5, '')),
+    ('2-3', (3.0, '')), ('200g', (200.0, 'g')), ('30 cl', (30.0, 'cl')), ('deux', (2.0, '')),
+    ('quelques', (None, 'quelques')), (None, (None, '')),
+])
+def test_parse_quantity(text, expected):
+    assert parse_quantity(text) == expected
+
+
+@pytest.mark.parametrize('ingredient, expected', [
+    ({'name': 'farine', 'quantity': '250', 'unit': 'g'}, (250.0, 'g', 'farine')),
+    ({'name': 'lait', 'quantity': '30', 'unit': 'cl'}, (300.0, 'ml', 'lait')),
+    ({'name': 'huile', 'quantity': '2', 'unit': 'cuillères à soupe'}, (30.0, 'ml', 'huile')),
+    ({'name': "d'ail", 'quantity': '3', 'unit': 'gousses'}, (3.0, 'gousse', 'ail')),
+    ({'name': 'Oignons verts', 'quantity': '2 kg', 'unit': ''}, (2000.0, 'g', 'oignon vert')),
+    ({'name': 'sel', 'quantity': '', 'unit': 'au goût'}, (None, '', 'sel')),
+])
+def test_canonical_ingredient(ingredient, expected):
+    canonical = canonical_ingredient(ingredient)
+
+    assert (canonical['quantity_value'], canonical['canonical_unit'], canonical['name_key']) == expected
+
+
+def test_unknown_unit_goes_back_to_the_name_and_counts_pieces():
+    assert canonical_ingredient({'name': 'oignon émincé', 'quantity': '1', 'unit': 'gros'}) == \
+        {'quantity_value': 1.0, 'canonical_unit': '', 'name_key': 'gro oignon emince'}
+
+
+def test_name_keys_ignore_accents_articles_and_plurals():
+    assert ingredient_name_key('Des Échalotes') == ingredient_name_key('échalote') == 'echalote'
+    assert display_name("d'ail") == 'Ail'
+
+
+@pytest.mark.parametrize('value, unit, expected', [
+    (1500, 'g', ('1,5', 'kg')), (249.2, 'g', ('250', 'g')), (10, 'ml', ('2', 'c. à café')),
+    (30, 'ml', ('2', 'c. à soupe')), (250, 'ml', ('250', 'ml')), (2500, 'ml', ('2,5', 'l')),
+    (1.3, '', ('2', '')), (3, 'gousse', ('3', 'gousses')), (2, 'morceau', ('2', 'morceaux')),
+])
+def test_display_quantity_picks_a_readable_unit(value, unit, expected):
+    assert display_quantity(value, unit) == expected
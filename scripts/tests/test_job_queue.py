@@ -0,0 +1,175 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import job_queue
+from job_queue import (JOB_COMPLETED, JOB_FAILED, JOB_PENDING, JOB_RUNNING, MAX_ATTEMPTS, RETRYING_EVENT,
+                       InMemoryJobBackend, JobManager, QueueFullError, SQLiteJobBackend)
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return SQLiteJobBackend(str(tmp_path / 'jobs.sqlite3'), poll_interval=0.01, lease_duration=0.2)
+
+
+def test_enqueue_and_claim_in_creation_order(backend):
+    backend.enqueue('first', {'recipe_name': 'Paella'})
+    backend.enqueue('second', {'recipe_name': 'Ramen'})
+
+    claimed = backend.claim(timeout=0)
+
+    assert (claimed['id'], claimed['status'], claimed['payload']) == ('first', JOB_RUNNING, {'recipe_name': 'Paella'})
+    assert backend.get('first')['status'] == JOB_RUNNING
+    assert backend.pending_count() == 1
+    assert backend.claim(timeout=0)['id'] == 'second'
+    assert backend.claim(timeout=0) is None
+
+
+def test_enqueue_attaches_to_the_active_job_of_the_same_key(backend):
+    assert backend.enqueue('first', {}, dedup_key='paella') == ('first', True)
+    assert backend.enqueue('second', {}, dedup_key='paella') == ('first', False)
+    backend.claim(timeout=0)
+    assert backend.enqueue('third', {}, dedup_key='paella') == ('first', False)
+
+    backend.set_status('first', JOB_COMPLETED, result={'recipe_id': 1})
+
+    assert backend.enqueue('fourth', {}, dedup_key='paella') == ('fourth', True)
+
+
+def test_events_replay_after_a_cursor(backend):
+    backend.enqueue('job', {})
+    for stage in ('origin', 'character', 'story'):
+        backend.append_event('job', {'stage': stage})
+    backend.set_status('job', JOB_COMPLETED, result={'recipe_id': 7})
+
+    events, status = backend.events_since('job', after=1, timeout=0)
+
+    assert [(seq, event['stage']) for seq, event in events] == [(2, 'character'), (3, 'story')]
+    assert status == JOB_COMPLETED
+    assert backend.get('job')['result'] == {'recipe_id': 7}
+
+
+def test_events_since_waits_for_the_next_event(backend):
+    backend.enqueue('job', {})
+    threading.Timer(0.05, backend.append_event, args=('job', {'stage': 'origin'})).start()
+
+    events, status = backend.events_since('job', after=0, timeout=2)
+
+    assert events == [(1, {'stage': 'origin'})]
+    assert status == JOB_PENDING
+
+
+def test_expired_lease_is_reclaimed_and_no_longer_deduplicated(backend):
+    backend.enqueue('crashed', {}, dedup_key='paella')
+    backend.claim(timeout=0)
+    time.sleep(0.25)
+
+    assert backend.enqueue('retry', {}, dedup_key='paella') == ('retry', True)
+    assert backend.claim(timeout=0)['id'] == 'crashed'
+
+
+def test_reclaimed_job_marks_the_new_attempt_in_its_events(backend):
+    backend.enqueue('crashed', {})
+    backend.claim(timeout=0)
+    backend.append_event('crashed', {'stage': 'origin'})
+    time.sleep(0.25)
+
+    backend.claim(timeout=0)
+    backend.append_event('crashed', {'stage': 'origin'})
+    events, _ = backend.events_since('crashed', after=0, timeout=0)
+
+    assert [event.get('type') for _, event in events] == [None, RETRYING_EVENT, None]
+    assert events[1][1]['attempt'] == 2
+
+
+def test_heartbeat_keeps_the_lease(backend):
+    backend.enqueue('job', {}, dedup_key='paella')
+    backend.claim(timeout=0)
+    for _ in range(3):
+        time.sleep(0.1)
+        backend.heartbeat('job')
+
+    assert backend.enqueue('other', {}, dedup_key='paella') == ('job', False)
+
+
+def test_job_fails_after_max_attempts(backend):
+    backend.enqueue('job', {})
+    for _ in range(MAX_ATTEMPTS):
+        assert backend.claim(timeout=0)['id'] == 'job'
+        time.sleep(0.25)
+
+    assert backend.claim(timeout=0) is None
+    assert backend.get('job')['status'] == JOB_FAILED
+
+
+def test_finished_jobs_and_events_are_pruned(tmp_path):
+    backend = SQLiteJobBackend(str(tmp_path / 'jobs.sqlite3'), retention=0.05)
+    backend.enqueue('old', {})
+    backend.append_event('old', {'type': 'delta'})
+    backend.set_status('old', JOB_COMPLETED)
+    time.sleep(0.1)
+
+    backend.enqueue('new', {})
+
+    assert backend.get('old') is None
+    assert backend.events_since('old', after=0, timeout=0) == ([], JOB_FAILED)
+
+
+def test_in_memory_backend_forgets_finished_jobs():
+    backend = InMemoryJobBackend(retention=0.05)
+    backend.enqueue('old', {})
+    backend.set_status('old', JOB_COMPLETED)
+    time.sleep(0.1)
+
+    backend.enqueue('new', {})
+
+    assert backend.get('old') is None
+
+
+def test_manager_runs_jobs_and_publishes_events(backend):
+    def handler(job, emit):
+        emit({'stage': 'origin'})
+        return {'recipe': job['payload']['recipe_name']}
+
+    manager = JobManager(backend, handler, max_workers=1)
+    job_id, created = manager.submit({'recipe_name': 'Paella'}, dedup_key='paella')
+
+    final = manager.wait(job_id, poll_timeout=0.05)
+
+    assert created
+    assert (final['status'], final['result']) == (JOB_COMPLETED, {'recipe': 'Paella'})
+    assert list(manager.events(job_id, poll_timeout=0.05)) == [(1, {'stage': 'origin'})]
+
+
+def test_manager_attaches_before_applying_the_queue_limit(backend):
+    manager = JobManager(backend, lambda job, emit: None, max_workers=0, max_pending=1)
+    job_id, _ = manager.submit({}, dedup_key='paella')
+
+    assert manager.submit({}, dedup_key='paella') == (job_id, False)
+    with pytest.raises(QueueFullError):
+        manager.submit({}, dedup_key='ramen')
+
+
+class FlakyBackend(SQLiteJobBackend):
+    """File dont les premiers accès échouent, comme une base SQLite verrouillée."""
+
+    def __init__(self, path, failures):
+        super().__init__(path, poll_interval=0.01)
+        self.failures = failures
+
+    def claim(self, timeout):
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError('database is locked')
+        return super().claim(timeout)
+
+
+def test_worker_survives_queue_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, 'WORKER_MAX_BACKOFF', 0.01)
+    manager = JobManager(FlakyBackend(str(tmp_path / 'jobs.sqlite3'), failures=2), lambda job, emit: 'ok',
+                         max_workers=1)
+    job_id, _ = manager.submit({})
+
+    assert manager.wait(job_id, poll_timeout=0.05)['status'] == JOB_COMPLETED
@@ -0,0 +1,67 @@
+import time
+
+from prompt_cache import PromptCache, prompt_cache_key
+
+
+def test_key_changes_with_any_input():
+    base = prompt_cache_key('gpt', 'system', 'Paella', 0.7)
+
+    assert base == prompt_cache_key('gpt', 'system', 'Paella', 0.7)
+    assert len({base, prompt_cache_key('fake', 'system', 'Paella', 0.7),
+                prompt_cache_key('gpt', 'system', 'Ramen', 0.7),
+                prompt_cache_key('gpt', 'system', 'Paella', 0.2)}) == 4
+
+
+def test_only_prompt_types_with_a_ttl_are_cached():
+    cache = PromptCache(ttls={'origin': 60})
+    cache.set('k', 'story', {'text': 'une histoire'})
+
+    assert cache.get('k', 'story') is None
+    assert not cache.is_cacheable(None)
+
+
+def test_entries_expire_after_their_ttl():
+    cache = PromptCache(ttls={'origin': 0.05})
+    cache.set('k', 'origin', {'text': 'Pays: Italie'})
+
+    assert cache.get('k', 'origin') == {'text': 'Pays: Italie'}
+    time.sleep(0.1)
+    assert cache.get('k', 'origin') is None
+    assert cache.stats()['origin'] == {'memory_hits': 1, 'disk_hits': 0, 'misses': 1, 'evictions': 0}
+
+
+def test_memory_tier_evicts_the_least_recently_used():
+    cache = PromptCache(max_entries=2, ttls={'origin': 60})
+    cache.set('a', 'origin', {'text': 'a'})
+    cache.set('b', 'origin', {'text': 'b'})
+    cache.get('a', 'origin')
+    cache.set('c', 'origin', {'text': 'c'})
+
+    assert cache.get('b', 'origin') is None
+    assert cache.get('a', 'origin') == {'text': 'a'}
+    assert cache.stats()['origin']['evictions'] == 1
+
+
+def test_disk_tier_is_created_on_first_use_and_shared(tmp_path):
+    path = tmp_path / 'cache' / 'prompts.sqlite3'
+    writer = PromptCache(path=str(path), ttls={'origin': 60})
+    assert not path.exists()
+
+    writer.set('k', 'origin', {'text': 'Pays: Japon'})
+    reader = PromptCache(path=str(path), ttls={'origin': 60})
+
+    assert path.exists()
+    assert reader.get('k', 'origin') == {'text': 'Pays: Japon'}
+    assert reader.stats()['origin']['disk_hits'] == 1
+
+
+def test_disk_tier_keeps_at_most_max_disk_entries(tmp_path):
+    cache = PromptCache(path=str(tmp_path / 'prompts.sqlite3'), max_entries=1, max_disk_entries=2,
+                        ttls={'origin': 60})
+    for key in ('a', 'b', 'c'):
+        cache.set(key, 'origin', {'text': key})
+        time.sleep(0.01)
+
+    fresh = PromptCache(path=str(tmp_path / 'prompts.sqlite3'), ttls={'origin': 60})
+    assert fresh.get('a', 'origin') is None
+    assert fresh.get('c', 'origin') == {'text': 'c'}
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from prompt_scheduler import PromptTask, check_dag, dag_waves, run_dag, run_dag_async
+
+
+def task(name, *inputs, run=None):
+    return PromptTask(name, inputs, run or (lambda values, name=name: name))
+
+
+def graph(*tasks):
+    return {t.name: t for t in tasks}
+
+
+def test_check_dag_rejects_unknown_dependencies_and_cycles():
+    with pytest.raises(ValueError, match='inconnue'):
+        check_dag(graph(task('story', 'character')))
+    with pytest.raises(ValueError, match='Cycle'):
+        check_dag(graph(task('origin', 'story'), task('character', 'origin'), task('story', 'character')))
+
+
+def test_waves_follow_the_dependencies():
+    tasks = graph(task('origin'), task('general', 'origin'), task('ingredients', 'general'),
+                  task('character', 'origin'), task('story', 'character', 'general'))
+
+    assert dag_waves(tasks) == [['origin'], ['general', 'character'], ['ingredients', 'story']]
+
+
+def test_tasks_receive_only_their_inputs_and_run_in_parallel():
+    barrier = threading.Barrier(2, timeout=2)
+
+    def parallel(values, name):
+        barrier.wait()
+        return (name, sorted(values))
+
+    results = run_dag(graph(task('origin'),
+                            task('wine', 'origin', run=lambda values: parallel(values, 'wine')),
+                            task('playlist', 'origin', run=lambda values: parallel(values, 'playlist'))))
+
+    assert results == {'origin': 'origin', 'wine': ('wine', ['origin']), 'playlist': ('playlist', ['origin'])}
+
+
+def test_a_failure_is_raised_and_stops_dependent_tasks():
+    started = []
+
+    def failing(values):
+        raise RuntimeError('quota')
+
+    def dependent(values):
+        started.append('story')
+
+    with pytest.raises(RuntimeError, match='quota'):
+        run_dag(graph(task('character', run=failing), task('story', 'character', run=dependent)))
+    assert started == []
+
+
+def test_async_failure_lets_running_prompts_finish():
+    finished = []
+
+    async def failing(values):
+        raise RuntimeError('quota')
+
+    async def slow(values):
+        await asyncio.sleep(0.05)
+        finished.append('wine')
+
+    async def dependent(values):
+        finished.append('story')
+
+    with pytest.raises(RuntimeError, match='quota'):
+        asyncio.run(run_dag_async(graph(task('character', run=failing), task('wine', run=slow),
+                                        task('story', 'character', run=dependent))))
+    assert finished == ['wine']
+
+
+def test_async_tasks_overlap():
+    async def sleeper(values):
+        await asyncio.sleep(0.1)
+
+    started_at = time.perf_counter()
+    asyncio.run(run_dag_async(graph(*(task(name, run=sleeper) for name in ('a', 'b', 'c')))))
+
+    assert time.perf_counter() - started_at < 0.25
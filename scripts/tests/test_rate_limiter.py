@@ -0,0 +1,134 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+import rate_limiter
+from rate_limiter import LocalBudgetState, RateGovernor, SQLiteBudgetState, is_fatal_error, retry_after_seconds
+
+
+def rate_limit_error(headers=None, code=None):
+    response = httpx.Response(429, headers=headers or {},
+                              request=httpx.Request('POST', 'https://api.openai.com/v1/chat/completions'))
+    return openai.RateLimitError('Rate limit reached', response=response, body={'code': code} if code else None)
+
+
+class FakeClock:
+    """Horloge du module rate_limiter : sleep() avance le temps sans attendre."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.slept.append(delay)
+        self.now += delay
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def sleeps(clock):
+    return clock.slept
+
+
+def test_retry_after_prefers_milliseconds():
+    assert retry_after_seconds(rate_limit_error({'retry-after-ms': '1500', 'retry-after': '9'})) == 1.5
+    assert retry_after_seconds(rate_limit_error({'retry-after': '2'})) == 2.0
+    assert retry_after_seconds(rate_limit_error({'retry-after': 'Wed, 21 Oct 2026 07:28:00 GMT'})) is None
+    assert retry_after_seconds(ValueError()) is None
+
+
+def test_backoff_is_capped_full_jitter_unless_the_server_hints():
+    governor = RateGovernor(rpm=60, tpm=1000, base_delay=1.0, max_delay=8.0)
+
+    assert all(0 <= governor.backoff_delay(attempt, rate_limit_error()) <= min(8.0, 2 ** attempt)
+               for attempt in range(6) for _ in range(20))
+    assert governor.backoff_delay(0, rate_limit_error({'retry-after': '30'})) == 8.0
+    assert governor.backoff_delay(3, rate_limit_error({'retry-after': '0.5'})) == 0.5
+
+
+def test_call_retries_transient_errors_and_blocks_the_budget(clock, sleeps):
+    governor = RateGovernor(rpm=600, tpm=100000, max_retries=3)
+    errors = [rate_limit_error({'retry-after': '2'}), rate_limit_error({'retry-after': '1'})]
+
+    def flaky():
+        if errors:
+            raise errors.pop(0)
+        return 'ok'
+
+    assert governor.call(flaky, estimated_tokens=10) == ('ok', 2)
+    assert sleeps == [2.0, 1.0]
+
+
+def test_rate_limit_suspends_the_other_calls(clock):
+    governor = RateGovernor(rpm=600, tpm=100000)
+    governor.state.block_until(clock.time() + 3)
+
+    assert governor.state.try_acquire(10) == pytest.approx(3)
+    governor.acquire(10)
+    assert clock.now == pytest.approx(1003)
+
+
+def test_call_gives_up_after_max_retries(sleeps):
+    governor = RateGovernor(rpm=600, tpm=100000, max_retries=2, base_delay=0.01)
+
+    def always_failing():
+        raise openai.APIConnectionError(request=httpx.Request('POST', 'https://api.openai.com'))
+
+    with pytest.raises(openai.APIConnectionError):
+        governor.call(always_failing, estimated_tokens=10)
+    assert len(sleeps) == 2
+
+
+def test_exhausted_quota_is_not_retried(sleeps):
+    governor = RateGovernor(rpm=600, tpm=100000)
+    error = rate_limit_error(code='insufficient_quota')
+
+    def no_credit():
+        raise error
+
+    assert is_fatal_error(error) and not is_fatal_error(rate_limit_error())
+    with pytest.raises(openai.RateLimitError):
+        governor.call(no_credit, estimated_tokens=10)
+    assert sleeps == []
+
+
+def test_async_call_retries_without_blocking_the_loop(monkeypatch):
+    governor = RateGovernor(rpm=600, tpm=100000, max_retries=2)
+    slept = []
+
+    async def fake_sleep(delay):
+        slept.append(delay)
+
+    monkeypatch.setattr(rate_limiter.asyncio, 'sleep', fake_sleep)
+    errors = [rate_limit_error({'retry-after-ms': '250'})]
+
+    async def flaky():
+        if errors:
+            raise errors.pop(0)
+        return 'ok'
+
+    assert asyncio.run(governor.call_async(flaky, estimated_tokens=10)) == ('ok', 1)
+    assert 0.25 in slept
+
+
+@pytest.mark.parametrize('make_state', [lambda tmp_path: LocalBudgetState(rpm=2, tpm=1000),
+                                        lambda tmp_path: SQLiteBudgetState(str(tmp_path / 'budget.sqlite3'), 2, 1000)])
+def test_budget_waits_once_requests_or_tokens_run_out(tmp_path, make_state):
+    state = make_state(tmp_path)
+
+    assert state.try_acquire(400) == 0
+    assert state.try_acquire(400) == 0
+    assert state.try_acquire(100) > 0
+    state.adjust_tokens(-800)
+    assert state.try_acquire(100) > 0  # Plus de requêtes disponibles, même avec des tokens rendus
@@ -0,0 +1,99 @@
+import pytest
+from postgrest.exceptions import APIError
+
+from fake_supabase import InMemorySupabaseClient
+from recipe_catalog import (CatalogVersion, catalog_etag, catalog_page, content_etag, decode_cursor, encode_catalog,
+                            encode_cursor, etag_matches, parse_catalog_request)
+
+
+@pytest.fixture
+def client():
+    client = InMemorySupabaseClient()
+    client.table('recipes').insert([{'title': title, 'country': 'Espagne'}
+                                    for title in ('Paella', 'Fideuà', 'Gazpacho', 'Tortilla', 'Churros')]).execute()
+    # Même created_at pour toutes les lignes, comme dans un lot save_recipe_graphs
+    for row in client.tables['recipes']:
+        row['created_at'] = '2026-01-01T00:00:00+00:00'
+    return client
+
+
+def test_cursor_round_trip_and_invalid_cursors():
+    assert decode_cursor(encode_cursor('2026-01-01T00:00:00+00:00', 42)) == ('2026-01-01T00:00:00+00:00', 42)
+    for cursor in ('', 'pas-un-curseur', encode_cursor('2026', 42)[:-2]):
+        with pytest.raises(ValueError):
+            decode_cursor(cursor)
+
+
+def test_parse_catalog_request_validates_fields_and_limit():
+    query = parse_catalog_request({'fields': 'title, id,title', 'limit': '5'})
+
+    assert (query.fields, query.limit, query.after) == (('title', 'id'), 5, None)
+    for params in ({'fields': 'image_data'}, {'limit': '0'}, {'limit': '101'}, {'limit': 'x'}, {'cursor': '!'}):
+        with pytest.raises(ValueError):
+            parse_catalog_request(params)
+
+
+def test_pages_follow_the_cursor_without_gaps(client):
+    titles, cursor = [], None
+    while True:
+        page = catalog_page(client, parse_catalog_request({'fields': 'title', 'limit': '2', 'cursor': cursor}))
+        titles += [recipe['title'] for recipe in page['recipes']]
+        cursor = page['nextCursor']
+        if cursor is None:
+            break
+
+    assert titles == ['Churros', 'Tortilla', 'Gazpacho', 'Fideuà', 'Paella']
+
+
+def test_etag_matches_lists_weak_tags_and_wildcard():
+    assert etag_matches('"a", W/"b"', '"b"')
+    assert etag_matches('*', '"b"')
+    assert not etag_matches('"a"', '"b"')
+    assert not etag_matches(None, '"b"')
+
+
+def test_etag_depends_on_version_and_query():
+    first, second = parse_catalog_request({}), parse_catalog_request({'limit': '5'})
+
+    assert catalog_etag('1', first) == catalog_etag('1', parse_catalog_request({}))
+    assert len({catalog_etag('1', first), catalog_etag('2', first), catalog_etag('1', second)}) == 3
+
+
+def test_version_changes_on_updates_and_deletes(client):
+    version = CatalogVersion(refresh_interval=60)
+    seen = [version.current(client)]
+
+    client.table('recipes').update({'image_url': 'https://img/paella.jpg'}).eq('id', 1).execute()
+    seen.append(version.current(client))
+    version.bump()
+    seen.append(version.current(client))
+    client.table('recipes').delete().eq('id', 2).execute()
+    version.bump()
+    seen.append(version.current(client))
+
+    # Mise en cache pendant refresh_interval, relue après bump()
+    assert seen[0] == seen[1]
+    assert len({seen[0], seen[2], seen[3]}) == 3
+
+
+class NoCatalogVersionClient(InMemorySupabaseClient):
+    """Base sans la migration 16."""
+
+    def _execute(self, query, sleep=True):
+        if query.table == 'catalog_version':
+            raise APIError({'code': 'PGRST205', 'message': "Could not find the table 'public.catalog_version'"})
+        return super()._execute(query, sleep)
+
+
+def test_without_the_version_table_the_etag_follows_the_page_content():
+    client = NoCatalogVersionClient()
+    client.table('recipes').insert({'title': 'Paella'}).execute()
+    query = parse_catalog_request({'fields': 'title'})
+    version = CatalogVersion()
+
+    assert version.current(client) is None
+    before = content_etag(encode_catalog(catalog_page(client, query)))
+    client.table('recipes').update({'title': 'Paella valenciana'}).eq('id', 1).execute()
+
+    assert content_etag(encode_catalog(catalog_page(client, query))) != before
+    assert version.current(client) is None
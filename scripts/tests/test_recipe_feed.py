@@ -0,0 +1,61 @@
+import pytest
+
+import recipe_feed
+import recipe_persistence
+from fake_supabase import InMemorySupabaseClient
+from recipe_geo_index import RecipeGeoIndex
+from recipe_index import RecipeTitleIndex
+from recipe_persistence import save_recipe_graphs
+from recipe_search import RecipeSearchIndex
+
+
+def recipe_data(title, latitude=None, longitude=None):
+    return {
+        'recipe': {'title': title, 'country': 'Espagne', 'region': 'Valence', 'description': 'Riz safrané',
+                   'latitude': latitude, 'longitude': longitude},
+        'ingredients': [{'name': 'riz', 'quantity': '400', 'unit': 'g'}],
+        'steps': [{'step_number': 1, 'description': 'Cuire'}],
+        'playlist': {'title': 'Flamenco'},
+        'wine_pairing': {'name': 'Rioja'},
+    }
+
+
+@pytest.fixture(autouse=True)
+def small_pages(monkeypatch):
+    monkeypatch.setattr(recipe_feed, 'PAGE_SIZE', 2)
+    monkeypatch.setattr(recipe_persistence, '_batch_rpc_available', True)
+
+
+def test_rows_sharing_created_at_are_not_lost_at_page_boundaries():
+    client = InMemorySupabaseClient()
+    save_recipe_graphs(client, [recipe_data(title) for title in ('Paella', 'Fideuà', 'Arroz negro')])
+    assert len({row['created_at'] for row in client.tables['recipes']}) == 1
+
+    index = RecipeTitleIndex()
+    index.warm(client)
+
+    assert all(index.lookup(title) for title in ('Paella', 'Fideuà', 'Arroz negro'))
+
+
+def test_refresh_only_loads_rows_after_the_cursor():
+    client = InMemorySupabaseClient()
+    save_recipe_graphs(client, [recipe_data(title) for title in ('Paella', 'Fideuà', 'Arroz negro')])
+    index = RecipeSearchIndex()
+    index.warm(client)
+    ids = save_recipe_graphs(client, [recipe_data(title) for title in ('Gazpacho', 'Salmorejo', 'Tortilla')])
+
+    assert index._fetch_since_cursor(client) == 3
+    assert index._fetch_since_cursor(client) == 0
+    assert index._cursor[1] == ids[-1]
+
+
+def test_refresh_is_throttled_unless_forced():
+    client = InMemorySupabaseClient()
+    index = RecipeGeoIndex(refresh_interval=60)
+    index.warm(client)
+    save_recipe_graphs(client, [recipe_data('Paella', 39.47, -0.38)])
+
+    index.refresh(client)
+    assert len(index) == 0
+    index.refresh(client, force=True)
+    assert len(index) == 1
@@ -0,0 +1,102 @@
+import pytest
+from postgrest.exceptions import APIError
+
+from fake_supabase import InMemorySupabaseClient
+from gazetteer import backfill_coordinates
+from recipe_geo_index import CELL_DEGREES, COLUMNS, RecipeGeoIndex, cell_of, map_query, nearest_query, parse_bbox
+
+PLACES = {
+    1: ('Paella', 39.47, -0.38),
+    2: ('Ramen', 35.68, 139.69),
+    3: ('Hāngī', -38.14, 176.25),
+    4: ('Lū pulu', -13.76, -172.1),
+    5: ('Fideuà', 38.97, -0.18),
+}
+
+
+@pytest.fixture
+def index():
+    index = RecipeGeoIndex()
+    for recipe_id, (title, latitude, longitude) in PLACES.items():
+        index.add({'id': recipe_id, 'title': title, 'latitude': latitude, 'longitude': longitude})
+    return index
+
+
+def ids(recipes):
+    return sorted(recipe['id'] for recipe in recipes)
+
+
+def test_cell_of_wraps_longitude_and_clamps_the_north_pole():
+    assert cell_of(0, -180) == cell_of(0, 180)
+    assert cell_of(0, 180 - CELL_DEGREES / 2)[1] == COLUMNS - 1
+    assert cell_of(90, 0)[0] == cell_of(90 - CELL_DEGREES / 2, 0)[0]
+
+
+def test_in_bbox_across_the_antimeridian(index):
+    assert ids(index.in_bbox(-50, 170, 0, -170)) == [3, 4]
+    assert ids(index.in_bbox(30, -10, 45, 5)) == [1, 5]
+    assert len(index.in_bbox(-90, -180, 90, 180, limit=2)) == 2
+
+
+def test_nearest_orders_by_distance(index):
+    found = nearest_query(index, {'lat': '39.5', 'lon': '-0.4', 'limit': '3'})['recipes']
+
+    assert [recipe['id'] for recipe in found] == [1, 5, 2]
+    assert found[0]['distanceKm'] < found[1]['distanceKm'] < found[2]['distanceKm']
+
+
+def test_clusters_group_close_recipes_at_low_zoom(index):
+    result = map_query(index, {'bbox': '-180,-90,180,90', 'zoom': '0'})
+
+    assert sum(cluster['count'] for cluster in result['clusters']) + len(result['recipes']) == len(PLACES)
+    assert map_query(index, {'bbox': '-10,30,5,45', 'zoom': '15', 'limit': '1'})['truncated']
+
+
+def test_parse_bbox_validates_geojson_order():
+    assert parse_bbox('-10,30,5,45') == (30, -10, 45, 5)
+    for text in (None, '1,2,3', '0,50,10,40', '0,0,200,10'):
+        with pytest.raises(ValueError):
+            parse_bbox(text)
+
+
+def test_recipes_moved_or_without_coordinates_leave_their_cell(index):
+    index.add({'id': 1, 'title': 'Paella', 'latitude': 35.7, 'longitude': 139.7})
+    index.add({'id': 5, 'title': 'Fideuà', 'latitude': None, 'longitude': None})
+
+    assert ids(index.in_bbox(30, -10, 45, 5)) == []
+    assert ids(index.in_bbox(30, 130, 40, 145)) == [1, 2]
+    assert len(index) == 4
+
+
+def test_backfilled_coordinates_reach_a_warm_index():
+    client = InMemorySupabaseClient()
+    client.table('recipes').insert([{'title': 'Paella', 'country': 'Espagne', 'region': 'Valence'},
+                                    {'title': 'Ramen', 'country': 'Japon'}]).execute()
+    index = RecipeGeoIndex()
+    index.warm(client)
+    assert len(index) == 0
+
+    assert backfill_coordinates(client) == 2
+    index.refresh(client, force=True)
+
+    assert len(index) == 2
+
+
+class NoUpdatedAtClient(InMemorySupabaseClient):
+    """Base sans la migration 15."""
+
+    def _execute(self, query, sleep=True):
+        if any(name == 'updated_at' for name, _ in query.columns or []):
+            raise APIError({'code': '42703', 'message': 'column recipes.updated_at does not exist'})
+        return super()._execute(query, sleep)
+
+
+def test_index_falls_back_to_created_at_without_updated_at():
+    client = NoUpdatedAtClient()
+    client.table('recipes').insert({'title': 'Paella', 'latitude': 39.47, 'longitude': -0.38}).execute()
+    index = RecipeGeoIndex()
+
+    index.warm(client)
+
+    assert len(index) == 1
+    assert index._cursor[1] == 1
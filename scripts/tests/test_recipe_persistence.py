@@ -0,0 +1,187 @@
+import pytest
+from postgrest.exceptions import APIError
+
+import recipe_persistence
+from fake_supabase import InMemoryQuery, InMemorySupabaseClient
+from recipe_persistence import save_recipe_graph
+
+CHILD_TABLES = ('ingredients', 'steps', 'playlists', 'wine_pairings')
+
+
+class NoRpcClient(InMemorySupabaseClient):
+    """Base sans la fonction save_recipe_graph (migration non appliquée)."""
+
+    def _rpc(self, name, params, sleep=True):
+        raise APIError({'code': 'PGRST202', 'message': f'Could not find the function public.{name}'})
+
+
+class OldSchemaClient(NoRpcClient):
+    """Base où manquent les colonnes de migrations non appliquées, comme le voit PostgREST."""
+
+    def __init__(self, missing_columns):
+        super().__init__()
+        self.missing_columns = missing_columns
+        self.inserted_columns = []
+
+    def table(self, name):
+        client = self
+
+        class OldSchemaQuery(InMemoryQuery):
+            def eq(self, column, value):
+                if column in client.missing_columns:
+                    raise APIError({'code': '42703', 'message': f'column recipes.{column} does not exist'})
+                return super().eq(column, value)
+
+        return OldSchemaQuery(self, name)
+
+    def _insert(self, table, rows):
+        if table == 'recipes':
+            for column in self.missing_columns:
+                if any(column in row for row in rows):
+                    raise APIError({'code': 'PGRST204',
+                                    'message': f"Could not find the '{column}' column of 'recipes' in the schema cache"})
+            self.inserted_columns.append(set(rows[0]))
+        return super()._insert(table, rows)
+
+
+class FailingTableClient(NoRpcClient):
+    """Insertion refusée sur une table, pour simuler une coupure au milieu des écritures."""
+
+    def __init__(self, failing_table):
+        super().__init__()
+        self.failing_table = failing_table
+
+    def _insert(self, table, rows):
+        if table == self.failing_table:
+            raise APIError({'code': '08006', 'message': 'connection failure'})
+        return super()._insert(table, rows)
+
+
+def recipe_data(title='Paella valenciana'):
+    return {
+        'recipe': {
+            'title': title, 'country': 'Espagne', 'region': 'Valence', 'description': 'Riz safrané',
+            'preparation_time': 20, 'cooking_time': 40, 'difficulty': 'moyen', 'servings': 4,
+            'is_premium': False, 'image_url': 'https://source.unsplash.com/featured/?paella',
+            'request_id': 'generation-1',
+        },
+        'ingredients': [
+            {'name': 'riz', 'quantity': '400', 'unit': 'g'},
+            {'name': 'safran', 'quantity': '1', 'unit': 'pincée'},
+        ],
+        'steps': [
+            {'order_number': 1, 'title': 'Sofrito', 'description': 'Faire revenir les légumes.'},
+            {'order_number': 2, 'title': 'Riz', 'description': 'Ajouter le riz et le bouillon.'},
+        ],
+        'playlist': {'title': 'Valencia', 'description': 'Guitares', 'spotify_link': 'spotify:playlist:1'},
+        'wine_pairing': {'name': 'Valencia DO', 'description': 'Blanc sec', 'region': 'Valence'},
+    }
+
+
+@pytest.fixture(autouse=True)
+def rpc_available(monkeypatch):
+    # Le repli sur les insertions groupées est mémorisé au niveau du module
+    monkeypatch.setattr(recipe_persistence, '_rpc_available', True)
+    monkeypatch.setattr(recipe_persistence, '_missing_recipe_columns', set())
+
+
+def row_counts(client):
+    return {table: len(client.tables.get(table, [])) for table in ('recipes',) + CHILD_TABLES}
+
+
+def test_rpc_replay_returns_the_saved_recipe():
+    client = InMemorySupabaseClient()
+    first = save_recipe_graph(client, recipe_data(), request_id='client-key')
+    second = save_recipe_graph(client, recipe_data(), request_id='client-key')
+
+    assert first == second
+    assert row_counts(client) == {'recipes': 1, 'ingredients': 2, 'steps': 2, 'playlists': 1, 'wine_pairings': 1}
+    assert client.tables['recipes'][0]['request_id'] == 'client-key'
+
+
+def test_rpc_saves_canonical_quantities():
+    client = InMemorySupabaseClient()
+    save_recipe_graph(client, recipe_data())
+
+    rice = next(row for row in client.tables['ingredients'] if row['name'] == 'riz')
+    assert (rice['quantity_value'], rice['canonical_unit']) == (400, 'g')
+
+
+def test_missing_rpc_falls_back_to_bulk_inserts_and_stays_idempotent():
+    client = NoRpcClient()
+    first = save_recipe_graph(client, recipe_data())
+
+    assert recipe_persistence._rpc_available is False
+    assert save_recipe_graph(client, recipe_data()) == first
+    assert row_counts(client) == {'recipes': 1, 'ingredients': 2, 'steps': 2, 'playlists': 1, 'wine_pairings': 1}
+
+
+def test_bulk_fallback_rewrites_an_interrupted_save():
+    client = NoRpcClient()
+    # Tentative précédente interrompue avant la dernière table
+    partial = client.table('recipes').insert({'title': 'Paella valenciana', 'request_id': 'generation-1'}).execute()
+    client.table('ingredients').insert({'recipe_id': partial.data[0]['id'], 'name': 'riz'}).execute()
+
+    recipe_id = save_recipe_graph(client, recipe_data())
+
+    assert recipe_id != partial.data[0]['id']
+    assert [row['id'] for row in client.tables['recipes']] == [recipe_id]
+    assert {row['recipe_id'] for table in CHILD_TABLES for row in client.tables[table]} == {recipe_id}
+
+
+def test_bulk_fallback_removes_the_recipe_when_a_child_insert_fails():
+    client = FailingTableClient('wine_pairings')
+
+    with pytest.raises(APIError):
+        save_recipe_graph(client, recipe_data())
+
+    assert row_counts(client) == {'recipes': 0, 'ingredients': 0, 'steps': 0, 'playlists': 0, 'wine_pairings': 0}
+
+
+def test_bulk_fallback_returns_the_concurrent_save_on_unique_violation(monkeypatch):
+    client = NoRpcClient()
+    winner = {}
+
+    def concurrent_save(client_, payload):
+        # Une sauvegarde concurrente insère la recette entre la vérification et l'insertion
+        winner['id'] = client.table('recipes').insert(payload['recipe']).execute().data[0]['id']
+        return None
+
+    monkeypatch.setattr(recipe_persistence, '_existing_recipe_id', concurrent_save)
+
+    assert save_recipe_graph(client, recipe_data()) == winner['id']
+    assert len(client.tables['recipes']) == 1
+
+
+def test_bulk_fallback_only_sends_optional_columns_that_are_set():
+    client = OldSchemaClient(missing_columns=())
+    data = recipe_data()
+    del data['recipe']['request_id']
+
+    save_recipe_graph(client, data)
+
+    assert not client.inserted_columns[0] & set(recipe_persistence.OPTIONAL_RECIPE_COLUMNS)
+
+
+def test_bulk_fallback_drops_columns_the_database_does_not_have():
+    client = OldSchemaClient(missing_columns=('image_hash',))
+    data = recipe_data()
+    data['recipe']['image_hash'] = 'abc123'
+
+    recipe_id = save_recipe_graph(client, data)
+    again = save_recipe_graph(client, data)
+
+    assert recipe_id == again
+    assert row_counts(client)['recipes'] == 1
+    assert 'image_hash' not in client.tables['recipes'][0]
+    assert recipe_persistence._missing_recipe_columns == {'image_hash'}
+
+
+def test_bulk_fallback_saves_without_the_request_id_migration():
+    client = OldSchemaClient(missing_columns=('request_id',))
+
+    recipe_id = save_recipe_graph(client, recipe_data())
+
+    assert client.tables['recipes'][0]['id'] == recipe_id
+    assert 'request_id' not in client.tables['recipes'][0]
+    assert row_counts(client)['wine_pairings'] == 1
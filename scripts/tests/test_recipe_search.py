@@ -0,0 +1,78 @@
+import pytest
+
+from recipe_search import RecipeSearchIndex, edit_distance, search_query, search_terms
+
+RECIPES = [
+    {'id': 1, 'title': 'Paella valenciana', 'country': 'Espagne', 'region': 'Valence',
+     'description': 'Riz safrané au poulet', 'ingredients': [{'name': 'riz'}, {'name': 'safran'}]},
+    {'id': 2, 'title': 'Risotto aux champignons', 'country': 'Italie', 'region': 'Lombardie',
+     'description': 'Riz crémeux', 'ingredients': [{'name': 'riz arborio'}, {'name': 'champignons'}]},
+    {'id': 3, 'title': 'Tajine de poulet', 'country': 'Maroc', 'region': None,
+     'description': 'Poulet aux citrons confits', 'ingredients': [{'name': 'poulet'}, {'name': 'citron confit'}]},
+]
+
+
+@pytest.fixture
+def index():
+    index = RecipeSearchIndex()
+    for recipe in RECIPES:
+        index.add(recipe)
+    return index
+
+
+def ids(results):
+    return [recipe['id'] for recipe in results]
+
+
+def test_edit_distance_counts_adjacent_transpositions_once():
+    assert edit_distance('poulet', 'poulet', 2) == 0
+    assert edit_distance('poulet', 'pouelt', 2) == 1
+    assert edit_distance('safran', 'sfaran', 1) == 1
+    assert edit_distance('paella', 'pael', 1) == 2
+    assert edit_distance('tajine', 'risotto', 2) == 3
+
+
+def test_search_terms_normalise_accents_plurals_and_stopwords():
+    assert search_terms('Œufs brouillés de la ferme') == ['oeuf', 'brouille', 'ferme']
+
+
+def test_title_matches_rank_first(index):
+    results, total = index.search('poulet ')
+
+    assert total == 2
+    assert ids(results) == [3, 1]
+
+
+def test_every_word_must_match(index):
+    assert ids(index.search('riz poulet ')[0]) == [1]
+
+
+def test_last_word_is_completed_by_prefix(index):
+    assert ids(index.search('champ')[0]) == [2]
+    assert index.search('champ ')[0] == []
+
+
+def test_typos_are_tolerated_on_long_enough_words(index):
+    assert ids(index.search('risoto ')[0]) == [2]
+    assert ids(index.search('tajnie ')[0]) == [3]
+    assert index.search('rz ')[0] == []
+
+
+def test_reindexing_replaces_the_previous_terms(index):
+    index.add({**RECIPES[2], 'title': 'Couscous', 'description': None, 'ingredients': []})
+
+    assert index.search('tajine ')[0] == []
+    assert ids(index.search('couscous ')[0]) == [3]
+
+
+@pytest.mark.parametrize('params', [{}, {'q': '  '}, {'q': 'a' * 201}, {'q': 'riz', 'limit': 'dix'},
+                                    {'q': 'riz', 'limit': '0'}, {'q': 'riz', 'limit': '51'}])
+def test_search_query_rejects_invalid_parameters(index, params):
+    with pytest.raises(ValueError):
+        search_query(index, params)
+
+
+def test_search_query_limits_results(index):
+    response = search_query(index, {'q': 'riz', 'limit': '1'})
+
+    assert (len(response['results']), response['total']) == (1, 2)
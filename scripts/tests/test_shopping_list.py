@@ -0,0 +1,64 @@
+import pytest
+
+from fake_supabase import InMemorySupabaseClient
+from ingredient_units import canonical_ingredient
+from shopping_list import IngredientColumns, build_shopping_list, parse_shopping_request, shopping_list_for_recipes
+
+
+def row(recipe_id, servings, name, quantity, unit, canonical=True):
+    ingredient = {'recipe_id': recipe_id, 'name': name, 'quantity': quantity, 'unit': unit,
+                  'recipes': {'servings': servings}}
+    return {**ingredient, **canonical_ingredient(ingredient)} if canonical else ingredient
+
+
+def items(shopping_list):
+    return {item['name']: (item['quantity'], item['unit'], item['category'])
+            for group in shopping_list['ingredients'] for item in group['items']}
+
+
+def test_quantities_in_different_units_are_added_and_scaled():
+    rows = [
+        row(1, 4, 'lait', '50', 'cl'), row(2, 2, 'lait', '1', 'tasse'),
+        row(1, 4, "gousses d'ail", '2', ''), row(2, 2, "d'ail", '1', 'gousse'),
+        row(1, 4, 'farine', '250', 'g', canonical=False), row(2, 2, 'farine', '0,5', 'kg'),
+        row(2, 2, 'sel', '', 'au goût'),
+    ]
+
+    shopping_list = build_shopping_list(IngredientColumns.from_rows(rows), servings=4)
+
+    # 500 ml + 240 ml x 2 ; 250 g + 500 g x 2
+    assert items(shopping_list)['Lait'] == ('980', 'ml', 'Crèmerie')
+    assert items(shopping_list)['Farine'] == ('1,25', 'kg', 'Épicerie')
+    assert items(shopping_list)['Sel'] == ('au goût', '', 'Épices et condiments')
+    assert shopping_list['total_recipes'] == 2
+
+
+def test_categories_follow_the_aisle_order():
+    rows = [row(1, 4, 'vin blanc', '20', 'cl'), row(1, 4, 'poulet', '1', 'kg'), row(1, 4, 'tomates', '3', '')]
+
+    shopping_list = build_shopping_list(IngredientColumns.from_rows(rows), servings=4)
+
+    assert [group['category'] for group in shopping_list['ingredients']] == \
+        ['Fruits et légumes', 'Viandes et poissons', 'Boissons']
+
+
+def test_shopping_list_reads_servings_by_join_and_reports_missing_recipes():
+    client = InMemorySupabaseClient()
+    recipe_id = client.table('recipes').insert({'title': 'Paella', 'servings': 2}).execute().data[0]['id']
+    client.table('ingredients').insert({'recipe_id': recipe_id, 'name': 'riz', 'quantity': '200', 'unit': 'g'}).execute()
+
+    shopping_list = shopping_list_for_recipes(client, [recipe_id, 999], servings=6)
+
+    assert items(shopping_list)['Riz'][:2] == ('600', 'g')
+    assert shopping_list['missing_recipe_ids'] == [999]
+
+
+@pytest.mark.parametrize('data', [{}, {'recipe_ids': []}, {'recipe_ids': ['x']}, {'recipe_ids': list(range(51))},
+                                  {'recipe_ids': [1], 'servings': 0}, {'recipe_ids': [1], 'servings': 'deux'}])
+def test_parse_shopping_request_rejects_invalid_bodies(data):
+    with pytest.raises(ValueError):
+        parse_shopping_request(data)
+
+
+def test_parse_shopping_request_deduplicates_ids():
+    assert parse_shopping_request({'recipe_ids': [3, '3', 1]}) == ([3, 1], 4)